@@ -0,0 +1,170 @@
+"""
+Magic bitboard tables for the rooks and bishops (see rook_attacks and bishop_attacks in boardrep.py),
+the attacks of a knight, a king and a pawn of either colour from every square, and the squares between
+(BETWEEN) and the line through (LINE) any two squares on the same rank, file or diagonal.
+
+The tables used to be Python list literals in constants.py, over a megabyte and a half of source that every
+process had to unmarshal into lists of boxed ints. They now live in attack_tables.bin as little-endian uint64
+values, written by magic_stuff.py, and are memory-mapped the first time one of them is used: nothing is
+parsed, the checksum is taken straight over the mapping, and processes on the same machine share the pages
+of the file. Only the per-square tables (64 entries each) are copied into lists, indexing a list being faster
+than indexing a memoryview; the big ones (MAPPED_TABLES, over 100k words) stay on the file, so a pool worker
+doesn't hold a copy of them as boxed ints.
+
+File layout: an 8 byte tag, the format version and a CRC32 (uint32 each), then one uint64 with the length of
+every table in TABLE_NAMES, then the tables themselves one after the other. The CRC covers everything after it.
+If the file is missing or doesn't check out, the tables are rebuilt from the magics in constants.py and the
+file is written again.
+"""
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+import constants
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "attack_tables.bin")
+FILE_TAG = b"MUNCHMAG"
+VERSION = 3
+_HEADER = struct.Struct("<8sII")
+
+TABLE_NAMES = ("ROOK_MAGIC_MASKS", "ROOK_MAGICS", "ROOK_SHIFTS", "ROOK_ATTACK_OFFSETS", "ROOK_ATTACKS",
+               "BISHOP_MAGIC_MASKS", "BISHOP_MAGICS", "BISHOP_SHIFTS", "BISHOP_ATTACK_OFFSETS", "BISHOP_ATTACKS",
+               "KNIGHT_ATTACKS", "KING_ATTACKS", "WHITE_PAWN_ATTACKS", "BLACK_PAWN_ATTACKS",
+               "BETWEEN", "LINE") # BETWEEN and LINE are indexed by 64 * square_a + square_b
+# Not in the file, put together when it is loaded: PAWN_ATTACKS[side][square]
+DERIVED_NAMES = ("PAWN_ATTACKS",)
+
+# The big tables are used straight from the file, the small ones are turned into lists
+MAPPED_TABLES = ("ROOK_ATTACKS", "BISHOP_ATTACKS", "BETWEEN", "LINE")
+
+class AttackTableError(Exception):
+    """The table file is missing, truncated or doesn't match its checksum"""
+
+def write_tables(tables: dict[str, list[int]], path: str = PATH) -> None:
+    """Writes the tables (a list of ints for every name in TABLE_NAMES) to path, replacing the file in one go"""
+    lengths = array('Q', (len(tables[name]) for name in TABLE_NAMES))
+    payload = array('Q')
+    for name in TABLE_NAMES:
+        payload.extend(tables[name])
+    if sys.byteorder == "big":
+        lengths.byteswap()
+        payload.byteswap()
+    body = lengths.tobytes() + payload.tobytes()
+
+    temporary_path = f"{path}.{os.getpid()}.tmp" # Readers never see a half written file
+    with open(temporary_path, "wb") as file:
+        file.write(_HEADER.pack(FILE_TAG, VERSION, zlib.crc32(body)))
+        file.write(body)
+    os.replace(temporary_path, path)
+
+def read_tables(path: str = PATH) -> dict:
+    """
+    Maps the file and returns its tables: MAPPED_TABLES as memoryviews straight onto the file (arrays on
+    big-endian machines), the others as lists. Raises AttackTableError if the file can't be used
+    """
+    try:
+        with open(path, "rb") as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as error: # ValueError: mapping an empty file
+        raise AttackTableError(f"can't map {path}: {error}") from error
+
+    if len(data) < _HEADER.size + 8 * len(TABLE_NAMES) or (len(data) - _HEADER.size) % 8:
+        raise AttackTableError(f"{path} is truncated")
+    tag, version, checksum = _HEADER.unpack_from(data)
+    if tag != FILE_TAG or version != VERSION:
+        raise AttackTableError(f"{path} isn't a version {VERSION} attack table file")
+    if zlib.crc32(memoryview(data)[_HEADER.size:]) != checksum:
+        raise AttackTableError(f"{path} doesn't match its checksum")
+
+    if sys.byteorder == "little":
+        words = memoryview(data)[_HEADER.size:].cast('Q')
+    else:
+        words = array('Q', data[_HEADER.size:])
+        words.byteswap()
+    lengths = words[:len(TABLE_NAMES)]
+    if len(TABLE_NAMES) + sum(lengths) != len(words):
+        raise AttackTableError(f"{path} is truncated")
+
+    tables = {}
+    start = len(TABLE_NAMES)
+    for name, length in zip(TABLE_NAMES, lengths):
+        tables[name] = words[start:start + length]
+        if name not in MAPPED_TABLES:
+            tables[name] = tables[name].tolist() # 64 entries, indexing a list is three times faster
+        start += length
+    tables["PAWN_ATTACKS"] = (tables["WHITE_PAWN_ATTACKS"], tables["BLACK_PAWN_ATTACKS"])
+    return tables
+
+def build_tables(rook_magics: list[int] = constants.ROOK_MAGICS, rook_shifts: list[int] = constants.ROOK_SHIFTS,
+                 bishop_magics: list[int] = constants.BISHOP_MAGICS, bishop_shifts: list[int] = constants.BISHOP_SHIFTS) -> dict[str, list[int]]:
+    """Fills the attack tables for the given magic numbers and shifts, takes a second or two"""
+    import generating_functions # Only needed when the file has to be rebuilt
+    import magic_stuff
+    tables = {
+        "KNIGHT_ATTACKS": [generating_functions.generate_knight_attacks(square) for square in range(64)],
+        "KING_ATTACKS": [generating_functions.generate_king_attacks(square) for square in range(64)],
+        "WHITE_PAWN_ATTACKS": [generating_functions.generate_pawn_attacks(square, 0) for square in range(64)],
+        "BLACK_PAWN_ATTACKS": [generating_functions.generate_pawn_attacks(square, 1) for square in range(64)],
+        "BETWEEN": [generating_functions.generate_between(a, b) for a in range(64) for b in range(64)],
+        "LINE": [generating_functions.generate_line(a, b) for a in range(64) for b in range(64)],
+    }
+    tables["PAWN_ATTACKS"] = (tables["WHITE_PAWN_ATTACKS"], tables["BLACK_PAWN_ATTACKS"])
+    for prefix, magics, shifts, mask_generator, attack_generator in (
+            ("ROOK", rook_magics, rook_shifts, magic_stuff.generate_rook_mask_magic, magic_stuff.generate_rook_attacks_for_table),
+            ("BISHOP", bishop_magics, bishop_shifts, magic_stuff.generate_bishop_mask_magic, magic_stuff.generate_bishop_attacks_for_table)):
+        masks = [mask_generator(square) for square in range(64)]
+        square_tables = []
+        for square in range(64):
+            square_attacks = [0] * (1 << (64 - shifts[square])) # 0 marks a slot no blocker pattern uses
+            bits = magic_stuff.pop_count(masks[square])
+            for i in range(1 << bits):
+                occupancy = magic_stuff.set_occupancy(i, bits, masks[square])
+                magic_index = ((occupancy * magics[square]) & 0xFFFFFFFFFFFFFFFF) >> shifts[square]
+                square_attacks[magic_index] = attack_generator(square, occupancy)
+            square_tables.append(square_attacks)
+        offsets, attacks = pack_tables(square_tables)
+        tables.update({f"{prefix}_MAGIC_MASKS": masks, f"{prefix}_MAGICS": list(magics), f"{prefix}_SHIFTS": list(shifts),
+                       f"{prefix}_ATTACK_OFFSETS": offsets, f"{prefix}_ATTACKS": attacks})
+    return tables
+
+def pack_tables(square_tables: list[list[int]]) -> tuple[list[int], list[int]]:
+    """
+    Lays the tables of the squares out one after the other in a single list, starting each one as early as
+    it fits over the end of the previous ones: where one of them has an unused slot (0, an attack set is never
+    empty) or both have the same attack set. Returns the offset of every table and the list
+    """
+    offsets = []
+    packed = []
+    for table in square_tables:
+        offset = max(0, len(packed) - len(table))
+        while any(entry and packed[offset + i] not in (0, entry) for i, entry in enumerate(table[:len(packed) - offset])):
+            offset += 1
+        offsets.append(offset)
+        packed.extend([0] * (offset + len(table) - len(packed)))
+        for i, entry in enumerate(table):
+            if entry:
+                packed[offset + i] = entry
+    while packed and not packed[-1]: # Unused slots at the very end are never read
+        packed.pop()
+    return offsets, packed
+
+def load_tables(path: str = PATH) -> dict:
+    """The tables in path, rebuilt (and written back if the directory is writable) if the file can't be used"""
+    try:
+        return read_tables(path)
+    except AttackTableError:
+        tables = build_tables()
+        try:
+            write_tables(tables, path)
+        except OSError:
+            pass # Read-only install, use the tables we just built
+        return tables
+
+def __getattr__(name: str):
+    """Loads every table the first time one of them is used, after that they are plain module attributes"""
+    if name not in TABLE_NAMES + DERIVED_NAMES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals().update(load_tables())
+    return globals()[name]
@@ -0,0 +1,181 @@
+"""
+Set-wise move generation over a batch of positions with NumPy.
+
+ValidMoves works on one position and one piece at a time. Here every operation is done on a whole
+column of positions at once: a position is a row of 12 uint64 bitboards (in the order of BoardRep.bitboards),
+and the attacks of all the knights (or pawns, or kings) of every position are a few shifts of those columns.
+Sliders use Kogge-Stone fills, which spread every slider of a position along a direction in three
+shift-and-mask steps, stopping at the first piece in the way.
+
+Black to move is handled by flipping the board vertically and swapping the colours, so the generator only
+ever has to know how white moves. Counting moves stays exact even though the pieces are all moved at once,
+because the targets of one direction (one knight jump, one pawn capture, one slider ray) never overlap:
+two sliders on the same ray block each other.
+"""
+import numpy as np
+import constants
+
+_FULL = np.uint64(0xFFFFFFFFFFFFFFFF)
+_NOT_FILE_A = np.uint64(~0x0101010101010101 & 0xFFFFFFFFFFFFFFFF)
+_NOT_FILE_H = np.uint64(~0x8080808080808080 & 0xFFFFFFFFFFFFFFFF)
+_NOT_FILE_AB = np.uint64(~0x0303030303030303 & 0xFFFFFFFFFFFFFFFF)
+_NOT_FILE_GH = np.uint64(~0xC0C0C0C0C0C0C0C0 & 0xFFFFFFFFFFFFFFFF)
+_RANK_3 = np.uint64(constants.RANK_2 << 8)
+_RANK_8 = np.uint64(constants.RANK_8)
+
+# (shift, mask of the squares a piece can land on without wrapping around the board)
+KNIGHT_JUMPS = ((17, _NOT_FILE_A), (15, _NOT_FILE_H), (10, _NOT_FILE_AB), (6, _NOT_FILE_GH),
+                (-6, _NOT_FILE_AB), (-10, _NOT_FILE_GH), (-15, _NOT_FILE_A), (-17, _NOT_FILE_H))
+ROOK_DIRECTIONS = ((8, _FULL), (-8, _FULL), (1, _NOT_FILE_A), (-1, _NOT_FILE_H))
+BISHOP_DIRECTIONS = ((9, _NOT_FILE_A), (7, _NOT_FILE_H), (-7, _NOT_FILE_A), (-9, _NOT_FILE_H))
+KING_STEPS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+# Squares that have to be empty, and squares that can't be attacked, for white to castle king-side and queen-side
+_KING_SIDE_PATH, _KING_SIDE_SAFE = np.uint64((1 << 5) | (1 << 6)), np.uint64((1 << 4) | (1 << 5) | (1 << 6))
+_QUEEN_SIDE_PATH, _QUEEN_SIDE_SAFE = np.uint64((1 << 1) | (1 << 2) | (1 << 3)), np.uint64((1 << 4) | (1 << 3) | (1 << 2))
+
+def _shift(bitboards: np.ndarray, shift: int) -> np.ndarray:
+    """Shifts every bitboard towards h8 (positive) or a1 (negative), squares that leave the board are lost"""
+    return bitboards << np.uint64(shift) if shift > 0 else bitboards >> np.uint64(-shift)
+
+def _slide(sliders: np.ndarray, empty: np.ndarray, shift: int, mask: np.uint64) -> np.ndarray:
+    """Kogge-Stone fill: every square the sliders attack in one direction, the first piece in the way included"""
+    empty = empty & mask
+    sliders = sliders | (empty & _shift(sliders, shift))
+    empty = empty & _shift(empty, shift)
+    sliders = sliders | (empty & _shift(sliders, 2 * shift))
+    empty = empty & _shift(empty, 2 * shift)
+    sliders = sliders | (empty & _shift(sliders, 4 * shift))
+    return _shift(sliders, shift) & mask
+
+def _popcount(bitboards: np.ndarray) -> np.ndarray:
+    return np.bitwise_count(bitboards).astype(np.int64)
+
+def _flip(bitboards: np.ndarray) -> np.ndarray:
+    """Mirrors the board vertically (a1 <-> a8): the ranks are the bytes of a bitboard, so it is a byte swap"""
+    return bitboards.byteswap()
+
+def _white_to_move(bitboards: np.ndarray, side_to_move: np.ndarray, en_passant: np.ndarray,
+                   castling_rights: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Turns the positions with black to move into the same positions seen from the other side of the board"""
+    black = side_to_move.astype(bool)
+    flipped = _flip(np.concatenate((bitboards[:, 6:], bitboards[:, :6]), axis=1))
+    bitboards = np.where(black[:, None], flipped, bitboards)
+    en_passant = np.where(black, _flip(en_passant), en_passant)
+    castling_rights = np.where(black, castling_rights >> 2, castling_rights) & 3
+    return bitboards, en_passant, castling_rights
+
+def _enemy_attacks(enemy: np.ndarray, empty: np.ndarray) -> np.ndarray:
+    """Every square black attacks (the side not to move after _white_to_move), like ValidMoves.is_square_attacked sees them"""
+    attacks = (_shift(enemy[:, 0], -9) & _NOT_FILE_H) | (_shift(enemy[:, 0], -7) & _NOT_FILE_A)
+    for shift, mask in KNIGHT_JUMPS:
+        attacks |= _shift(enemy[:, 1], shift) & mask
+    for shift, mask in KING_STEPS:
+        attacks |= _shift(enemy[:, 5], shift) & mask
+    diagonal = enemy[:, 2] | enemy[:, 4]
+    orthogonal = enemy[:, 3] | enemy[:, 4]
+    for shift, mask in BISHOP_DIRECTIONS:
+        attacks |= _slide(diagonal, empty, shift, mask)
+    for shift, mask in ROOK_DIRECTIONS:
+        attacks |= _slide(orthogonal, empty, shift, mask)
+    return attacks
+
+def generate_batch(bitboards: np.ndarray, side_to_move: np.ndarray | None = None,
+                   en_passant: np.ndarray | None = None, castling_rights: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Pseudo-legal moves of N positions at once: bitboards is an (N, 12) uint64 array, side_to_move, en_passant
+    (bitboards of the en passant squares, 0 for none) and castling_rights (as in BoardRep) have one entry per
+    position and default to white to move, no en passant and no castling.
+
+    Returns the number of moves of every position, the same as len(ValidMoves.generate_pseudo_legal_moves)
+    (every promotion counts as four moves), and an (N, 6) array with the squares every piece type of the side to
+    move can go to, e.g. for mobility features
+    """
+    counts, targets, _ = _generate(*_batch_inputs(bitboards, side_to_move, en_passant, castling_rights))
+    return counts, targets
+
+def legal_move_counts(bitboards: np.ndarray, side_to_move: np.ndarray | None = None,
+                      en_passant: np.ndarray | None = None, castling_rights: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Number of legal moves of N positions at once, for the positions where that is simple: the side to move
+    isn't in check, has no pinned pieces and can't capture en passant, so the only illegal moves are king
+    moves to attacked squares. Returns the counts and a mask of the positions they are exact for, the
+    others have to be counted one at a time
+    """
+    bitboards, side_to_move, en_passant, castling_rights = _batch_inputs(bitboards, side_to_move, en_passant, castling_rights)
+    counts, targets, king_steps = _generate(bitboards, side_to_move, en_passant, castling_rights)
+
+    white, en_passant, _ = _white_to_move(bitboards, side_to_move, en_passant, castling_rights)
+    own, enemy = white[:, :6], white[:, 6:]
+    empty = ~np.bitwise_or.reduce(white, axis=1)
+    attacked = _enemy_attacks(enemy, empty)
+    king = own[:, 5]
+
+    # A piece is pinned if the ray from the king stops at it, and carries on to an enemy slider of the right kind
+    own_pieces = np.bitwise_or.reduce(own, axis=1)
+    pinned = np.zeros(len(bitboards), dtype=bool)
+    for directions, pinners in ((BISHOP_DIRECTIONS, enemy[:, 2] | enemy[:, 4]), (ROOK_DIRECTIONS, enemy[:, 3] | enemy[:, 4])):
+        for shift, mask in directions:
+            blocker = _slide(king, empty, shift, mask) & own_pieces
+            pinned |= (_slide(blocker, empty, shift, mask) & pinners) != 0
+
+    en_passant_captures = ((_shift(own[:, 0], 7) & _NOT_FILE_H) | (_shift(own[:, 0], 9) & _NOT_FILE_A)) & en_passant
+    exact = ((attacked & king) == 0) & ~pinned & (en_passant_captures == 0)
+    counts = counts - _popcount(king_steps & attacked) # Not in check, so no king move is illegal for any other reason
+    return counts, exact
+
+def _batch_inputs(bitboards, side_to_move, en_passant, castling_rights):
+    bitboards = np.ascontiguousarray(bitboards, dtype=np.uint64).reshape(-1, 12)
+    n = len(bitboards)
+    side_to_move = np.zeros(n, dtype=np.int64) if side_to_move is None else np.asarray(side_to_move, dtype=np.int64)
+    en_passant = np.zeros(n, dtype=np.uint64) if en_passant is None else np.asarray(en_passant, dtype=np.uint64)
+    castling_rights = np.zeros(n, dtype=np.int64) if castling_rights is None else np.asarray(castling_rights, dtype=np.int64)
+    return bitboards, side_to_move, en_passant, castling_rights
+
+def _generate(bitboards, side_to_move, en_passant, castling_rights) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """generate_batch, also returning the (non castling) king targets in the orientation of white to move"""
+    black = side_to_move.astype(bool)
+    white, en_passant, castling_rights = _white_to_move(bitboards, side_to_move, en_passant, castling_rights)
+    own, enemy = white[:, :6], white[:, 6:]
+    own_pieces = np.bitwise_or.reduce(own, axis=1)
+    enemy_pieces = np.bitwise_or.reduce(enemy, axis=1)
+    empty = ~(own_pieces | enemy_pieces)
+    not_own = ~own_pieces
+    counts = np.zeros(len(bitboards), dtype=np.int64)
+    targets = np.zeros((len(bitboards), 6), dtype=np.uint64)
+
+    # Pawns: a promotion is four moves
+    pawns = own[:, 0]
+    single_pushes = _shift(pawns, 8) & empty
+    double_pushes = _shift(single_pushes & _RANK_3, 8) & empty
+    captures_west = _shift(pawns, 7) & _NOT_FILE_H
+    captures_east = _shift(pawns, 9) & _NOT_FILE_A
+    for pawn_targets in (single_pushes, captures_west & enemy_pieces, captures_east & enemy_pieces):
+        counts += _popcount(pawn_targets & ~_RANK_8) + 4 * _popcount(pawn_targets & _RANK_8)
+    counts += _popcount(double_pushes)
+    counts += _popcount(captures_west & en_passant) + _popcount(captures_east & en_passant)
+    targets[:, 0] = single_pushes | double_pushes | ((captures_west | captures_east) & (enemy_pieces | en_passant))
+
+    for piece, steps in ((1, KNIGHT_JUMPS), (5, KING_STEPS)):
+        for shift, mask in steps:
+            piece_targets = _shift(own[:, piece], shift) & mask & not_own
+            counts += _popcount(piece_targets)
+            targets[:, piece] |= piece_targets
+    king_steps = targets[:, 5].copy()
+
+    for piece, directions in ((2, BISHOP_DIRECTIONS), (3, ROOK_DIRECTIONS), (4, KING_STEPS)):
+        for shift, mask in directions:
+            piece_targets = _slide(own[:, piece], empty, shift, mask) & not_own
+            counts += _popcount(piece_targets)
+            targets[:, piece] |= piece_targets
+
+    # Castling, with the same checks as ValidMoves.can_castle
+    attacked = _enemy_attacks(enemy, empty)
+    occupied = ~empty
+    king_side = ((castling_rights & 1) != 0) & ((occupied & _KING_SIDE_PATH) == 0) & ((attacked & _KING_SIDE_SAFE) == 0)
+    queen_side = ((castling_rights & 2) != 0) & ((occupied & _QUEEN_SIDE_PATH) == 0) & ((attacked & _QUEEN_SIDE_SAFE) == 0)
+    counts += king_side.astype(np.int64) + queen_side.astype(np.int64)
+    targets[:, 5] |= np.where(king_side, np.uint64(1 << 6), np.uint64(0)) | np.where(queen_side, np.uint64(1 << 2), np.uint64(0))
+
+    targets = np.where(black[:, None], _flip(targets), targets) # Back to the real board
+    return counts, targets, king_steps
@@ -1,86 +1,183 @@
+import attack_tables
 import constants
 import conversions
-from typing import TypedDict
+import zobrist
+import evaluation
+from array import array
+from typing import Callable
+from move_encoding import (move_list, encode_move, promotion_piece, NO_MOVE, QUIET, DOUBLE_PAWN_PUSH,
+                           KING_CASTLE, QUEEN_CASTLE, CAPTURE, EN_PASSANT, PROMOTION)
+
+# Sides and pieces are small integers, and a coloured piece is side * 6 + piece,
+# which is its index in BoardRep.bitboards and what BoardRep.mailbox stores
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 0, 1, 2, 3, 4, 5
+EMPTY = -1 # A square of the mailbox with nothing on it
+
+COLOUR_NAMES = ("white", "black")
+PIECE_NAMES = ("pawn", "knight", "bishop", "rook", "queen", "king")
+PIECE_CHARS = "PNBRQKpnbrqk" # FEN character of every coloured piece
+# What every piece is worth to the static exchange evaluation (see ValidMoves.see)
+SEE_VALUES = tuple(getattr(evaluation.PieceValue, name) for name in PIECE_NAMES)
+
+# Adapters for code that still talks in "white"/"black" and piece names (the GUI, FEN, the tests)
+SIDES: dict[str | int, int] = {"white": WHITE, "black": BLACK, WHITE: WHITE, BLACK: BLACK}
+PIECE_CODES: dict[str | int, int] = {**{name: code for code, name in enumerate(PIECE_NAMES)}, **{code: code for code in range(6)}}
+
+# Castling rights are 4 bits: white king-side, white queen-side, black king-side and black queen-side
+CASTLE_WHITE_KING, CASTLE_WHITE_QUEEN, CASTLE_BLACK_KING, CASTLE_BLACK_QUEEN = 1, 2, 4, 8
+ALL_CASTLING_RIGHTS = 15
+
+MAX_PLY = 256 # Undo records allocated up front, the stack grows past this if a game gets longer
+
+# Rights that survive a move from or to a square: moving the king or a rook (or capturing
+# a rook on its starting square) loses the corresponding rights, any other square keeps them
+CASTLING_RIGHTS_MASK = [ALL_CASTLING_RIGHTS] * 64
+CASTLING_RIGHTS_MASK[0] &= ~CASTLE_WHITE_QUEEN # a1
+CASTLING_RIGHTS_MASK[7] &= ~CASTLE_WHITE_KING # h1
+CASTLING_RIGHTS_MASK[4] &= ~(CASTLE_WHITE_KING | CASTLE_WHITE_QUEEN) # e1
+CASTLING_RIGHTS_MASK[56] &= ~CASTLE_BLACK_QUEEN # a8
+CASTLING_RIGHTS_MASK[63] &= ~CASTLE_BLACK_KING # h8
+CASTLING_RIGHTS_MASK[60] &= ~(CASTLE_BLACK_KING | CASTLE_BLACK_QUEEN) # e8
+
+def side_index(colour: str | int) -> int:
+    """Turns "white"/"black" (or WHITE/BLACK) into WHITE/BLACK"""
+    try:
+        return SIDES[colour]
+    except KeyError:
+        raise ValueError("Color must be either 'white' or 'black'") from None
 
 class BoardRep:
     """Turns board into a bitboards"""
-    
+    __slots__ = ("bitboards", "mailbox", "occupancy", "occupied", "castling_rights", "en_passant_square", "zobrist_key",
+                 "middlegame_score", "endgame_score", "phase", "undo_stack", "ply")
+
     def __init__(self):
         """Just initialise the board"""
-        self.bitboard_black={
-            "pawn": 0,
-            "knight": 0,
-            "bishop": 0,
-            "queen": 0,
-            "rook": 0,
-            "king": 0
-        }
-        self.bitboard_white = { 
-            "pawn": 0,
-            "knight": 0,
-            "bishop": 0,
-            "queen": 0,
-            "rook": 0,
-            "king": 0        
-        }
-
-        #[King-side castling, Queen-side castling] 
-        self.castling_white = [True,True]
-        self.castling_black = [True,True]
+        # One bitboard per coloured piece: white pawn, knight, bishop, rook, queen, king, then the same for black
+        self.bitboards = [0] * 12
+        # What is on every square (a coloured piece or EMPTY), so we never have to search the bitboards for it
+        self.mailbox = [EMPTY] * 64
+        # Every piece of each side and every piece on the board, kept up to date by put_piece and remove_piece
+        # so the move generator never has to add the bitboards up
+        self.occupancy = [0, 0]
+        self.occupied = 0
+
+        self.castling_rights = ALL_CASTLING_RIGHTS
 
         self.en_passant_square = 0 #Stores the target square for potential EP capture
-   
+
+        # 64-bit key of the position, MoveHandler updates it incrementally on every change
+        self.zobrist_key = self.compute_zobrist_key(WHITE)
+
+        # Material and piece-square scores (from white's point of view) and game phase, also kept up to date
+        # by put_piece and remove_piece, so evaluating a position is just blending them (see evaluation.py)
+        self.middlegame_score = 0
+        self.endgame_score = 0
+        self.phase = 0
+
+        # What MoveHandler needs to take back every move made so far, one record per move.
+        # The records are allocated once and reused, so making a move doesn't create any new objects
+        self.undo_stack = [[NO_MOVE, EMPTY, EMPTY, 0, 0, 0, 0, 0, 0, 0] for _ in range(MAX_PLY)]
+        self.ply = 0 # Number of moves on the undo stack
+
+    @property
+    def bitboard_white(self) -> dict[str, int]:
+        """White's bitboards keyed by piece name, a read-only view for the GUI and the tests"""
+        return dict(zip(PIECE_NAMES, self.bitboards[:6]))
+
+    @property
+    def bitboard_black(self) -> dict[str, int]:
+        """Black's bitboards keyed by piece name, a read-only view for the GUI and the tests"""
+        return dict(zip(PIECE_NAMES, self.bitboards[6:]))
+
+    def put_piece(self, square_index: int, piece: int) -> None:
+        """Puts a coloured piece on an empty square"""
+        square = 1 << square_index
+        self.bitboards[piece] |= square
+        self.occupancy[piece // 6] |= square
+        self.occupied |= square
+        self.mailbox[square_index] = piece
+        self.zobrist_key ^= zobrist.PIECE_KEYS[piece][square_index]
+        self.middlegame_score += evaluation.MIDDLEGAME_TABLES[piece][square_index]
+        self.endgame_score += evaluation.ENDGAME_TABLES[piece][square_index]
+        self.phase += evaluation.PIECE_PHASES[piece]
+
+    def remove_piece(self, square_index: int) -> int:
+        """Takes whatever is on an occupied square off the board and returns it"""
+        piece = self.mailbox[square_index]
+        square = 1 << square_index
+        self.bitboards[piece] &= ~square
+        self.occupancy[piece // 6] &= ~square
+        self.occupied &= ~square
+        self.mailbox[square_index] = EMPTY
+        self.zobrist_key ^= zobrist.PIECE_KEYS[piece][square_index]
+        self.middlegame_score -= evaluation.MIDDLEGAME_TABLES[piece][square_index]
+        self.endgame_score -= evaluation.ENDGAME_TABLES[piece][square_index]
+        self.phase -= evaluation.PIECE_PHASES[piece]
+        return piece
+
+    def static_evaluation(self) -> int:
+        """Static evaluation of the position from white's point of view, from the scores kept up to date"""
+        return evaluation.tapered_score(self.middlegame_score, self.endgame_score, self.phase)
+
+    def refresh_evaluation(self) -> None:
+        """Adds the scores up again from scratch, needed after evaluation.set_tables changes the tables"""
+        self.middlegame_score, self.endgame_score, self.phase = evaluation.score_bitboards(self.bitboards)
+
+    def compute_zobrist_key(self, colour_to_move: str | int) -> int:
+        """Computes the Zobrist key of the current position from scratch"""
+        return zobrist.hash_position(self.bitboards, self.castling_rights,
+                                     self.en_passant_square, side_index(colour_to_move))
+
+    def clear(self) -> None:
+        """Removes every piece and right from the board"""
+        self.bitboards = [0] * 12
+        self.mailbox = [EMPTY] * 64
+        self.occupancy = [0, 0]
+        self.occupied = 0
+        self.castling_rights = 0
+        self.en_passant_square = 0
+        self.zobrist_key = self.compute_zobrist_key(WHITE)
+        self.middlegame_score = 0
+        self.endgame_score = 0
+        self.phase = 0
+        self.ply = 0
 
     def initial_position(self)->tuple[dict,dict]:
         """Set initial positions of pieces on the chess board"""
+        self.clear()
 
         #Calculated using the generating functions
-        self.bitboard_white = constants.INITIAL_WHITE
-        self.bitboard_black = constants.INITIAL_BLACK
+        for side, initial_bitboards in ((WHITE, constants.INITIAL_WHITE), (BLACK, constants.INITIAL_BLACK)):
+            for piece_name, bitboard in initial_bitboards.items():
+                while bitboard:
+                    self.put_piece((bitboard & -bitboard).bit_length() - 1, side * 6 + PIECE_CODES[piece_name])
+                    bitboard &= bitboard - 1
 
         # We haven't lost our ability to castle in the future yet
         # (it is the start of the game!)
-        self.castling_white = [True,True]
-        self.castling_black = [True,True]
+        self.castling_rights = ALL_CASTLING_RIGHTS
 
         self.en_passant_square = 0 # There is no en passants
 
+        self.zobrist_key = self.compute_zobrist_key(WHITE)
+
         return (self.bitboard_white,self.bitboard_black)
 
-    def to_fen(self, colour_to_move: str) -> str:
+    def to_fen(self, colour_to_move: str | int) -> str:
         """Turns a position into FEN"""
-        piece_to_char = {
-            "pawn": 'p', "knight": 'n', "bishop": 'b',
-            "rook": 'r', "queen": 'q', "king": 'k'
-        }
-        
         fen = ""
         for r in range(7, -1, -1):
             empty = 0
             for f in range(8):
-                square_index = r * 8 + f
-                square_bb = 1 << square_index
-                
-                char_found = None
-                
-                # Check white pieces
-                for piece_name, bb in self.bitboard_white.items():
-                    if bb & square_bb:
-                        char_found = piece_to_char[piece_name].upper()
-                        break
-                
-                # Check black pieces if no white piece was found
-                if not char_found:
-                    for piece_name, bb in self.bitboard_black.items():
-                        if bb & square_bb:
-                            char_found = piece_to_char[piece_name].lower()
-                            break
-
-                if char_found:
+                piece = self.mailbox[r * 8 + f]
+
+                if piece != EMPTY:
                     if empty > 0:
                         fen += str(empty)
                         empty = 0
-                    fen += char_found
+                    fen += PIECE_CHARS[piece]
                 else:
                     empty += 1
             
@@ -90,14 +187,14 @@ class BoardRep:
                 fen += '/'
 
         # Active color
-        fen += ' w' if colour_to_move == "white" else ' b'
+        fen += ' w' if side_index(colour_to_move) == WHITE else ' b'
 
         # Castling rights
         castling = ""
-        if self.castling_white[0]: castling += 'K'
-        if self.castling_white[1]: castling += 'Q'
-        if self.castling_black[0]: castling += 'k'
-        if self.castling_black[1]: castling += 'q'
+        if self.castling_rights & CASTLE_WHITE_KING: castling += 'K'
+        if self.castling_rights & CASTLE_WHITE_QUEEN: castling += 'Q'
+        if self.castling_rights & CASTLE_BLACK_KING: castling += 'k'
+        if self.castling_rights & CASTLE_BLACK_QUEEN: castling += 'q'
         fen += f" {castling if castling else '-'}"
 
         # En passant square
@@ -112,8 +209,7 @@ class BoardRep:
 
     def from_fen(self, fen: str):
         """Sets the board state from a FEN string"""
-        self.bitboard_white = {p: 0 for p in self.bitboard_white}
-        self.bitboard_black = {p: 0 for p in self.bitboard_black}
+        self.clear()
 
         parts = fen.split(' ')
         board_part = parts[0]
@@ -127,22 +223,13 @@ class BoardRep:
             elif char.isdigit():
                 file += int(char)
             else:
-                square_index = rank * 8 + file
-                square_bb = 1 << square_index
-                
-                piece_map = {'P': 'pawn', 'N': 'knight', 'B': 'bishop', 'R': 'rook', 'Q': 'queen', 'K': 'king'}
-                piece_type = piece_map[char.upper()]
-
-                if char.isupper():
-                    self.bitboard_white[piece_type] |= square_bb
-                else:
-                    self.bitboard_black[piece_type] |= square_bb
+                self.put_piece(rank * 8 + file, PIECE_CHARS.index(char))
                 file += 1
 
         # Castling rights
         castling_part = parts[2]
-        self.castling_white = ['K' in castling_part, 'Q' in castling_part]
-        self.castling_black = ['k' in castling_part, 'q' in castling_part]
+        self.castling_rights = (('K' in castling_part) * CASTLE_WHITE_KING | ('Q' in castling_part) * CASTLE_WHITE_QUEEN
+                                | ('k' in castling_part) * CASTLE_BLACK_KING | ('q' in castling_part) * CASTLE_BLACK_QUEEN)
 
         # En passant
         ep_part = parts[3]
@@ -151,174 +238,221 @@ class BoardRep:
         else:
             self.en_passant_square = conversions.algebraic_to_bitboard(ep_part)
 
-        return parts[1] # Return the color to move
+        self.zobrist_key = self.compute_zobrist_key(WHITE if parts[1] == 'w' else BLACK)
 
-class UnmakeInfo(TypedDict):
-    bitboard_white: dict[str, int]
-    bitboard_black: dict[str, int]
-    castling_white: list[bool]
-    castling_black: list[bool]
-    en_passant_square: int
+        return parts[1] # Return the color to move
 
 class MoveHandler:
     def __init__(self, boardrep: BoardRep):
         self.board_rep = boardrep
     
-    def unset_bit(self,square:int,piece:str,colour:str = "white"):
+    def unset_bit(self,square:int,piece:str | int,colour:str | int = "white") -> None:
         """Unset piece from a bit"""
-        if colour.lower() == "white": 
-            self.board_rep.bitboard_white[piece] &= ~square
-            return self.board_rep.bitboard_white
-
-        elif colour.lower() == "black":
-            self.board_rep.bitboard_black[piece] &= ~square
-            return self.board_rep.bitboard_black
-        else:
-            raise ValueError("Color must be either 'white' or 'black'")
+        piece = side_index(colour) * 6 + PIECE_CODES[piece]
+        square_index = conversions.square_to_index(square)
+        if self.board_rep.mailbox[square_index] == piece: # Only remove the piece if it is actually there
+            self.board_rep.remove_piece(square_index)
 
-    def set_bit(self,square:int, piece: str,colour:str = "white") -> int:
+    def set_bit(self,square:int, piece: str | int,colour:str | int = "white") -> None:
         """Set piece on a bit"""
+        piece = side_index(colour) * 6 + PIECE_CODES[piece]
+        square_index = conversions.square_to_index(square)
+        if self.board_rep.mailbox[square_index] != EMPTY: # Only one piece fits on a square
+            self.board_rep.remove_piece(square_index)
+        self.board_rep.put_piece(square_index, piece)
 
-        if colour.lower() == "white": 
-            self.board_rep.bitboard_white[piece] |= square # We want to add a bit to that position
-            #in that pieces bitboard
-            return self.board_rep.bitboard_white
-
-        elif colour.lower() == "black":
-            self.board_rep.bitboard_black[piece] |= square
-            return self.board_rep.bitboard_black
-        else:
-            raise ValueError("Color must be either 'white' or 'black'") 
-
-    def fast_copy_board(self) -> UnmakeInfo:
-        """Creates a fast copy of the board, since deepcopy is very slow"""
-        return {
-            "bitboard_white":self.board_rep.bitboard_white.copy(),
-            "bitboard_black":self.board_rep.bitboard_black.copy(),
-            "castling_white":list(self.board_rep.castling_white),
-            "castling_black":list(self.board_rep.castling_black),
-            "en_passant_square":self.board_rep.en_passant_square
-        }
-
-
-    def make_move(self, move: tuple, colour: str) -> UnmakeInfo:
+    def make_move(self, move: int, colour: str | int) -> None:
         """ 
-        Makes a move, changing the board state and returns a
-        unamke info backup of the board state before it made the change
+        Makes a move, changing the board state, and pushes what changed onto the
+        board's undo stack so unmake_move can take it back
 
         We don't care if the moves are legal in this function, we just make them as allowed by the rules
         """
-        source_square,target_square = move
-        current_player_board = self.board_rep.bitboard_white if colour=="white" else self.board_rep.bitboard_black
-        moved_piece = next((p for p, bb in current_player_board.items() if bb & source_square))
+        board_rep = self.board_rep
+        side = SIDES[colour]
+        source_index = move & 63 # See move_encoding for the layout of a move
+        target_index = (move >> 6) & 63
+        flags = move >> 12
+        moved_piece = board_rep.mailbox[source_index] # No need to look through the bitboards, the mailbox knows
+
+        # Before we modify anything write down what we need to revert the changes later.
+        # Records are reused, a new one is only needed the first time the game gets this long
+        if board_rep.ply == len(board_rep.undo_stack):
+            board_rep.undo_stack.append([NO_MOVE, EMPTY, EMPTY, 0, 0, 0, 0, 0, 0, 0])
+        undo = board_rep.undo_stack[board_rep.ply]
+        board_rep.ply += 1
+        undo[0] = move
+        undo[1] = moved_piece
+        undo[4] = board_rep.castling_rights
+        undo[5] = board_rep.en_passant_square
+        undo[6] = board_rep.zobrist_key
+        undo[7] = board_rep.middlegame_score
+        undo[8] = board_rep.endgame_score
+        undo[9] = board_rep.phase
+
+        # Take the castling rights and en passant square out of the key, they are put back in once they are updated
+        board_rep.zobrist_key ^= zobrist.CASTLING_KEYS[board_rep.castling_rights]
+        board_rep.zobrist_key ^= zobrist.en_passant_key(board_rep.en_passant_square)
+
+        if flags & CAPTURE:
+            undo[2], undo[3] = self._handle_captures(move, side)
+        else:
+            undo[2] = EMPTY
 
-        unmake_info = self.fast_copy_board() # Before we modify anything make a copy so that we can revert the changes later if needed
+        self._update_game_state(move, side)
 
-        ep_square_before_move = self.board_rep.en_passant_square
+        board_rep.zobrist_key ^= zobrist.CASTLING_KEYS[board_rep.castling_rights]
+        board_rep.zobrist_key ^= zobrist.en_passant_key(board_rep.en_passant_square)
+        board_rep.zobrist_key ^= zobrist.SIDE_KEY # The other side is to move now
 
-        self._handle_captures(move,moved_piece,colour,ep_square_before_move)
+        if flags == KING_CASTLE or flags == QUEEN_CASTLE:
+            self.make_castle(move, side)
 
-        self._update_game_state(move,moved_piece,colour)
+        # Move piece
+        board_rep.remove_piece(source_index)
 
-        # If we moved the king to the square that is 2 squares away to the left or to the right,
-        # we are trying to castle, and so we should 
-        is_castle = moved_piece == 'king' and abs(conversions.square_to_index(source_square) - conversions.square_to_index(target_square)) == 2
-        if is_castle:
-            self.make_castle(move, colour)
+        if flags & PROMOTION:
+            board_rep.put_piece(target_index, side * 6 + promotion_piece(move)) # The pawn turns into the piece it promotes to
+        else:
+            board_rep.put_piece(target_index, moved_piece)
 
-        # Move piece
-        self.unset_bit(source_square, moved_piece, colour)
-        self.set_bit(target_square, moved_piece, colour)
-
-        # If a pawn is on the last rank it is a promotion square we just moved into
-        is_promotion_square = any(target_square == 1<<i for i in range(55,64)) if colour == "white" else any(target_square==1<<i for i in range(0,8))
-
-        if moved_piece == "pawn" and is_promotion_square:
-            self.unset_bit(target_square,moved_piece,colour) #unset the pawn from the back rank
-            self.set_bit(target_square,"queen",colour) #set a new queen
-
-        return unmake_info
-
-    def _handle_captures(self, move:tuple[int,int], moved_piece:str, colour:str, ep_square_before_move:int) -> None:
-        """Changes the states of a board if a piece has been captured"""
-        _,target_square = move
-        opponent_colour = "black" if colour=="white" else "white"
-        opponent_board = self.board_rep.bitboard_black if colour == "white" else self.board_rep.bitboard_white
-        if moved_piece == 'pawn' and target_square == ep_square_before_move:
-            captured_pawn_square = (target_square >> 8) if colour == "white" else (target_square << 8)
-            self.unset_bit(captured_pawn_square, 'pawn', opponent_colour)
-        else: 
-            captured_piece = next((p for p, bb in opponent_board.items() if bb & target_square), None)
-            if captured_piece:
-                self.unset_bit(target_square, captured_piece, opponent_colour)
-
-                #if one of the rooks has been captured, castling on that side is not allowed anymore
-                if target_square == 1: self.board_rep.castling_white[1] = False
-                if target_square == 1<<7: self.board_rep.castling_white[0] = False
-
-                if target_square == 1<<56: self.board_rep.castling_black[1] = False
-                if target_square == 1<<63: self.board_rep.castling_black[0] = False
-
-    def _update_game_state(self, move:tuple[int,int], moved_piece:str, colour:str):
+    def make_null_move(self) -> None:
+        """
+        Passes the turn to the other side without moving anything (for null-move pruning), only the en passant
+        square and the side to move change. unmake_move takes it back like any other move
+        """
+        board_rep = self.board_rep
+        if board_rep.ply == len(board_rep.undo_stack):
+            board_rep.undo_stack.append([NO_MOVE, EMPTY, EMPTY, 0, 0, 0, 0, 0, 0, 0])
+        undo = board_rep.undo_stack[board_rep.ply]
+        board_rep.ply += 1
+        undo[0] = NO_MOVE
+        undo[5] = board_rep.en_passant_square
+        undo[6] = board_rep.zobrist_key
+        board_rep.zobrist_key ^= zobrist.en_passant_key(board_rep.en_passant_square) ^ zobrist.SIDE_KEY
+        board_rep.en_passant_square = 0
+
+    def _handle_captures(self, move:int, side:int) -> tuple[int, int]:
+        """
+        Takes the captured piece off the board,
+        returns the captured piece and the index of the square it was on
+        """
+        target_index = (move >> 6) & 63
+        if move >> 12 == EN_PASSANT: # The captured pawn is behind the square we move to
+            captured_index = target_index - 8 if side == WHITE else target_index + 8
+        else:
+            captured_index = target_index
+        return self.board_rep.remove_piece(captured_index), captured_index
+
+    def _update_game_state(self, move:int, side:int):
         """Handles changes in state that don't involve captures"""
-        source_square,target_square = move
+        source_index = move & 63
+        target_index = (move >> 6) & 63
 
-        if moved_piece == "pawn" and abs(conversions.square_to_index(source_square) - conversions.square_to_index(target_square)) == 16:
-            self.board_rep.en_passant_square = (source_square << 8) if colour == "white" else (source_square >> 8)
+        if move >> 12 == DOUBLE_PAWN_PUSH: # The square the pawn jumped over can be captured en passant
+            self.board_rep.en_passant_square = 1 << ((source_index + target_index) // 2)
         else:
             self.board_rep.en_passant_square = 0
 
-        # If the king moves it can't castle in any direction anymore
-        if moved_piece == 'king':
-            if colour == 'white':
-                self.board_rep.castling_white = [False, False]
-            else:
-                self.board_rep.castling_black = [False, False]
-
-        # If a rook moves the king can't castle in that direction anymore
-        if moved_piece == 'rook':
-            if colour == 'white':
-                if source_square == 1: #a1 rook
-                    self.board_rep.castling_white[1] = False
-                elif source_square == 1<<7: #h8 rook
-                    self.board_rep.castling_white[0] = False
-            if colour == 'black':
-                if source_square == 1<<56: #a8
-                    self.board_rep.castling_black[1] = False
-                elif source_square == 1<<63: #g8 rook
-                    self.board_rep.castling_black[0] = False
-
-    def make_castle(self, move:tuple[int,int], colour:str):
+        # If the king or a rook moves the king can't castle (in that direction) anymore,
+        # and neither can it if a rook is captured before it moved
+        self.board_rep.castling_rights &= CASTLING_RIGHTS_MASK[source_index] & CASTLING_RIGHTS_MASK[target_index]
+
+    def make_castle(self, move:int, side:int):
         """
         Castles the king: This involves going with the king to squares to the right
         (or to the left) and putting the rook on the square directly to the left 
         (or to the right) of the king
         """
-        source_square,target_square = move
+        target_index = (move >> 6) & 63
 
         # king-side castle
-        if target_square > source_square:
-            rook_start_square = target_square << 1
-            rook_end_square = target_square >> 1
+        if move >> 12 == KING_CASTLE:
+            rook_start_index = target_index + 1
+            rook_end_index = target_index - 1
 
         # Queen-side castle
         else:
-            rook_start_square = target_square >> 2
-            rook_end_square = target_square << 1
-
-        self.unset_bit(rook_start_square, 'rook', colour)
-        self.set_bit(rook_end_square, 'rook', colour)
-
-    def unmake_move(self, unmake_info:UnmakeInfo) -> None:
-        """ Changes the board state to a whatever the user wants"""
-        # This function is used primarily as a means to change the board state back
-        # to what it was before a move was made, but it can realistically be use to change
-        # to any board state a user wants
-        self.board_rep.bitboard_white = unmake_info["bitboard_white"]
-        self.board_rep.bitboard_black = unmake_info["bitboard_black"]
-        self.board_rep.castling_white = unmake_info["castling_white"]
-        self.board_rep.castling_black = unmake_info["castling_black"]
-        self.board_rep.en_passant_square = unmake_info["en_passant_square"]
+            rook_start_index = target_index - 2
+            rook_end_index = target_index + 1
+
+        self.board_rep.remove_piece(rook_start_index)
+        self.board_rep.put_piece(rook_end_index, side * 6 + ROOK)
+
+    def unmake_move(self) -> None:
+        """Takes back the last move made on the board, using the record make_move left on the undo stack"""
+        board_rep = self.board_rep
+        board_rep.ply -= 1
+        (move, moved_piece, captured_piece, captured_index, castling_rights, en_passant_square, zobrist_key,
+         middlegame_score, endgame_score, phase) = board_rep.undo_stack[board_rep.ply]
+        if move == NO_MOVE: # A null move, nothing moved
+            board_rep.en_passant_square = en_passant_square
+            board_rep.zobrist_key = zobrist_key
+            return
+        source_index = move & 63
+        target_index = (move >> 6) & 63
+        flags = move >> 12
+        source_square = 1 << source_index
+        target_square = 1 << target_index
+        side = moved_piece // 6
+        bitboards = board_rep.bitboards
+        occupancy = board_rep.occupancy
+        mailbox = board_rep.mailbox
+
+        # Put the piece back where it came from (what is on the target square may be a promoted piece rather than moved_piece)
+        bitboards[mailbox[target_index]] &= ~target_square
+        bitboards[moved_piece] |= source_square
+        occupancy[side] ^= source_square | target_square
+        occupied = (board_rep.occupied & ~target_square) | source_square
+        mailbox[target_index] = EMPTY
+        mailbox[source_index] = moved_piece
+
+        if captured_piece != EMPTY: # Bring the captured piece back to life
+            captured_square = 1 << captured_index
+            bitboards[captured_piece] |= captured_square
+            occupancy[side ^ 1] |= captured_square
+            occupied |= captured_square
+            mailbox[captured_index] = captured_piece
+
+        if flags == KING_CASTLE or flags == QUEEN_CASTLE: # The rook goes back too
+            if flags == KING_CASTLE:
+                rook_start_index, rook_end_index = target_index + 1, target_index - 1
+            else:
+                rook_start_index, rook_end_index = target_index - 2, target_index + 1
+            rook_squares = (1 << rook_start_index) | (1 << rook_end_index)
+            bitboards[side * 6 + ROOK] ^= rook_squares
+            occupancy[side] ^= rook_squares
+            occupied ^= rook_squares
+            mailbox[rook_start_index] = side * 6 + ROOK
+            mailbox[rook_end_index] = EMPTY
+
+        board_rep.occupied = occupied
+        board_rep.castling_rights = castling_rights
+        board_rep.en_passant_square = en_passant_square
+        board_rep.zobrist_key = zobrist_key
+        board_rep.middlegame_score = middlegame_score
+        board_rep.endgame_score = endgame_score
+        board_rep.phase = phase
+
+def rook_attack_set(square_index: int, occupied: int) -> int:
+    """
+    Every square a rook on square_index attacks when the pieces on the board are occupied,
+    up to and including the first piece in each direction whoever it belongs to
+    """
+    blockers = occupied & attack_tables.ROOK_MAGIC_MASKS[square_index] # Get the relevant blockers
+
+    # Use the injective function we catered for when creating the lookup table 
+    magic_index = ((blockers * attack_tables.ROOK_MAGICS[square_index]) & 0xFFFFFFFFFFFFFFFF) >> attack_tables.ROOK_SHIFTS[square_index] 
+
+    # Get the starting index for this square's data within the flat ROOK_ATTACKS table. We have multiple "starts" of
+    # blocker patterns in one single list, so we need to navigate to the right one, which can be found in the offset table
+    return attack_tables.ROOK_ATTACKS[attack_tables.ROOK_ATTACK_OFFSETS[square_index] + magic_index]
+
+def bishop_attack_set(square_index: int, occupied: int) -> int:
+    """The same as rook_attack_set for a bishop"""
+    blockers = occupied & attack_tables.BISHOP_MAGIC_MASKS[square_index]
+    magic_index = ((blockers * attack_tables.BISHOP_MAGICS[square_index]) & 0xFFFFFFFFFFFFFFFF) >> attack_tables.BISHOP_SHIFTS[square_index] 
+    return attack_tables.BISHOP_ATTACKS[attack_tables.BISHOP_ATTACK_OFFSETS[square_index] + magic_index]
 
 class ValidMoves:
     """Adds the rules to the board representation"""
@@ -331,145 +465,198 @@ class ValidMoves:
         self.FILE_AB = self.FILE_A | (self.FILE_A << 1);
         self.FILE_GH = self.FILE_H | (self.FILE_H >> 1);
 
-    #Every time these are "called" (no need for ()) they are calculated/updated
+        # all_attacks of each side and the Zobrist key of the position it was worked out for
+        self._attack_maps = [0, 0]
+        self._attack_map_keys = [None, None]
+
+    #These are kept up to date by the board itself as pieces are put on and taken off it
     @property
     def white_pieces(self) -> int:
-        return sum(self.board_rep.bitboard_white.values())
+        return self.board_rep.occupancy[WHITE]
     @property
     def black_pieces(self) -> int:
-        return sum(self.board_rep.bitboard_black.values())
+        return self.board_rep.occupancy[BLACK]
     @property
     def occupied_squares(self) -> int:
-        return self.white_pieces|self.black_pieces
+        return self.board_rep.occupied
 
-    def king_attacks(self,king_bitboard:int,colour:str="white")->int:
+    def king_attacks(self,king_bitboard:int,colour:str | int="white")->int:
         """This returns only the raw attacks, see is_square_attacked for checking if the king is in check"""
-        own_pieces = self.white_pieces if colour == "white" else self.black_pieces 
-        attacks = ((king_bitboard >> 1) & ~self.FILE_H) | ((king_bitboard << 1) & ~self.FILE_A) |  \
-           ((king_bitboard >> 7) & ~self.FILE_A) | ((king_bitboard >> 9) & ~self.FILE_H) |  \
-           ((king_bitboard << 7) & ~self.FILE_H) | ((king_bitboard << 9) & ~self.FILE_A) |  \
-           (king_bitboard >> 8) | (king_bitboard << 8)
-        
-        # Add a 64-bit mask to discard any "off-board" bits before returning
-        # Since the king works solely off bit operations we could shift a bit so much it goes off the board
-        return attacks & 0xFFFFFFFFFFFFFFFF & ~own_pieces
+        own_pieces = self.board_rep.occupancy[SIDES[colour]]
+        return attack_tables.KING_ATTACKS[king_bitboard.bit_length() - 1] & ~own_pieces
 
-    def can_castle(self,colour:str="white") -> tuple[bool,bool]:
+    def can_castle(self,colour:str | int="white") -> tuple[bool,bool]:
         """Returns a tuple showing if that colour can castle king-side or queen-side""" 
-        rights = self.board_rep.castling_white if colour == "white" else self.board_rep.castling_black
+        side = SIDES[colour]
+        rights = self.board_rep.castling_rights >> (2 * side) # Bring this side's two bits to the bottom
+        if not rights & (CASTLE_WHITE_KING | CASTLE_WHITE_QUEEN):
+            return (False, False)
+        occupied = self.board_rep.occupied
+        shift = 0 if side == WHITE else 56 # The same squares on the eighth rank for black
 
         #King-side Check
-        can_castle_ks = rights[0]  # Start with the stored right
-        if can_castle_ks:  # Only check further if the right hasn't been lost
-            # f1 | g1 if white else f8 | g8
-            path_squares = (1 << 5) | (1 << 6) if colour == "white" else (1 << 61) | (1 << 62)
-            if self.occupied_squares & path_squares: # If there are pieces in the path squares we know we can't castle
-                can_castle_ks = False
-            else:
-                # We need to check that the king isn't in check and that the squares between it and c8 aren't aren't being attacked
-                attack_check_squares = [1 << 4, 1 << 5, 1 << 6] if colour == "white" else [1 << 60, 1 << 61, 1 << 62]
-                if any(self.is_square_attacked(sq, colour) for sq in attack_check_squares):
-                    can_castle_ks = False
+        can_castle_ks = bool(rights & CASTLE_WHITE_KING)  # Start with the stored right
+        # If there are pieces on f1 or g1 we know we can't castle
+        if can_castle_ks and occupied & (((1 << 5) | (1 << 6)) << shift):
+            can_castle_ks = False
 
         #Queen-side Check
-        can_castle_qs = rights[1]  # Start with the stored right
-        if can_castle_qs:  # Only check further if the right hasn't been lost
-
-            # a1 | b1 | c1 if white else b8 | c8 | d8                                  
-            path_squares = (1 << 1) | (1 << 2) | (1 << 3) if colour == "white" else (1 << 57) | (1 << 58) | (1 << 59)
-            if self.occupied_squares & path_squares: # If there are pieces in the path squares we know we can't castle
+        can_castle_qs = bool(rights & CASTLE_WHITE_QUEEN)  # Start with the stored right
+        # If there are pieces on b1, c1 or d1 we know we can't castle
+        if can_castle_qs and occupied & (((1 << 1) | (1 << 2) | (1 << 3)) << shift):
+            can_castle_qs = False
+
+        if can_castle_ks or can_castle_qs:
+            # The king can't be in check, nor pass through or land on an attacked square (e1 to g1, or e1 to c1)
+            attacked = self.all_attacks(side ^ 1) >> shift
+            if attacked & ((1 << 4) | (1 << 5) | (1 << 6)):
+                can_castle_ks = False
+            if attacked & ((1 << 4) | (1 << 3) | (1 << 2)):
                 can_castle_qs = False
-            else:
-                # We need to check that the king isn't in check and that the squares between it and c8 aren't aren't being attacked
-                attack_check_squares = [1 << 4, 1 << 3, 1 << 2] if colour == "white" else [1 << 60, 1 << 59, 1 << 58] 
-                if any(self.is_square_attacked(sq, colour) for sq in attack_check_squares):
-                    can_castle_qs = False
 
         return (can_castle_ks, can_castle_qs)
 
-    def is_square_attacked(self,square_bb:int,defender_colour:str) ->bool:
+    def is_square_attacked(self,square_bb:int,defender_colour:str | int) ->bool:
         """Checks if a (single) square is under attack"""
+        if not square_bb:
+            return False
+        defender = SIDES[defender_colour]
+        return bool(self.attackers_to(square_bb.bit_length() - 1) & self.board_rep.occupancy[defender ^ 1])
 
-        attacker_board = self.board_rep.bitboard_white if defender_colour== "black" else self.board_rep.bitboard_black
-
-        if defender_colour == "black":
-            #if the colour of the attacker is white then the pawn atttacks up meaning
-            #we need to check if there are pawns behind us
-            potential_attackers = ((square_bb>>9) & ~self.FILE_H) | ((square_bb>>7) & ~self.FILE_A)
-            if potential_attackers & attacker_board["pawn"]:
-                return True
-        elif defender_colour == "white":
-            #if the colour of the attacker is white then the pawn atttacks down meaning
-            #we need to check if there are pawns above us
-            potential_attackers = ((square_bb<<9) & ~self.FILE_A) | ((square_bb<<7) & ~self.FILE_H)
-            if potential_attackers & attacker_board["pawn"]:
-                return True
-
-        if self.knight_attacks(square_bb, defender_colour) & attacker_board["knight"]:
-            return True #if there is a knight a 'knight-away' from this square it means that it is being attacked by that knight 
-        
-        if self.queen_attacks(square_bb, defender_colour) & attacker_board["queen"]:
-            return True #if there is a queen a 'queen-away' from this square it means that it is being attacked by that queen 
-
-        if self.bishop_attacks(square_bb, defender_colour) & attacker_board["bishop"]:
-            return True #if there is a bishop a 'bishop-away' from this square it means that it is being attacked by that bishop 
-
-        if self.rook_attacks(square_bb, defender_colour) & attacker_board["rook"]:
-            return True #if there is a rook a 'rook-away' from this square it means that it is being attacked by that rook 
-        if self.king_attacks(square_bb,defender_colour) & attacker_board["king"]:
-            return True #if there is a king a 'king-away' from this square it means that it is being attacked by that king 
-
-        return False #if no pieces attacks that square, then return false
-
-    def knight_attacks(self,piece_bitboard:int,colour:str="white") -> int:
+    def attackers_to(self, square_index: int, occupied: int | None = None) -> int:
+        """
+        Every piece, of either side, attacking the square when the pieces on the board are occupied (the board as
+        it is by default). Pieces left out of occupied are neither attackers nor blockers, so taking the attackers
+        off one by one uncovers the ones lined up behind them (x-rays)
+        """
+        bitboards = self.board_rep.bitboards
+        if occupied is None:
+            occupied = self.board_rep.occupied
+        # A pawn of one side on the square would attack exactly the squares the other side's pawns attack it from
+        attackers = ((attack_tables.PAWN_ATTACKS[BLACK][square_index] & bitboards[PAWN]) |
+                     (attack_tables.PAWN_ATTACKS[WHITE][square_index] & bitboards[6 + PAWN]) |
+                     (attack_tables.KNIGHT_ATTACKS[square_index] & (bitboards[KNIGHT] | bitboards[6 + KNIGHT])) |
+                     (attack_tables.KING_ATTACKS[square_index] & (bitboards[KING] | bitboards[6 + KING])))
+        queens = bitboards[QUEEN] | bitboards[6 + QUEEN]
+        # A queen attacks like a bishop and like a rook, so it is looked for along with both
+        diagonal_sliders = bitboards[BISHOP] | bitboards[6 + BISHOP] | queens
+        if diagonal_sliders:
+            attackers |= bishop_attack_set(square_index, occupied) & diagonal_sliders
+        straight_sliders = bitboards[ROOK] | bitboards[6 + ROOK] | queens
+        if straight_sliders:
+            attackers |= rook_attack_set(square_index, occupied) & straight_sliders
+        return attackers & occupied
+
+    def see(self, move: int) -> int:
+        """
+        Static exchange evaluation: the material the side making the move wins (negative if it loses) once both
+        sides have recaptured on the target square, cheapest piece first, each free to stop when going on loses.
+        Pins are ignored, and the attackers behind the pieces taken off (x-rays) join in as they are uncovered
+        """
+        bitboards = self.board_rep.bitboards
+        occupancy = self.board_rep.occupancy
+        mailbox = self.board_rep.mailbox
+        source_index = move & 63
+        target_index = (move >> 6) & 63
+        flags = move >> 12
+        attacker = mailbox[source_index]
+        side = attacker // 6
+
+        occupied = self.board_rep.occupied ^ (1 << source_index)
+        if flags == EN_PASSANT:
+            gain = SEE_VALUES[PAWN]
+            occupied ^= 1 << (target_index - 8 if side == WHITE else target_index + 8) # The pawn taken isn't on the target square
+        elif flags & CAPTURE:
+            gain = SEE_VALUES[mailbox[target_index] % 6]
+        else:
+            gain = 0
+        on_target = SEE_VALUES[attacker % 6] # What the next capture on the target square wins
+        if flags & PROMOTION:
+            on_target = SEE_VALUES[promotion_piece(move)]
+            gain += on_target - SEE_VALUES[PAWN]
+
+        gains = [gain]
+        attackers = self.attackers_to(target_index, occupied)
+        diagonal_sliders = bitboards[BISHOP] | bitboards[6 + BISHOP] | bitboards[QUEEN] | bitboards[6 + QUEEN]
+        straight_sliders = bitboards[ROOK] | bitboards[6 + ROOK] | bitboards[QUEEN] | bitboards[6 + QUEEN]
+        side ^= 1
+        while True:
+            side_attackers = attackers & occupancy[side]
+            if not side_attackers:
+                break
+            for piece in range(PAWN, KING + 1): # The least valuable attacker recaptures
+                pieces = side_attackers & bitboards[side * 6 + piece]
+                if pieces:
+                    break
+            if piece == KING and attackers & occupancy[side ^ 1]:
+                break # The king can't take a defended piece
+            gains.append(on_target - gains[-1])
+            on_target = SEE_VALUES[piece]
+            occupied ^= pieces & -pieces
+            # Only sliders can be uncovered, and only behind a piece on the same kind of line to the target square
+            if piece in (PAWN, BISHOP, QUEEN, KING):
+                attackers |= bishop_attack_set(target_index, occupied) & diagonal_sliders
+            if piece in (ROOK, QUEEN, KING):
+                attackers |= rook_attack_set(target_index, occupied) & straight_sliders
+            attackers &= occupied
+            side ^= 1
+
+        # Going back from the last capture, each side only captures if that is better than stopping
+        for i in range(len(gains) - 1, 0, -1):
+            gains[i - 1] = -max(-gains[i - 1], gains[i])
+        return gains[0]
+
+    def all_attacks(self, colour: str | int) -> int:
+        """
+        Every square the side attacks, with the sliders seeing through the other side's king: a king can't step
+        back along the line it is checked on. These are the squares the other king can't go to, whether moving
+        or castling. Worked out once per position and kept until the position changes
+        """
+        side = SIDES[colour]
+        key = self.board_rep.zobrist_key
+        if self._attack_map_keys[side] != key:
+            enemy_king = self.board_rep.bitboards[(side ^ 1) * 6 + KING]
+            self._attack_maps[side] = self._attack_map(side, self.board_rep.occupied ^ enemy_king)
+            self._attack_map_keys[side] = key
+        return self._attack_maps[side]
+
+    def knight_attacks(self,piece_bitboard:int,colour:str | int="white") -> int:
         """Finds which squares a knight is attacking"""
         
-        own_pieces = self.white_pieces if colour == "white" else self.black_pieces 
-        knight_attacks = ((piece_bitboard >> 15) & ~self.FILE_A) | \
-                ((piece_bitboard << 15) & ~self.FILE_H) | \
-                ((piece_bitboard << 10) & ~self.FILE_AB) | \
-                ((piece_bitboard >> 10) & ~self.FILE_GH) | \
-                ((piece_bitboard << 17) & ~self.FILE_A) | \
-                ((piece_bitboard >> 17) & ~self.FILE_H) | \
-                ((piece_bitboard << 6)  & ~self.FILE_GH) | \
-                ((piece_bitboard >> 6)  & ~self.FILE_AB)
-
-        #TODO: HARD CODE VALUES LIKE WE DID WITH BISHOPS,ROOKS AND QUEENS 
-        knight_attacks &= ~own_pieces
-        return knight_attacks & 0xFFFFFFFFFFFFFFFF #We have to and it with the board
-        #otherwise shifting the bits would leave the board to a square we don't know of
-        #and therefore can't do &self.notSOMEFILE
+        own_pieces = self.board_rep.occupancy[SIDES[colour]]
+        return attack_tables.KNIGHT_ATTACKS[piece_bitboard.bit_length() - 1] & ~own_pieces
     
-    def pawn_attacks(self,pawn_bitboard:int,colour:str="white")->int:
+    def pawn_attacks(self,pawn_bitboard:int,colour:str | int="white")->int:
         """Finds which squares a pawn is attacking, including moves, captures, and en passant."""
         moves = 0
         attacks = 0
         en_passant_move = 0
+        empty_squares = ~self.board_rep.occupied
 
-        if colour == "white":
+        if SIDES[colour] == WHITE:
             # If we are white we go up the board so <<8 is the correct direction to push
-            enemy_pieces = self.black_pieces
-            single_push = (pawn_bitboard << 8) & ~self.occupied_squares # We can't move if there is a piece right in front
+            enemy_pieces = self.board_rep.occupancy[BLACK]
+            single_push = (pawn_bitboard << 8) & empty_squares # We can't move if there is a piece right in front
             if single_push and (pawn_bitboard & constants.RANK_2): # If we are in the starting rank we may double push
-                double_push = (pawn_bitboard << 16) & ~self.occupied_squares
+                double_push = (pawn_bitboard << 16) & empty_squares
                 moves = single_push | double_push
             else:
                 moves = single_push
-            pseudo_attacks = ((pawn_bitboard << 9) & ~self.FILE_A) | ((pawn_bitboard << 7) & ~self.FILE_H) # If we are white the attacks are NW and NE the board
+            pseudo_attacks = attack_tables.PAWN_ATTACKS[WHITE][pawn_bitboard.bit_length() - 1] # If we are white the attacks are NW and NE the board
             attacks = pseudo_attacks & enemy_pieces # We can only attack those squares if there are enemy pieces there 
             if self.board_rep.en_passant_square: # If the enpassant square is not 0
                 if pseudo_attacks & self.board_rep.en_passant_square:
                     en_passant_move = self.board_rep.en_passant_square
 
-        elif colour == "black":
-            enemy_pieces = self.white_pieces
-            single_push = (pawn_bitboard >> 8) & ~self.occupied_squares
+        else:
+            enemy_pieces = self.board_rep.occupancy[WHITE]
+            single_push = (pawn_bitboard >> 8) & empty_squares
             if single_push and (pawn_bitboard & constants.RANK_7):
-                double_push = (pawn_bitboard >> 16) & ~self.occupied_squares
+                double_push = (pawn_bitboard >> 16) & empty_squares
                 moves = single_push | double_push
             else:
                 moves = single_push
-            pseudo_attacks = ((pawn_bitboard >> 9) & ~self.FILE_H) | ((pawn_bitboard >> 7) & ~self.FILE_A)
+            pseudo_attacks = attack_tables.PAWN_ATTACKS[BLACK][pawn_bitboard.bit_length() - 1]
             attacks = pseudo_attacks & enemy_pieces
             if self.board_rep.en_passant_square:
                 if pseudo_attacks & self.board_rep.en_passant_square:
@@ -477,101 +664,293 @@ class ValidMoves:
 
         return attacks | moves | en_passant_move & 0xFFFFFFFFFFFFFFFF #Since these are shifting operations we are applying, we may leave the board, therefore it is safe to apply that board mask
 
-    def hyperbola_quint(self,slider_bitboard:int,mask:int,colour:str = "white") -> int: #slider attacks formula
-        """Uses the hyperbola quintessential formula to calculate how the slider attacks stop at a piece on their way"""
-        #formula : ((o&m)-2s)^reverse(reverse(o&m)-2reverse(s))&m
-        sliderAttacks = (((self.occupied_squares & mask) - (slider_bitboard<< 1)) ^
-                        conversions.reverse_bitboard(conversions.reverse_bitboard(self.occupied_squares & mask) - (conversions.reverse_bitboard(slider_bitboard) << 1))) & mask
-
-        return sliderAttacks
-
-    def rook_attacks(self,rook_bitboard:int,colour:str = "white")->int:
+    def rook_attacks(self,rook_bitboard:int,colour:str | int = "white")->int:
         """Finds which square a rook is attacking using magic bitboards"""
+        own_pieces = self.board_rep.occupancy[SIDES[colour]]
+        return rook_attack_set(conversions.square_to_index(rook_bitboard), self.board_rep.occupied) & ~own_pieces
 
-        own_pieces = self.white_pieces if colour == "white" else self.black_pieces 
-        square_index = conversions.square_to_index(rook_bitboard)
-
-        blockers = self.occupied_squares & constants.ROOK_MAGIC_MASKS[square_index] # Get the relevant blockers
-
-        # Use the injective function we catered for when creating the lookup table 
-        magic_index = ((blockers * constants.ROOK_MAGICS[square_index]) & 0xFFFFFFFFFFFFFFFF) >> constants.ROOK_SHIFTS[square_index] 
-
-        
-        base_offset = constants.ROOK_ATTACK_OFFSETS[square_index] # Get the starting index for this square's data within the flat BISHOP_ATTACKS 
-        #table. We have multiple "starts" of blocker patterns in one single list, so we need to navigate to the right one, which can be found in
-        # the offset table
-
-        attacks = constants.ROOK_ATTACKS[base_offset + magic_index]
-        
-        return attacks & ~own_pieces
-
-    def bishop_attacks(self,bishop_bitboard:int,colour:str = "white") -> int:
+    def bishop_attacks(self,bishop_bitboard:int,colour:str | int = "white") -> int:
         """Finds which squares a bishop is attacking using magic bitboards""" 
+        own_pieces = self.board_rep.occupancy[SIDES[colour]]
+        return bishop_attack_set(conversions.square_to_index(bishop_bitboard), self.board_rep.occupied) & ~own_pieces
 
-        own_pieces = self.white_pieces if colour == "white" else self.black_pieces 
-        square_index = conversions.square_to_index(bishop_bitboard) #Convert the bitboard to index
-
-        blockers = self.occupied_squares & constants.BISHOP_MAGIC_MASKS[square_index] # Get the relevant blockers
-
-        # Use the injective function we catered for when creating the lookup table
-        magic_index = ((blockers * constants.BISHOP_MAGICS[square_index]) & 0xFFFFFFFFFFFFFFFF) >> constants.BISHOP_SHIFTS[square_index] 
-        
-        base_offset = constants.BISHOP_ATTACK_OFFSETS[square_index] # Get the starting index for this square's data within the flat BISHOP_ATTACKS 
-        #table. We have multiple "starts" of blocker patterns in one single list, so we need to navigate to the right one, which can be found in
-        # the offset table
-        
-        attacks = constants.BISHOP_ATTACKS[base_offset + magic_index]
-        
-        return attacks & ~own_pieces
-
-    def queen_attacks(self,queen_bitboard:int,colour:str = "white") -> int:
+    def queen_attacks(self,queen_bitboard:int,colour:str | int = "white") -> int:
         """Finds the squares the queen is attacking (they are just a rooks and a bishop in one piece)"""
         return self.rook_attacks(queen_bitboard,colour)|self.bishop_attacks(queen_bitboard,colour) 
 
-    def generate_pseudo_legal_moves(self, colour: str) -> list:
+    def generate_pseudo_legal_moves(self, colour: str | int) -> array:
         """Generate all legal moves, without considering if the king is going to be in check"""
-        pseudo_legal_moves = []
-        attack_functions = {
-            "pawn": self.pawn_attacks, "rook": self.rook_attacks,
-            "knight": self.knight_attacks, "bishop": self.bishop_attacks,
-            "queen": self.queen_attacks, "king": self.king_attacks
-        }
-        current_player_bb = self.board_rep.bitboard_white if colour == "white" else self.board_rep.bitboard_black
+        side = SIDES[colour]
+        pseudo_legal_moves = move_list()
+        append = pseudo_legal_moves.append
+        bitboards = self.board_rep.bitboards
+        enemy_pieces = self.board_rep.occupancy[side ^ 1]
+
+        # Pawns first, they are the only pieces that can make moves other than plain moves and captures
+        en_passant_square = self.board_rep.en_passant_square
+        promotion_rank = constants.RANK_8 if side == WHITE else constants.RANK_1
+        source_squares = bitboards[side * 6 + PAWN]
+        while source_squares:
+            source = source_squares & -source_squares
+            source_index = source.bit_length() - 1
+            target_squares = self.pawn_attacks(source, side)
+            while target_squares:
+                target = target_squares & -target_squares
+                target_index = target.bit_length() - 1
+                if target & enemy_pieces:
+                    flags = CAPTURE
+                elif target == en_passant_square:
+                    flags = EN_PASSANT
+                elif abs(target_index - source_index) == 16:
+                    flags = DOUBLE_PAWN_PUSH
+                else:
+                    flags = QUIET
+
+                move = source_index | (target_index << 6)
+                if target & promotion_rank: # One move for every piece the pawn can become, queen first
+                    for promotion in (3, 2, 1, 0):
+                        append(move | ((PROMOTION | flags | promotion) << 12))
+                else:
+                    append(move | (flags << 12))
+                target_squares &= target_squares - 1
+            source_squares &= source_squares - 1
+
+        # Indexed by piece code
+        attack_functions = (None, self.knight_attacks, self.bishop_attacks,
+                            self.rook_attacks, self.queen_attacks, self.king_attacks)
 
         # Generate all piece moves
-        for piece, bitboard in current_player_bb.items():
-            source_squares = bitboard
+        for piece in range(KNIGHT, KING + 1):
+            source_squares = bitboards[side * 6 + piece]
+            attack_function = attack_functions[piece]
             while source_squares:
                 source = source_squares & -source_squares # Take the first bit (from right to left) of that bitboard
-                target_squares = attack_functions[piece](source, colour)
+                source_index = source.bit_length() - 1
+                target_squares = attack_function(source, side)
                 while target_squares:
                     target = target_squares & -target_squares # Take the first bit (from right to left) of the target squares
-                    pseudo_legal_moves.append((source, target)) # That is a move we can make 
+                    flags = CAPTURE if target & enemy_pieces else QUIET
+                    append(source_index | ((target.bit_length() - 1) << 6) | (flags << 12)) # That is a move we can make 
                     target_squares &= target_squares - 1 # Clears the target square we just calculated
                 source_squares &= source_squares - 1 # Clears the source square for the (single) piece we just calculated
 
         # Note can_castle already checks if the king passes through check, so this is safe
-        castling_rights = self.can_castle(colour)
+        castling_rights = self.can_castle(side)
         if castling_rights[0]:  # King-side
-            pseudo_legal_moves.append((1 << 4, 1 << 6) if colour == "white" else (1 << 60, 1 << 62))
+            append(encode_move(4, 6, KING_CASTLE) if side == WHITE else encode_move(60, 62, KING_CASTLE))
         if castling_rights[1]:  # Queen-side
-            pseudo_legal_moves.append((1 << 4, 1 << 2) if colour == "white" else (1 << 60, 1 << 58))
+            append(encode_move(4, 2, QUEEN_CASTLE) if side == WHITE else encode_move(60, 58, QUEEN_CASTLE))
             
         return pseudo_legal_moves
 
-    def generate_all_legal_moves(self, colour: str) -> list:
+    def generate_captures(self, colour: str | int) -> array:
         """
-        Generate all legal moves, checking if the king is going to be in check,
-        we only use this for the user
+        Generate only the captures and promotions (what the quiescence search looks at), without considering
+        if the king is going to be in check. Same moves as the ones generate_pseudo_legal_moves flags as such,
+        but only enemy squares are ever looked at, so it is a lot cheaper
         """
-        pseudo_moves = self.generate_pseudo_legal_moves(colour) #Generate all moves
-        legal_moves = []
-
-        for move in pseudo_moves:
-            unmake_info = self.move_handler.make_move(move, colour)
-            king_bb = self.board_rep.bitboard_white["king"] if colour == "white" else self.board_rep.bitboard_black["king"]
-            if not self.is_square_attacked(king_bb, colour): #Checks if the move we made  will leave the king in check
-                legal_moves.append(move) # If not, that is a legal move
-            self.move_handler.unmake_move(unmake_info)
+        side = SIDES[colour]
+        captures = move_list()
+        append = captures.append
+        bitboards = self.board_rep.bitboards
+        enemy_pieces = self.board_rep.occupancy[side ^ 1]
+        pawns = bitboards[side * 6 + PAWN]
+
+        # Pawns are done all at once: shifting the whole bitboard gives every target square,
+        # and the source square is always the same distance away from its target
+        if side == WHITE:
+            promotion_rank = constants.RANK_8
+            pawn_targets = (((pawns << 7) & ~self.FILE_H, 7), ((pawns << 9) & ~self.FILE_A, 9), # Captures NW and NE
+                            ((pawns << 8) & ~self.board_rep.occupied & promotion_rank, 8)) # Pushes to the last rank
+        else:
+            promotion_rank = constants.RANK_1
+            pawn_targets = (((pawns >> 9) & ~self.FILE_H, -9), ((pawns >> 7) & ~self.FILE_A, -7),
+                            ((pawns >> 8) & ~self.board_rep.occupied & promotion_rank, -8))
+
+        en_passant_square = self.board_rep.en_passant_square
+        for target_squares, offset in pawn_targets:
+            flags = QUIET if offset in (8, -8) else CAPTURE
+            if flags == CAPTURE:
+                if target_squares & en_passant_square:
+                    target_index = en_passant_square.bit_length() - 1
+                    append((target_index - offset) | (target_index << 6) | (EN_PASSANT << 12))
+                target_squares &= enemy_pieces
+            target_squares &= 0xFFFFFFFFFFFFFFFF
+            while target_squares:
+                target = target_squares & -target_squares
+                target_index = target.bit_length() - 1
+                move = (target_index - offset) | (target_index << 6)
+                if target & promotion_rank: # One move for every piece the pawn can become, queen first
+                    for promotion in (3, 2, 1, 0):
+                        append(move | ((PROMOTION | flags | promotion) << 12))
+                else:
+                    append(move | (flags << 12))
+                target_squares &= target_squares - 1
+
+        # Indexed by piece code
+        attack_functions = (None, self.knight_attacks, self.bishop_attacks,
+                            self.rook_attacks, self.queen_attacks, self.king_attacks)
+
+        for piece in range(KNIGHT, KING + 1):
+            source_squares = bitboards[side * 6 + piece]
+            attack_function = attack_functions[piece]
+            while source_squares:
+                source = source_squares & -source_squares
+                source_index = source.bit_length() - 1
+                target_squares = attack_function(source, side) & enemy_pieces # Only the squares with something to take
+                while target_squares:
+                    target = target_squares & -target_squares
+                    append(source_index | ((target.bit_length() - 1) << 6) | (CAPTURE << 12))
+                    target_squares &= target_squares - 1
+                source_squares &= source_squares - 1
+
+        return captures
+
+    def generate_all_legal_moves(self, colour: str | int) -> array:
+        """Generate all legal moves, the pseudo-legal moves that don't leave the king in check"""
+        side = SIDES[colour]
+        return self.filter_legal(self.generate_pseudo_legal_moves(side), side)
+
+    def filter_legal(self, moves, colour: str | int) -> array:
+        """Keeps the moves (of the side to move, e.g. from generate_captures) that don't leave the king in check"""
+        legal_moves = move_list()
+        legal_moves.extend(filter(self.legality_check(colour), moves))
         return legal_moves
 
+    def legality_check(self, colour: str | int) -> Callable[[int], bool]:
+        """
+        Returns a function telling if a pseudo-legal move of the side to move leaves its king in check, so the
+        search can skip the illegal moves without making them. Instead of making every move and looking at the
+        king, the checks and pins are worked out once: with the king in check a move has to capture the checker
+        or block it (the evasion mask), a pinned piece can only move along its pin line, and the king can only
+        go to squares the enemy doesn't attack once the king is out of the way. Only en passant, which takes
+        two pieces off a line at once, is still made and taken back
+        """
+        side = SIDES[colour]
+        king_bb = self.board_rep.bitboards[side * 6 + KING]
+        if not king_bb: # No king to leave in check (positions set up for the tests)
+            return lambda move: True
+        king_index = king_bb.bit_length() - 1
+        _, evasion_mask, pinned = self._checks_and_pins(side, king_index)
+        pin_lines = attack_tables.LINE[king_index * 64:king_index * 64 + 64]
+        king_danger = None # Only worked out once there is a king move to look at
+
+        def is_legal(move: int) -> bool:
+            nonlocal king_danger
+            source_index = move & 63
+            target = 1 << ((move >> 6) & 63)
+            if source_index == king_index: # Castling was already checked by can_castle
+                if king_danger is None:
+                    king_danger = self.all_attacks(side ^ 1)
+                return not target & king_danger
+            if move >> 12 == EN_PASSANT:
+                return self._is_legal_by_making(move, side)
+            return bool(target & evasion_mask and (not (pinned >> source_index) & 1 or target & pin_lines[source_index]))
+
+        return is_legal
+
+    def has_legal_move(self, colour: str | int) -> bool:
+        """
+        If the side has any legal move at all, without generating them: the answer is almost always yes
+        and the first piece that can go anywhere gives it. No legal move means checkmate or stalemate
+        """
+        side = SIDES[colour]
+        bitboards = self.board_rep.bitboards
+        king_bb = bitboards[side * 6 + KING]
+        if not king_bb:
+            return bool(self.generate_pseudo_legal_moves(side))
+        king_index = king_bb.bit_length() - 1
+        _, evasion_mask, pinned = self._checks_and_pins(side, king_index)
+
+        if evasion_mask: # In double check only the king can move
+            line = attack_tables.LINE
+            attack_functions = (self.pawn_attacks, self.knight_attacks, self.bishop_attacks, self.rook_attacks, self.queen_attacks)
+            en_passant_square = self.board_rep.en_passant_square
+            for piece in (KNIGHT, BISHOP, ROOK, QUEEN, PAWN):
+                source_squares = bitboards[side * 6 + piece]
+                attack_function = attack_functions[piece]
+                while source_squares:
+                    source = source_squares & -source_squares
+                    source_index = source.bit_length() - 1
+                    targets = attack_function(source, side)
+                    if source & pinned:
+                        targets &= line[king_index * 64 + source_index]
+                    if piece == PAWN and targets & en_passant_square:
+                        targets ^= en_passant_square
+                        target_index = en_passant_square.bit_length() - 1
+                        if self._is_legal_by_making(source_index | (target_index << 6) | (EN_PASSANT << 12), side):
+                            return True
+                    if targets & evasion_mask:
+                        return True
+                    source_squares &= source_squares - 1
+
+        king_targets = attack_tables.KING_ATTACKS[king_index] & ~self.board_rep.occupancy[side]
+        return bool(king_targets & ~self.all_attacks(side ^ 1))
+
+    def _checks_and_pins(self, side: int, king_index: int) -> tuple[int, int, int]:
+        """
+        The enemy pieces giving check, the squares a move other than a king move has to land on
+        (every square if not in check, the checker and the squares between it and the king with one checker,
+        none with two) and our pieces pinned to the king
+        """
+        bitboards = self.board_rep.bitboards
+        occupied = self.board_rep.occupied
+        enemy = (side ^ 1) * 6
+        diagonal_sliders = bitboards[enemy + BISHOP] | bitboards[enemy + QUEEN]
+        straight_sliders = bitboards[enemy + ROOK] | bitboards[enemy + QUEEN]
+
+        # Looking from the king through our own pieces finds every slider lined up with it: with nothing in between it
+        # gives check, with exactly one of our pieces in between that piece is pinned
+        own_pieces = self.board_rep.occupancy[side]
+        enemy_pieces = occupied ^ own_pieces
+        snipers = ((bishop_attack_set(king_index, enemy_pieces) & diagonal_sliders) |
+                   (rook_attack_set(king_index, enemy_pieces) & straight_sliders))
+        checkers = ((attack_tables.PAWN_ATTACKS[side][king_index] & bitboards[enemy + PAWN]) |
+                    (attack_tables.KNIGHT_ATTACKS[king_index] & bitboards[enemy + KNIGHT]))
+        pinned = 0
+        between = attack_tables.BETWEEN
+        while snipers:
+            sniper = snipers & -snipers
+            blockers = between[king_index * 64 + sniper.bit_length() - 1] & occupied
+            if not blockers:
+                checkers |= sniper
+            elif not blockers & (blockers - 1): # Exactly one piece (one of ours) in the way
+                pinned |= blockers
+            snipers ^= sniper
+
+        if not checkers:
+            evasion_mask = 0xFFFFFFFFFFFFFFFF
+        elif checkers & (checkers - 1):
+            evasion_mask = 0
+        else:
+            evasion_mask = checkers | between[king_index * 64 + checkers.bit_length() - 1]
+        return checkers, evasion_mask, pinned
+
+    def _attack_map(self, side: int, occupied: int) -> int:
+        """Every square the side's pieces attack, with the pieces on the board being occupied"""
+        bitboards = self.board_rep.bitboards
+        offset = side * 6
+        pawns = bitboards[offset + PAWN]
+        if side == WHITE:
+            attacks = ((pawns << 9) & ~self.FILE_A) | ((pawns << 7) & ~self.FILE_H)
+        else:
+            attacks = ((pawns >> 9) & ~self.FILE_H) | ((pawns >> 7) & ~self.FILE_A)
+        for piece, table in ((KNIGHT, attack_tables.KNIGHT_ATTACKS), (KING, attack_tables.KING_ATTACKS)):
+            pieces = bitboards[offset + piece]
+            while pieces:
+                piece_bb = pieces & -pieces
+                attacks |= table[piece_bb.bit_length() - 1]
+                pieces ^= piece_bb
+        for sliders, attack_set in ((bitboards[offset + BISHOP] | bitboards[offset + QUEEN], bishop_attack_set),
+                                    (bitboards[offset + ROOK] | bitboards[offset + QUEEN], rook_attack_set)):
+            while sliders:
+                slider = sliders & -sliders
+                attacks |= attack_set(slider.bit_length() - 1, occupied)
+                sliders ^= slider
+        return attacks & 0xFFFFFFFFFFFFFFFF
+
+    def _is_legal_by_making(self, move: int, side: int) -> bool:
+        self.move_handler.make_move(move, side)
+        legal = not self.is_square_attacked(self.board_rep.bitboards[side * 6 + KING], side)
+        self.move_handler.unmake_move()
+        return legal
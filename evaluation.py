@@ -0,0 +1,230 @@
+"""
+Evaluation tables: what every piece is worth and where it likes to stand.
+
+A position is scored as the sum of a value for every (piece, square) on the board, with white's
+pieces counting positive and black's negative. Every piece has two of these tables, one for the
+middlegame and one for the endgame (only the king plays differently in the endgame so far),
+and the final score blends the two by how much material is left (the game phase).
+Because the score is a plain sum, BoardRep keeps it up to date one piece at a time
+instead of adding up the whole board at every leaf of the search.
+"""
+import numpy as np
+from dataclasses import dataclass
+
+PIECES = ("pawn", "knight", "bishop", "rook", "queen", "king") # In the order of the piece codes in boardrep
+
+# How much every piece counts towards the game phase: 24 with all the pieces on the board, 0 with only pawns and kings
+PHASE_WEIGHTS = (0, 1, 1, 2, 4, 0)
+TOTAL_PHASE = 24
+
+@dataclass
+class PieceValue:
+    """Piece values"""
+    pawn = 100
+    knight = 320
+    bishop = 330
+    rook = 500
+    queen = 900
+    king = 20000
+
+@dataclass
+class PieceTable:
+    """Piece square tables (indexes are inverted so a1 is actually index [7][0])"""
+    pawn = np.array([
+    [0,  0,  0,  0,  0,  0,  0,  0],
+    [50, 50, 50, 50, 50, 50, 50, 50],
+    [10, 10, 20, 30, 30, 20, 10, 10],
+    [5,  5, 10, 25, 25, 10,  5,  5],
+    [0,  0,  0, 20, 20,  0,  0,  0],
+    [5, -5,-10,  0,  0,-10, -5,  5],
+    [5, 10, 10,-20,-20, 10, 10,  5],
+    [0,  0,  0,  0,  0,  0,  0,  0]
+     ])
+
+    knight = np.array([
+    [-50,-40,-30,-30,-30,-30,-40,-50],
+    [-40,-20,  0,  0,  0,  0,-20,-40],
+    [-30,  0, 10, 15, 15, 10,  0,-30],
+    [-30,  5, 15, 20, 20, 15,  5,-30],
+    [-30,  0, 15, 20, 20, 15,  0,-30],
+    [-30,  5, 10, 15, 15, 10,  5,-30],
+    [-40,-20,  0,  5,  5,  0,-20,-40],
+    [-50,-40,-30,-30,-30,-30,-40,-50]
+    ])
+
+    bishop = np.array([
+    [-20,-10,-10,-10,-10,-10,-10,-20],
+    [-10,  0,  0,  0,  0,  0,  0,-10],
+    [-10,  0,  5, 10, 10,  5,  0,-10],
+    [-10,  5,  5, 10, 10,  5,  5,-10],
+    [-10,  0, 10, 10, 10, 10,  0,-10],
+    [-10, 10, 10, 10, 10, 10, 10,-10],
+    [-10,  5,  0,  0,  0,  0,  5,-10],
+    [-20,-10,-10,-10,-10,-10,-10,-20]
+    ])
+
+    rook = np.array([
+    [0,  0,  0,  0,  0,  0,  0,  0],
+    [5, 10, 10, 10, 10, 10, 10,  5],
+    [-5,  0,  0,  0,  0,  0,  0, -5],
+    [-5,  0,  0,  0,  0,  0,  0, -5],
+    [-5,  0,  0,  0,  0,  0,  0, -5],
+    [-5,  0,  0,  0,  0,  0,  0, -5],
+    [-5,  0,  0,  0,  0,  0,  0, -5],
+    [0,  0,  0,  5,  5,  0,  0,  0]
+    ])
+    
+    queen = np.array([
+    [-20,-10,-10, -5, -5,-10,-10,-20],
+    [-10,  0,  0,  0,  0,  0,  0,-10],
+    [-10,  0,  5,  5,  5,  5,  0,-10],
+    [-5,  0,  5,  5,  5,  5,  0, -5],
+    [0,  0,  5,  5,  5,  5,  0, -5],
+    [-10,  5,  5,  5,  5,  5,  0,-10],
+    [-10,  0,  5,  0,  0,  0,  0,-10],
+    [-20,-10,-10, -5, -5,-10,-10,-20]
+    ])
+
+    king = np.array([
+    [-30,-40,-40,-50,-50,-40,-40,-30],
+    [-30,-40,-40,-50,-50,-40,-40,-30],
+    [-30,-40,-40,-50,-50,-40,-40,-30],
+    [-30,-40,-40,-50,-50,-40,-40,-30],
+    [-20,-30,-30,-40,-40,-30,-30,-20],
+    [-10,-20,-20,-20,-20,-20,-20,-10],
+    [20, 20,  0,  0,  0,  0, 20, 20],
+    [20, 30, 10,  0,  0, 10, 30, 20]
+    ])
+
+    #In the endgame, we want the king to move up the board
+    king_end = np.array([
+    [-50,-40,-30,-20,-20,-30,-40,-50],
+    [-30,-20,-10,  0,  0,-10,-20,-30],
+    [-30,-10, 20, 30, 30, 20,-10,-30],
+    [-30,-10, 30, 40, 40, 30,-10,-30],
+    [-30,-10, 30, 40, 40, 30,-10,-30],
+    [-30,-10, 20, 30, 30, 20,-10,-30],
+    [-30,-30,  0,  0,  0,  0,-30,-30],
+    [-50,-30,-30,-30,-30,-30,-30,-50]
+    ])
+
+
+def build_square_tables(values: PieceValue, tables: PieceTable) -> tuple[tuple[tuple[int, ...], ...], tuple[tuple[int, ...], ...]]:
+    """
+    Turns the piece values and tables into one flat tuple of 64 scores per coloured piece (in the order of
+    BoardRep.bitboards), value included, for the middlegame and for the endgame. Plain ints in tuples,
+    so evaluating never touches numpy or works out ranks and files
+    """
+    middlegame = []
+    endgame = []
+    for side in (0, 1):
+        sign = 1 if side == 0 else -1
+        for piece in PIECES:
+            value = getattr(values, piece)
+            middlegame_table = getattr(tables, piece)
+            endgame_table = tables.king_end if piece == "king" else middlegame_table
+            # The tables are drawn from white's point of view with a8 at [0][0],
+            # so for white the ranks are flipped and for black they are read as they are
+            ranks = [7 - square // 8 if side == 0 else square // 8 for square in range(64)]
+            middlegame.append(tuple(sign * (value + int(middlegame_table[ranks[square]][square % 8])) for square in range(64)))
+            endgame.append(tuple(sign * (value + int(endgame_table[ranks[square]][square % 8])) for square in range(64)))
+    return tuple(middlegame), tuple(endgame)
+
+_compiled_tables = {} # Square tables already built, by the contents of the values and tables they were built from
+
+def compiled_tables(values: PieceValue, tables: PieceTable) -> tuple[tuple[tuple[int, ...], ...], tuple[tuple[int, ...], ...]]:
+    """
+    The square tables of some values and tables, only built again if their contents changed
+    (the tables are numpy arrays that can be edited in place, e.g. while tuning)
+    """
+    key = (tuple(getattr(values, piece) for piece in PIECES),
+           tuple(getattr(tables, name).tobytes() for name in (*PIECES, "king_end")))
+    square_tables = _compiled_tables.get(key)
+    if square_tables is None:
+        if len(_compiled_tables) >= 16: # Tuning goes through a lot of them, don't keep them all
+            _compiled_tables.clear()
+        square_tables = _compiled_tables[key] = build_square_tables(values, tables)
+    return square_tables
+
+def piece_values(values: PieceValue) -> tuple[int, ...]:
+    """What every piece is worth, by piece code, so the search can index it instead of looking the names up"""
+    return tuple(getattr(values, piece) for piece in PIECES)
+
+# [coloured piece][square] scores used by BoardRep, see set_tables
+MIDDLEGAME_TABLES, ENDGAME_TABLES = compiled_tables(PieceValue(), PieceTable())
+# [piece] values used by the search (delta pruning)
+PIECE_VALUES = piece_values(PieceValue())
+# Game phase weight of every coloured piece
+PIECE_PHASES = PHASE_WEIGHTS * 2
+
+def set_tables(values: PieceValue, tables: PieceTable) -> None:
+    """
+    Makes BoardRep score positions with these values and tables from now on. Boards that are already set up
+    have to call refresh_evaluation(), and search processes that are already running keep the old tables
+    """
+    global MIDDLEGAME_TABLES, ENDGAME_TABLES, PIECE_VALUES
+    MIDDLEGAME_TABLES, ENDGAME_TABLES = compiled_tables(values, tables)
+    PIECE_VALUES = piece_values(values)
+
+def score_bitboards(bitboards: list[int], middlegame_tables=None, endgame_tables=None) -> tuple[int, int, int]:
+    """Adds up the (middlegame score, endgame score, phase) of every piece on the board, with the current tables by default"""
+    middlegame_tables = middlegame_tables or MIDDLEGAME_TABLES
+    endgame_tables = endgame_tables or ENDGAME_TABLES
+    middlegame_score = endgame_score = phase = 0
+    for piece, bitboard in enumerate(bitboards):
+        middlegame_table = middlegame_tables[piece]
+        endgame_table = endgame_tables[piece]
+        phase += PIECE_PHASES[piece] * bitboard.bit_count()
+        while bitboard:
+            square_index = (bitboard & -bitboard).bit_length() - 1
+            middlegame_score += middlegame_table[square_index]
+            endgame_score += endgame_table[square_index]
+            bitboard &= bitboard - 1
+    return middlegame_score, endgame_score, phase
+
+def tapered_score(middlegame_score: int, endgame_score: int, phase: int) -> int:
+    """Blends the middlegame and endgame scores, the less material is left the more the endgame score counts"""
+    phase = min(phase, TOTAL_PHASE) # Promotions can take it past the start
+    return (middlegame_score * phase + endgame_score * (TOTAL_PHASE - phase)) // TOTAL_PHASE
+
+BATCH_SIZE = 256 # Positions unpacked at once by evaluate_batch, small enough for the planes to stay in the CPU cache
+
+def _batch_weights(middlegame_tables, endgame_tables) -> np.ndarray:
+    """
+    (12 * 64, 3) matrix of the middlegame score, endgame score and phase weight of every
+    (coloured piece, square), so that one matrix product with the board planes adds them all up
+    """
+    weights = np.zeros((12 * 64, 3), dtype=np.float32) # Sums stay far below 2 ** 24, so float32 is exact
+    weights[:, 0] = np.array(middlegame_tables, dtype=np.float32).ravel()
+    weights[:, 1] = np.array(endgame_tables, dtype=np.float32).ravel()
+    weights[:, 2] = np.repeat(PIECE_PHASES, 64)
+    return weights
+
+def bitboard_array(boards) -> np.ndarray:
+    """The (N, 12) array of the bitboards of some BoardReps, what evaluate_batch takes"""
+    return np.array([board.bitboards for board in boards], dtype=np.uint64).reshape(-1, 12)
+
+def evaluate_batch(bitboards: np.ndarray, values: PieceValue | None = None, tables: PieceTable | None = None) -> np.ndarray:
+    """
+    Evaluates N positions at once, given as an (N, 12) uint64 array of bitboards in the order of
+    BoardRep.bitboards. Returns the N scores, the same as evaluate_board would give one at a time.
+    Uses the tables BoardRep uses unless given others
+    """
+    if values is None or tables is None:
+        weights = _batch_weights(MIDDLEGAME_TABLES, ENDGAME_TABLES)
+    else:
+        weights = _batch_weights(*compiled_tables(values, tables))
+
+    bitboards = np.ascontiguousarray(bitboards, dtype='<u8').reshape(-1, 12)
+    # Every bitboard is 8 little-endian bytes, unpacking them least significant bit first gives squares 0 to 63
+    board_bytes = bitboards.view(np.uint8).reshape(len(bitboards), 12 * 8)
+    totals = np.empty((len(bitboards), 3), dtype=np.float32) # Middlegame score, endgame score and phase of every position
+    planes = np.empty((BATCH_SIZE, 12 * 64), dtype=np.float32)
+    for start in range(0, len(bitboards), BATCH_SIZE):
+        chunk = board_bytes[start:start + BATCH_SIZE]
+        planes[:len(chunk)] = np.unpackbits(chunk, axis=1, bitorder='little') # (chunk, 12 * 64) zeros and ones
+        np.matmul(planes[:len(chunk)], weights, out=totals[start:start + len(chunk)])
+
+    totals = totals.astype(np.int64)
+    phase = np.minimum(totals[:, 2], TOTAL_PHASE)
+    return (totals[:, 0] * phase + totals[:, 1] * (TOTAL_PHASE - phase)) // TOTAL_PHASE
@@ -4,6 +4,7 @@ import pieces
 import conversions
 import constants
 import munchkin
+from move_encoding import find_move
 import os 
 #------------------INIT-------------------
 SQUARE_SIZE:int = constants.SQUARE_SIZE  # The size of each square in the chess board
@@ -72,9 +73,13 @@ def handle_move(board_rep: BoardRep, move_handler:MoveHandler, legal_moves:list,
         evt = pygame.event.wait()
         if evt.type == pygame.MOUSEBUTTONUP: # When we 'unclick'
             target_square = conversions.pixel_to_square(pygame.mouse.get_pos()) #Figure out where it should go on the board
-            move = (source_square,target_square) # Save the move
+            if target_square is None:
+                return False # Dropped outside the board
 
-            if move in legal_moves: # If that move is a legal move
+            # Look the move up in the legal moves (pawns reaching the last rank always become queens)
+            move = find_move(legal_moves, conversions.square_to_index(source_square), conversions.square_to_index(target_square))
+
+            if move is not None: # If that move is a legal move
                 move_handler.make_move(move = move, colour = colour) # Act on the board
                 return True # We have made a move
             else:
@@ -107,3 +107,62 @@ def generate_initial_positions(bitboard_white,bitboard_black):
     bitboard_black["king"] |= 1 << conversions.square_to_index("e8")
     bitboard_black["queen"] |= 1 << conversions.square_to_index("d8")
     return (bitboard_white,bitboard_black)
+
+# (file, rank) steps of the pieces that jump straight to their target squares
+KNIGHT_STEPS = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+KING_STEPS = ((0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1))
+
+def generate_step_attacks(square: int, steps) -> int:
+    """The squares a piece on square reaches with one of the steps, leaving out the ones off the board"""
+    rank = square // 8
+    file = square % 8
+    attacks = 0
+    for file_step, rank_step in steps:
+        r, f = rank + rank_step, file + file_step
+        if 0 <= r < 8 and 0 <= f < 8:
+            attacks |= 1 << (r * 8 + f)
+    return attacks
+
+def generate_knight_attacks(square: int) -> int:
+    return generate_step_attacks(square, KNIGHT_STEPS)
+
+def generate_king_attacks(square: int) -> int:
+    return generate_step_attacks(square, KING_STEPS)
+
+def generate_pawn_attacks(square: int, side: int) -> int:
+    """The two diagonal squares in front of a pawn, up the board for white (0) and down for black (1)"""
+    rank_step = 1 if side == 0 else -1
+    return generate_step_attacks(square, ((-1, rank_step), (1, rank_step)))
+
+def _direction(square_a: int, square_b: int) -> tuple[int, int] | None:
+    """The (file, rank) step that leads from one square to the other along a rank, file or diagonal, None if there isn't one"""
+    file_distance = square_b % 8 - square_a % 8
+    rank_distance = square_b // 8 - square_a // 8
+    if square_a == square_b or not (file_distance == 0 or rank_distance == 0 or abs(file_distance) == abs(rank_distance)):
+        return None
+    return ((file_distance > 0) - (file_distance < 0), (rank_distance > 0) - (rank_distance < 0))
+
+def generate_between(square_a: int, square_b: int) -> int:
+    """The squares strictly between two squares on the same rank, file or diagonal (0 if they aren't on one)"""
+    step = _direction(square_a, square_b)
+    between = 0
+    if step is None:
+        return between
+    file, rank = square_a % 8 + step[0], square_a // 8 + step[1]
+    while rank * 8 + file != square_b:
+        between |= 1 << (rank * 8 + file)
+        file, rank = file + step[0], rank + step[1]
+    return between
+
+def generate_line(square_a: int, square_b: int) -> int:
+    """The whole rank, file or diagonal through two squares, from one edge of the board to the other (0 if there isn't one)"""
+    step = _direction(square_a, square_b)
+    line = 0
+    if step is None:
+        return line
+    for direction in (1, -1):
+        file, rank = square_a % 8, square_a // 8
+        while 0 <= file < 8 and 0 <= rank < 8:
+            line |= 1 << (rank * 8 + file)
+            file, rank = file + direction * step[0], rank + direction * step[1]
+    return line
@@ -1,4 +1,10 @@
+import argparse
+import multiprocessing
 import random
+from concurrent.futures import ProcessPoolExecutor
+
+SEED = 0x4D41474943 # Seed of the magic search, so running it again gives the same tables
+SMALLER_SHIFT_ATTEMPTS = 20_000 # Magics tried per square with one index bit less before settling for the usual size
 
 def bitboard_to_string(bitboard: int) -> str:
     """Converts a bitboard to a string for visualization"""
@@ -111,92 +117,100 @@ def generate_bishop_attacks_for_table(square: int, occupancy: int) -> int:
     return attacks
 
 
-def find_magic_number(square: int, mask: int, is_bishop: bool) -> tuple[int, int]:
+def find_magic_number(square: int, mask: int, is_bishop: bool, bits: int | None = None,
+                      rng: random.Random | None = None, attempts: int = 100_000_000) -> tuple[int, int]:
     """
     Finds a suitable magic number and shift for a given square and mask.
-    This is a brute-force process.
+    This is a brute-force process. bits is the size of the index (the table has 2 ** bits entries), by default
+    one bit per square in the mask. With fewer bits two blocker patterns have to share a slot, which only works
+    when they give the same attacks, so those magics are much rarer. Returns (0, 0) if none is found
     """
     attack_generator = generate_bishop_attacks_for_table if is_bishop else generate_rook_attacks_for_table
+    rng = rng or random
 
-    bits = pop_count(mask)
-    occupancy_variations = 1 << bits
+    mask_bits = pop_count(mask)
+    bits = bits or mask_bits
+    occupancy_variations = 1 << mask_bits
     shift = 64 - bits # The index needs N number of bits. To get the top N bits from a 64-bit result, we must dicard the bottom 64-N bits 
-    occupancies = [set_occupancy(i, bits, mask) for i in range(occupancy_variations)]
+    occupancies = [set_occupancy(i, mask_bits, mask) for i in range(occupancy_variations)]
     attacks = [attack_generator(square, occ) for occ in occupancies]
-    
-    used_attacks = [0] * occupancy_variations
+    patterns = list(zip(occupancies, attacks))
+
+    used_attacks = [0] * (1 << bits)
+    used_by = [0] * (1 << bits) # Which attempt filled the slot, so the table never has to be cleared between attempts
 
-    for _ in range(100_000_000): # Limit attempts
-        magic_number = random.getrandbits(64) & random.getrandbits(64) & random.getrandbits(64)
+    for attempt in range(1, attempts + 1): # Limit attempts
+        magic_number = rng.getrandbits(64) & rng.getrandbits(64) & rng.getrandbits(64)
         # Magic numbers with fewer ones tend to have a better chance of working 
         if pop_count((mask * magic_number) & 0xFF00000000000000) < 6: # This number is unlikely to work
             continue # Try a new magic number
 
-        fail = False
-        used_attacks = [0] * occupancy_variations
-        for i in range(occupancy_variations):
+        for occupancy, attack in patterns:
             # Apply 64-bit mask to simulate C-style integer overflow
-            magic_index = ((occupancies[i] * magic_number) & 0xFFFFFFFFFFFFFFFF) >> shift # This is the formula we are trying to cater for
+            magic_index = ((occupancy * magic_number) & 0xFFFFFFFFFFFFFFFF) >> shift # This is the formula we are trying to cater for
             # and it is a good formula since multiplication by the magic number should scramble the bits enough avoiding as many collisions
             # as possible, then we shift puts it in the size we want. The purpose of this function is MAKING this formula work 
 
-            if used_attacks[magic_index] == 0: # If it is empty we haven't used that slot yet
-                used_attacks[magic_index] = attacks[i]
-            elif used_attacks[magic_index] != attacks[i]: # If it is not empty and the contents don't match the correct
+            if used_by[magic_index] != attempt: # If it is empty we haven't used that slot yet
+                used_by[magic_index] = attempt
+                used_attacks[magic_index] = attack
+            elif used_attacks[magic_index] != attack: # If it is not empty and the contents don't match the correct
                 #attack pattern for the current occupancy we have a collision. Two different blocker setups produced the same index
                 # but require different results.
-                fail = True # Therefore this magic number is a failure
-                break # Try a new magic number
-        
-        if not fail:
+                break # Therefore this magic number is a failure, try a new magic number
+        else:
             return magic_number, shift
-    
-    print(f"ERROR: Magic number not found for square {square}")
+
+    if bits == mask_bits:
+        print(f"ERROR: Magic number not found for square {square}")
     return 0, 0
 
+def _search_square(seed: int, square: int, is_bishop: bool, smaller_attempts: int) -> tuple[int, int]:
+    """Runs in a worker process: the magic and shift of one square, trying for a table half the usual size first"""
+    # Every square gets its own generator, so the result doesn't depend on how the squares are dealt out
+    rng = random.Random(seed * 128 + 64 * is_bishop + square)
+    mask = generate_bishop_mask_magic(square) if is_bishop else generate_rook_mask_magic(square)
+    if smaller_attempts:
+        magic, shift = find_magic_number(square, mask, is_bishop, pop_count(mask) - 1, rng, smaller_attempts)
+        if magic:
+            return magic, shift
+    return find_magic_number(square, mask, is_bishop, rng=rng)
+
+def find_all_magics(seed: int = SEED, workers: int | None = None,
+                    smaller_attempts: int = SMALLER_SHIFT_ATTEMPTS) -> dict[str, tuple[list[int], list[int]]]:
+    """
+    Searches the magics of all 128 rook and bishop squares in a pool of processes.
+    The same seed always gives the same magics. Returns {"ROOK": (magics, shifts), "BISHOP": (magics, shifts)}
+    """
+    jobs = [(seed, square, is_bishop, smaller_attempts) for is_bishop in (False, True) for square in range(64)]
+    with ProcessPoolExecutor(max_workers=workers or multiprocessing.cpu_count()) as executor:
+        results = list(executor.map(_search_square, *zip(*jobs)))
+    return {name: ([magic for magic, _ in found], [shift for _, shift in found])
+            for name, found in (("ROOK", results[:64]), ("BISHOP", results[64:]))}
+
 
 if __name__ == "__main__":
-    # We create the lookup tables here 
-    
-    # We use the same logic to do the rooks, just substitute rooks for bishops here
-    bishop_magics = [0] * 64
-    bishop_shifts = [0] * 64
-    bishop_masks = [0] * 64
-    bishop_attack_table = []
-    
-    for square in range(64):
-        mask = generate_bishop_mask_magic(square)
-        bishop_masks[square] = mask
-        
-        magic, shift = find_magic_number(square, mask, is_bishop=True)
-        bishop_magics[square] = magic
-        bishop_shifts[square] = shift
-        
-        bits = pop_count(mask)
-        occupancy_variations = 1 << bits
-        
-        attack_table_for_square = [0] * occupancy_variations
-        for i in range(occupancy_variations):
-            occupancy = set_occupancy(i, bits, mask)
-            magic_index = ((occupancy * magic) & 0xFFFFFFFFFFFFFFFF) >> shift
-            
-            attack_table_for_square[magic_index] = generate_bishop_attacks_for_table(square, occupancy)
-            
-        bishop_attack_table.extend(attack_table_for_square)
-
-    
+    # We find new magic numbers for every square and write the lookup tables they index to attack_tables.bin
+    import attack_tables
+
+    parser = argparse.ArgumentParser(description="Magic number search, writes attack_tables.bin")
+    parser.add_argument("--seed", type=int, default=SEED, help="seed of the search, the same seed gives the same tables")
+    parser.add_argument("--workers", type=int, help="processes to search in (default every core)")
+    parser.add_argument("--attempts", type=int, default=SMALLER_SHIFT_ATTEMPTS,
+                        help="magics tried per square for a table half the usual size (0 to skip)")
+    args = parser.parse_args()
+
+    magics = find_all_magics(args.seed, args.workers, args.attempts)
+    tables = attack_tables.build_tables(*magics["ROOK"], *magics["BISHOP"])
+    attack_tables.write_tables(tables)
+    for name in ("ROOK", "BISHOP"):
+        smaller = sum(shift > 64 - pop_count(mask) for shift, mask in zip(magics[name][1], tables[f"{name}_MAGIC_MASKS"]))
+        print(f"{name}_ATTACKS: {len(tables[f'{name}_ATTACKS'])} entries, {smaller} squares with a smaller table")
+    print(f"Wrote {attack_tables.PATH}")
+
+    # The tables are rebuilt from the magics in constants.py if the file ever gets lost or corrupted
     print("\n# --- COPY THE OUTPUT BELOW INTO constants.py --- #\n")
-    print(f"BISHOP_MAGIC_MASKS = {bishop_masks}\n")
-    print(f"BISHOP_MAGICS = {bishop_magics}\n")
-    print(f"BISHOP_SHIFTS = {bishop_shifts}\n")
-    
-    bishop_attack_offsets = [0] * 64
-    offset = 0
-    for i in range(64):
-        bishop_attack_offsets[i] = offset
-        offset += (1 << pop_count(bishop_masks[i])) # The start of a blocker pattern in 
-        
-    print(f"BISHOP_ATTACK_OFFSETS = {bishop_attack_offsets}\n")
-    print(f"BISHOP_ATTACKS = {bishop_attack_table}\n")
-    
+    for name in ("ROOK", "BISHOP"):
+        print(f"{name}_MAGICS = {magics[name][0]}\n")
+        print(f"{name}_SHIFTS = {magics[name][1]}\n")
     print("# --- END OF DATA --- #")
@@ -0,0 +1,83 @@
+"""
+Moves are packed into 16-bit integers:
+
+    bits 0-5   source square index
+    bits 6-11  target square index
+    bits 12-15 flags (what kind of move it is)
+
+so that the generator never has to build tuples, and make_move knows straight away
+if a move is a capture, a castle or a promotion instead of working it out again.
+The flags follow the layout on the Chess Programming Wiki: bit 2 (CAPTURE) is set on every
+capture, bit 3 (PROMOTION) on every promotion, and the two lowest bits of a promotion say
+which piece the pawn becomes.
+"""
+from array import array
+import conversions
+
+QUIET = 0
+DOUBLE_PAWN_PUSH = 1
+KING_CASTLE = 2
+QUEEN_CASTLE = 3
+CAPTURE = 4
+EN_PASSANT = 5 # Also a capture
+PROMOTION = 8 # The lowest two bits hold the piece - KNIGHT, so 8 + 3 is a queen promotion
+PROMOTION_CAPTURE = 12
+
+NO_MOVE = 0 # a1a1 can never be a real move, so 0 doubles as "no move" (for example in the transposition table)
+
+PROMOTION_CHARS = "nbrq" # In the order of the promotion flags
+
+def encode_move(source_index: int, target_index: int, flags: int = QUIET) -> int:
+    """Packs a move into 16 bits"""
+    return source_index | (target_index << 6) | (flags << 12)
+
+def move_source(move: int) -> int:
+    """Index of the square the piece moves from"""
+    return move & 63
+
+def move_target(move: int) -> int:
+    """Index of the square the piece moves to"""
+    return (move >> 6) & 63
+
+def move_flags(move: int) -> int:
+    """The 4 flag bits of a move"""
+    return move >> 12
+
+def is_capture(move: int) -> bool:
+    return bool(move & (CAPTURE << 12))
+
+def is_promotion(move: int) -> bool:
+    return bool(move & (PROMOTION << 12))
+
+def promotion_piece(move: int) -> int:
+    """Piece code (KNIGHT to QUEEN) a pawn promotes to, only meaningful if is_promotion(move)"""
+    return ((move >> 12) & 3) + 1
+
+def move_list() -> array:
+    """An empty move list, moves are stored as unsigned 16-bit values"""
+    return array('H')
+
+def move_to_uci(move: int) -> str:
+    """Turns a move into coordinate notation, e.g. e2e4 or e7e8q"""
+    uci = conversions.square_to_algebraic(1 << move_source(move)) + conversions.square_to_algebraic(1 << move_target(move))
+    if is_promotion(move):
+        uci += PROMOTION_CHARS[(move >> 12) & 3]
+    return uci
+
+def find_move(legal_moves, source_index: int, target_index: int, promotion: str = 'q') -> int | None:
+    """
+    Finds the legal move going from source_index to target_index (promoting to the given
+    piece if it is a promotion), None if there isn't one. Used to turn what a user
+    picks (a pair of squares) back into a move with all its flags
+    """
+    for move in legal_moves:
+        if move & 0xFFF == source_index | (target_index << 6):
+            if not is_promotion(move) or PROMOTION_CHARS[(move >> 12) & 3] == promotion:
+                return move
+    return None
+
+def uci_to_move(uci: str, legal_moves) -> int | None:
+    """Finds the legal move written in coordinate notation, e.g. e7e8q"""
+    source_index = conversions.square_to_index(conversions.algebraic_to_bitboard(uci[0:2]))
+    target_index = conversions.square_to_index(conversions.algebraic_to_bitboard(uci[2:4]))
+    return find_move(legal_moves, source_index, target_index, uci[4] if len(uci) > 4 else 'q')
@@ -0,0 +1,140 @@
+"""
+Move ordering: alpha-beta cuts the most branches when the best move is searched first,
+so before searching the moves of a position we sort them from most to least promising:
+
+1. The hash move (best move found the last time this position was searched)
+2. Captures and promotions, most valuable victim first, then least valuable attacker (MVV-LVA)
+3. Killer moves: quiet moves that caused a cut-off at the same ply in another branch
+4. Every other quiet move, by how often it caused cut-offs so far (history heuristic)
+5. Captures that lose material once the other side recaptures (static exchange evaluation, SEE)
+"""
+from boardrep import BoardRep, ValidMoves, PAWN, EMPTY, SEE_VALUES
+from move_encoding import NO_MOVE, CAPTURE, PROMOTION, EN_PASSANT
+
+HASH_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 24 # Every capture and promotion is worth at least this
+KILLER_SCORES = (CAPTURE_SCORE - 1, CAPTURE_SCORE - 2) # Right below the captures
+HISTORY_LIMIT = 1 << 20 # History scores are halved when one gets this big, so they stay below the killers
+LOSING_CAPTURE_SCORE = -CAPTURE_SCORE # Plus the (negative) SEE, below every quiet move
+
+def mvv_lva(mailbox: list[int], move: int) -> int:
+    """Score of a capture or promotion, most valuable victim first, then least valuable attacker"""
+    flags = move >> 12
+    attacker = mailbox[move & 63] % 6
+    if flags == EN_PASSANT:
+        victim = PAWN
+    elif flags & CAPTURE:
+        victim = mailbox[(move >> 6) & 63] % 6
+    else:
+        victim = EMPTY # A promotion that doesn't capture
+    # Victims count 8 times more than attackers, so PxQ > QxR > QxP
+    move_score = CAPTURE_SCORE + (victim + 1) * 8 - attacker
+    if flags & PROMOTION:
+        move_score += ((flags & 3) + 1) * 8 # As if we captured the piece we promote to
+    return move_score
+
+def capture_see(validator: ValidMoves, move: int) -> int:
+    """
+    SEE of a capture, or 0 if it can't lose material: taking a piece worth at least as much as the
+    capturing one wins whatever happens next, and most captures are like that, so the SEE is skipped
+    """
+    mailbox = validator.board_rep.mailbox
+    if move >> 12 == EN_PASSANT or SEE_VALUES[mailbox[move & 63] % 6] <= SEE_VALUES[mailbox[(move >> 6) & 63] % 6]:
+        return 0
+    return validator.see(move)
+
+def order_captures(board_rep: BoardRep, moves) -> list[int]:
+    """Sorts captures and promotions by MVV-LVA, e.g. the moves of the quiescence search"""
+    mailbox = board_rep.mailbox
+    return sorted(moves, key=lambda move: mvv_lva(mailbox, move), reverse=True)
+
+class MoveOrderer:
+    """
+    Holds the killer and history tables of a search and sorts moves with them.
+    It also counts how often a cut-off came from the first move searched, which
+    is the standard way of checking how good the ordering is (above 90% is good)
+    """
+    def __init__(self, max_ply: int = 64):
+        self.killers = [[NO_MOVE, NO_MOVE] for _ in range(max_ply)] # Two killer moves per ply
+        self.history = [[0] * 4096 for _ in range(2)] # [side][source + 64 * target]
+
+        self.fail_highs = 0
+        self.fail_highs_first = 0
+
+    def new_search(self) -> None:
+        """
+        Call before every root search: killers only make sense inside one search,
+        and history from the previous search is kept but counts for less
+        """
+        for killers in self.killers:
+            killers[0] = killers[1] = NO_MOVE
+        self._age_history()
+        self.fail_highs = 0
+        self.fail_highs_first = 0
+
+    def clear(self) -> None:
+        """Forgets the killers and the history altogether, for a new game"""
+        for killers in self.killers:
+            killers[0] = killers[1] = NO_MOVE
+        for side_history in self.history:
+            side_history[:] = [0] * 4096
+        self.fail_highs = 0
+        self.fail_highs_first = 0
+
+    def _age_history(self) -> None:
+        for side_history in self.history:
+            for i in range(4096):
+                side_history[i] >>= 1
+
+    @property
+    def fail_high_first_rate(self) -> float:
+        """Fraction of the cut-offs that happened on the first move searched"""
+        return self.fail_highs_first / self.fail_highs if self.fail_highs else 0.0
+
+    def order_moves(self, board_rep: BoardRep, moves, side: int, ply: int, hash_move: int = NO_MOVE) -> list[int]:
+        """Returns the moves sorted from most to least promising"""
+        mailbox = board_rep.mailbox
+        validator = ValidMoves(board_rep)
+        if ply >= len(self.killers):
+            self.killers.extend([NO_MOVE, NO_MOVE] for _ in range(ply + 1 - len(self.killers)))
+        killer_1, killer_2 = self.killers[ply]
+        history = self.history[side]
+
+        def score(move: int) -> int:
+            if move == hash_move:
+                return HASH_MOVE_SCORE
+            if move & (CAPTURE << 12):
+                see = capture_see(validator, move)
+                if see < 0:
+                    return LOSING_CAPTURE_SCORE + see
+            if move & ((CAPTURE | PROMOTION) << 12):
+                return mvv_lva(mailbox, move)
+            if move == killer_1:
+                return KILLER_SCORES[0]
+            if move == killer_2:
+                return KILLER_SCORES[1]
+            return history[move & 0xFFF]
+
+        return sorted(moves, key=score, reverse=True)
+
+    def record_cutoff(self, move: int, side: int, ply: int, depth: int, move_number: int) -> None:
+        """
+        Tells the orderer that move caused a beta cut-off, it was the move_number-th (from 0)
+        legal move searched, depth plies from the leaves
+        """
+        self.fail_highs += 1
+        if move_number == 0:
+            self.fail_highs_first += 1
+
+        if move & ((CAPTURE | PROMOTION) << 12):
+            return # Captures are already ordered well by MVV-LVA
+
+        killers = self.killers[ply]
+        if killers[0] != move: # Keep the two most recent killers
+            killers[1] = killers[0]
+            killers[0] = move
+
+        history = self.history[side]
+        history[move & 0xFFF] += depth * depth # Cut-offs far from the leaves save more work
+        if history[move & 0xFFF] > HISTORY_LIMIT:
+            self._age_history()
@@ -1,116 +1,113 @@
-from boardrep import BoardRep,ValidMoves,MoveHandler
+from boardrep import BoardRep,ValidMoves,MoveHandler, SIDES, WHITE, BLACK, KING, QUEEN, ROOK, BISHOP, KNIGHT, PAWN
+from transposition import TranspositionTable, SharedTranspositionTable, EXACT, LOWER, UPPER
+from move_encoding import NO_MOVE, CAPTURE, EN_PASSANT, PROMOTION, move_to_uci
+from move_ordering import MoveOrderer, order_captures, capture_see
+from evaluation import PieceValue, PieceTable, compiled_tables, score_bitboards, tapered_score
+from time_control import SearchControl, SearchStopped, allocate_time, HARD_LIMIT_FACTOR
+from selective_search import (SelectiveSearch, NULL_MOVE_MIN_DEPTH, NULL_MOVE_REDUCTION, LMR_MIN_DEPTH, LMR_FULL_DEPTH_MOVES,
+                              LMR_DEEP_REDUCTION_MOVES, FUTILITY_MARGINS, REVERSE_FUTILITY_MARGIN)
 import random
+import time
+import os
 import numpy as np
-from dataclasses import dataclass
-import conversions
-import copy
+import evaluation
 import multiprocessing
+import atexit
 from operator import itemgetter
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
-from typing import List, Tuple, Optional
-
-@dataclass
-class PieceValue:
-    """Piece values"""
-    pawn = 100
-    knight = 320
-    bishop = 330
-    rook = 500
-    queen = 900
-    king = 20000
-
-@dataclass
-class PieceTable:
-    """Piece square tables (indexes are inverted so a1 is actually index [7][0])"""
-    pawn = np.array([
-    [0,  0,  0,  0,  0,  0,  0,  0],
-    [50, 50, 50, 50, 50, 50, 50, 50],
-    [10, 10, 20, 30, 30, 20, 10, 10],
-    [5,  5, 10, 25, 25, 10,  5,  5],
-    [0,  0,  0, 20, 20,  0,  0,  0],
-    [5, -5,-10,  0,  0,-10, -5,  5],
-    [5, 10, 10,-20,-20, 10, 10,  5],
-    [0,  0,  0,  0,  0,  0,  0,  0]
-     ])
-
-    knight = np.array([
-    [-50,-40,-30,-30,-30,-30,-40,-50],
-    [-40,-20,  0,  0,  0,  0,-20,-40],
-    [-30,  0, 10, 15, 15, 10,  0,-30],
-    [-30,  5, 15, 20, 20, 15,  5,-30],
-    [-30,  0, 15, 20, 20, 15,  0,-30],
-    [-30,  5, 10, 15, 15, 10,  5,-30],
-    [-40,-20,  0,  5,  5,  0,-20,-40],
-    [-50,-40,-30,-30,-30,-30,-40,-50]
-    ])
-
-    bishop = np.array([
-    [-20,-10,-10,-10,-10,-10,-10,-20],
-    [-10,  0,  0,  0,  0,  0,  0,-10],
-    [-10,  0,  5, 10, 10,  5,  0,-10],
-    [-10,  5,  5, 10, 10,  5,  5,-10],
-    [-10,  0, 10, 10, 10, 10,  0,-10],
-    [-10, 10, 10, 10, 10, 10, 10,-10],
-    [-10,  5,  0,  0,  0,  0,  5,-10],
-    [-20,-10,-10,-10,-10,-10,-10,-20]
-    ])
-
-    rook = np.array([
-    [0,  0,  0,  0,  0,  0,  0,  0],
-    [5, 10, 10, 10, 10, 10, 10,  5],
-    [-5,  0,  0,  0,  0,  0,  0, -5],
-    [-5,  0,  0,  0,  0,  0,  0, -5],
-    [-5,  0,  0,  0,  0,  0,  0, -5],
-    [-5,  0,  0,  0,  0,  0,  0, -5],
-    [-5,  0,  0,  0,  0,  0,  0, -5],
-    [0,  0,  0,  5,  5,  0,  0,  0]
-    ])
-    
-    queen = np.array([
-    [-20,-10,-10, -5, -5,-10,-10,-20],
-    [-10,  0,  0,  0,  0,  0,  0,-10],
-    [-10,  0,  5,  5,  5,  5,  0,-10],
-    [-5,  0,  5,  5,  5,  5,  0, -5],
-    [0,  0,  5,  5,  5,  5,  0, -5],
-    [-10,  5,  5,  5,  5,  5,  0,-10],
-    [-10,  0,  5,  0,  0,  0,  0,-10],
-    [-20,-10,-10, -5, -5,-10,-10,-20]
-    ])
-
-    king = np.array([
-    [-30,-40,-40,-50,-50,-40,-40,-30],
-    [-30,-40,-40,-50,-50,-40,-40,-30],
-    [-30,-40,-40,-50,-50,-40,-40,-30],
-    [-30,-40,-40,-50,-50,-40,-40,-30],
-    [-20,-30,-30,-40,-40,-30,-30,-20],
-    [-10,-20,-20,-20,-20,-20,-20,-10],
-    [20, 20,  0,  0,  0,  0, 20, 20],
-    [20, 30, 10,  0,  0, 10, 30, 20]
-    ])
-
-    #In the endgame, we want the king to move up the board
-    king_end = np.array([
-    [-50,-40,-30,-20,-20,-30,-40,-50],
-    [-30,-20,-10,  0,  0,-10,-20,-30],
-    [-30,-10, 20, 30, 30, 20,-10,-30],
-    [-30,-10, 30, 40, 40, 30,-10,-30],
-    [-30,-10, 30, 40, 40, 30,-10,-30],
-    [-30,-10, 20, 30, 30, 20,-10,-30],
-    [-30,-30,  0,  0,  0,  0,-30,-30],
-    [-50,-30,-30,-30,-30,-30,-30,-50]
-    ])
-
-def munchkin_move(board_rep:BoardRep,legal_moves:list, colour:str = "black"):
-    """Acts on the board to make a move"""
-    move_handler = MoveHandler(board_rep)
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Sequence, Callable
+
+TT_SIZE_MB = 16 # Memory budget of the transposition table of each search process
+MAX_DEPTH = 64 # Iterative deepening stops here if it hasn't run out of time before
+MOVE_TIME = 3.0 # Seconds munchkin_move thinks for when there is no clock
+# Set MUNCHKIN_DEBUG_EVAL=1 to check every incremental evaluation against a full one (slow, the search processes see it too)
+DEBUG_EVAL = bool(os.environ.get("MUNCHKIN_DEBUG_EVAL"))
+DELTA_MARGIN = 200 # A capture is skipped in quiescence if even winning this much on top of the victim can't reach alpha/beta
+# Within SEE_PRUNING_DEPTH plies of the leaves, captures losing more than SEE_PRUNING_MARGIN per ply left (by SEE) aren't searched
+SEE_PRUNING_DEPTH = 2
+SEE_PRUNING_MARGIN = 100
+
+# How a SearchPool splits the work between its processes
+ROOT_SPLIT = "root_split" # Every process searches some of the root moves, with its own transposition table
+LAZY_SMP = "lazy_smp" # Every process searches all the moves, sharing one transposition table
+YBWC = "ybwc" # The first move of a node is searched alone, then its brothers go to whichever process is free
+SEARCH_MODES = (ROOT_SPLIT, LAZY_SMP, YBWC)
+LAZY_SMP_DEPTH_SPREAD = 3 # Lazy SMP threads start at depth 1, 2, 3, 1, 2, 3...
+REPORT_INTERVAL = 0.02 # Seconds between two looks at the iterations the search processes reported
+
+# Layout of the shared split point of a YBWC search
+SPLIT_ALPHA, SPLIT_BETA, SPLIT_GENERATION = 0, 1, 2
+# Nodes at least this many plies from the leaves are split points: once their eldest brother is searched, their young
+# brothers are all handed out at once. Shallower ones are searched whole by a single search process, a split point
+# costs a round trip for every brother
+YBWC_MIN_SPLIT_DEPTH = 3
+
+# Iterative deepening searches around the score of the last iteration, ASPIRATION_WINDOW either way,
+# and if the score falls outside the window gets ASPIRATION_GROWTH times wider on that side until it fits
+ASPIRATION_WINDOW = 50
+ASPIRATION_GROWTH = 4
+ASPIRATION_MIN_DEPTH = 3 # Shallower iterations are fast enough with a full window
+MATE_BOUND = PieceValue.king - 2 * MAX_DEPTH # Scores past this are mates, no window guesses around them
+
+
+def _score_to_tt(score: float, ply: int) -> float:
+    """
+    Mate scores count the plies from the root (PieceValue.king - ply of the mate), but the same position can be
+    reached at another ply, so the transposition table keeps them counted from the node they were found at
+    """
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+def _score_from_tt(score: float, ply: int) -> float:
+    """The score of a transposition table entry probed at ply, counted from the root again"""
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
 
-    values= PieceValue()
-    tables= PieceTable()
 
-    best_move = find_best_move(board_rep, legal_moves,5,colour)
+class PVTable:
+    """
+    Triangular principal variation table: lines[ply] is the best line found from the node being searched at
+    that ply on. When a move becomes the best of its node, the line of its child is copied behind it, so the
+    root row ends up holding the whole principal variation and not just the move to play
+    """
+    def __init__(self, max_ply: int = MAX_DEPTH):
+        self.lines = [[] for _ in range(max_ply + 1)]
+
+    def clear(self, ply: int) -> None:
+        """Called when a node at this ply is entered, it has no line yet"""
+        if ply >= len(self.lines) - 1: # A search deeper than max_ply
+            self.lines.extend([] for _ in range(ply + 2 - len(self.lines)))
+        self.lines[ply] = []
+
+    def update(self, ply: int, move: int) -> None:
+        """move is the new best move at ply"""
+        self.lines[ply] = [move, *self.lines[ply + 1]]
+
+    @property
+    def principal_variation(self) -> list[int]:
+        return self.lines[0]
+
+
+def munchkin_move(board_rep:BoardRep,legal_moves:list, colour:str = "black",
+                  time_left:float | None = None, increment:float = 0.0):
+    """
+    Acts on the board to make a move. Thinks for MOVE_TIME seconds, or for a share of
+    time_left (plus the increment) if we are playing with a clock
+    """
+    move_handler = MoveHandler(board_rep)
+
+    if time_left is not None:
+        soft_time, hard_time = allocate_time(time_left, increment)
+    else:
+        soft_time, hard_time = MOVE_TIME, MOVE_TIME * HARD_LIMIT_FACTOR
 
-    source_square, target_square = best_move
-    current_player_board = board_rep.bitboard_white if colour == "white" else board_rep.bitboard_black
+    best_move = find_best_move(board_rep, legal_moves, MAX_DEPTH, colour, soft_time=soft_time, hard_time=hard_time)
 
     move_handler.make_move(move = best_move, colour = colour)
 
@@ -118,220 +115,1034 @@ def munchkin_move(board_rep:BoardRep,legal_moves:list, colour:str = "black"):
     #in which case the logic is handled before it gets here
 
 
-def minimax(board_rep:BoardRep, move_handler:MoveHandler, alpha:float, beta:float, depth:int, values:PieceValue, tables:PieceTable, colour:str) -> float:
+def minimax(board_rep:BoardRep, move_handler:MoveHandler, alpha:float, beta:float, depth:int, values:PieceValue, tables:PieceTable, colour:str | int,
+            tt:TranspositionTable | None = None, orderer:MoveOrderer | None = None, ply:int = 0,
+            control:SearchControl | None = None, selective:SelectiveSearch | None = None, pv:"PVTable | None" = None) -> float:
 
     """
     Minimax algorithm with alpha beta pruning, returns the evaluation of a 
-    position given a depth
+    position given a depth. If a transposition table is given, positions that
+    were already searched deep enough are not searched again, and if a move orderer
+    is given the moves are searched best first (ply is the distance from the root).
+    A search control makes it raise SearchStopped when the time is up.
+    With a SelectiveSearch the moves that are obviously bad are pruned or searched
+    shallower (see selective_search.py), without one every move is searched to the full depth.
+    Every move after the first is searched with a null window first (principal variation search),
+    and with a PVTable the best line found is written to its row for this ply
     """
 
+    if control is not None:
+        control.check()
+    if pv is not None:
+        pv.clear(ply)
+
     if depth == 0:
-        return evaluate_board(board_rep.bitboard_white, board_rep.bitboard_black, values, tables) #Evaluate board if we are at the root
+        # Don't evaluate in the middle of an exchange, resolve the captures first. Checkmates and stalemates are found
+        # one ply up, where the moves are generated anyway: looking for a legal move at every leaf costs too much
+        return quiescence(board_rep, move_handler, alpha, beta, values, tables, colour, control)
+
+    alpha_original, beta_original = alpha, beta
+    hash_move = NO_MOVE
+    if tt is not None:
+        entry = tt.probe(board_rep.zobrist_key)
+        if entry is not None:
+            entry_depth, bound, score, hash_move = entry
+            score = _score_from_tt(score, ply)
+            if entry_depth >= depth: # The stored search went at least as deep as we want to go
+                if bound == EXACT:
+                    return score
+                if bound == LOWER and score >= beta:
+                    return score
+                if bound == UPPER and score <= alpha:
+                    return score
 
+    side = SIDES[colour]
+    opponent = side ^ 1
     validator = ValidMoves(board_rep)
-    pseudo_legal_moves = validator.generate_pseudo_legal_moves(colour)
-    
+    in_check = False
+    if depth <= SEE_PRUNING_DEPTH or selective is not None:
+        in_check = validator.is_square_attacked(board_rep.bitboards[side * 6 + KING], side)
+
+    futility_margin = None # Set if the quiet moves that don't give check can't bring the score back to alpha/beta
+    if selective is not None and not in_check:
+        if selective.futility and depth < len(FUTILITY_MARGINS):
+            static = evaluate(board_rep, values, tables)
+            margin = REVERSE_FUTILITY_MARGIN * depth
+            # Reverse futility: so far above beta (or below alpha for black) that a quiet move wouldn't bring it back
+            if side == WHITE and static - margin >= beta:
+                selective.reverse_futility_cutoffs += 1
+                return static - margin
+            if side == BLACK and static + margin <= alpha:
+                selective.reverse_futility_cutoffs += 1
+                return static + margin
+            futility_margin = static + FUTILITY_MARGINS[depth] if side == WHITE else static - FUTILITY_MARGINS[depth]
+
+        # Null move: pass, and if the opponent still can't get back below beta (above alpha for black) the position is cut off.
+        # Not twice in a row, and not when a pass could be our best move (zugzwang), i.e. in endgames and with only pawns left
+        bound = beta if side == WHITE else alpha
+        if (selective.null_move and depth >= NULL_MOVE_MIN_DEPTH and abs(bound) != np.inf
+                and (board_rep.ply == 0 or board_rep.undo_stack[board_rep.ply - 1][0] != NO_MOVE)
+                and any(board_rep.bitboards[side * 6 + piece] for piece in (KNIGHT, BISHOP, ROOK, QUEEN))
+                and not is_endgame(board_rep.bitboards)):
+            selective.null_move_tries += 1
+            reduction = NULL_MOVE_REDUCTION + (depth > 6)
+            move_handler.make_null_move()
+            if side == WHITE:
+                score = minimax(board_rep, move_handler, beta - 1, beta, depth - 1 - reduction, values, tables, opponent, tt, orderer, ply + 1, control, selective, pv)
+            else:
+                score = minimax(board_rep, move_handler, alpha, alpha + 1, depth - 1 - reduction, values, tables, opponent, tt, orderer, ply + 1, control, selective, pv)
+            move_handler.unmake_move()
+            if (score >= beta) if side == WHITE else (score <= alpha):
+                selective.null_move_cutoffs += 1
+                return bound # Not the score, a mate found after passing doesn't mean much
+
+    pseudo_legal_moves = validator.generate_pseudo_legal_moves(side)
+    is_legal = validator.legality_check(side) # Checks and pins are worked out once, moves that leave the king in check are never made
+    see_limit = None
+    if depth <= SEE_PRUNING_DEPTH and not in_check: # In check every move has to be looked at
+        see_limit = -SEE_PRUNING_MARGIN * depth
+
+    if orderer is not None:
+        pseudo_legal_moves = orderer.order_moves(board_rep, pseudo_legal_moves, side, ply, hash_move)
+    elif hash_move != NO_MOVE and hash_move in pseudo_legal_moves: # Search the best move of the last search of this position first, it is likely to cause a cut-off
+        i = pseudo_legal_moves.index(hash_move)
+        pseudo_legal_moves[0], pseudo_legal_moves[i] = pseudo_legal_moves[i], pseudo_legal_moves[0]
+    killers = orderer.killers[ply] if orderer is not None else ()
+    live_window = control is not None and control.window_ply == ply
+    late_move_reductions = selective is not None and selective.late_move_reductions and depth >= LMR_MIN_DEPTH and not in_check
+
     legal_moves_found = 0
-    opponent_colour = "black" if colour == "white" else "white"
+    best_move = NO_MOVE
+    value = -np.inf if side == WHITE else np.inf
 
-    if colour == "white":
-        value = -np.inf
-        for move in pseudo_legal_moves:
-            unmake_info = move_handler.make_move(move, colour)
+    def search(child_alpha: float, child_beta: float, child_depth: int) -> float:
+        """Searches the move just made"""
+        return minimax(board_rep, move_handler, child_alpha, child_beta, child_depth, values, tables, opponent, tt, orderer, ply + 1, control, selective, pv)
 
-            king_bb = board_rep.bitboard_white["king"]
-            if validator.is_square_attacked(king_bb, colour): # If we are leaving the king in check after doing the move
-                move_handler.unmake_move(unmake_info) # Undo move 
-                continue # Skip this move
-            
-            legal_moves_found += 1 # If the last condition is not true, we have a legal move
-            value = max(value, minimax(board_rep, move_handler, alpha, beta, depth - 1, values, tables, opponent_colour)) # Call minimax recursively
-            move_handler.unmake_move(unmake_info) # Unmake the move to not change the board state
+    for move in pseudo_legal_moves:
+        if not is_legal(move):
+            continue
+        if live_window: # A move of a YBWC split point, the brothers finished since it started may have narrowed the window
+            split_alpha, split_beta = control.window()
+            alpha_original, beta_original = max(alpha_original, split_alpha), min(beta_original, split_beta)
+            alpha, beta = max(alpha, split_alpha), min(beta, split_beta)
+            if (value >= beta) if side == WHITE else (value <= alpha):
+                break
+        legal_moves_found += 1
+        # Losing captures near the leaves, once a move has been searched so there is a score to return
+        if see_limit is not None and best_move != NO_MOVE and move & (CAPTURE << 12) and capture_see(validator, move) < see_limit:
+            continue
+        move_handler.make_move(move, side)
+
+        reduction = 0
+        if best_move != NO_MOVE and not move & ((CAPTURE | PROMOTION) << 12): # A quiet move, and not the first one
+            futile = futility_margin is not None and (futility_margin <= alpha if side == WHITE else futility_margin >= beta)
+            late = late_move_reductions and legal_moves_found > LMR_FULL_DEPTH_MOVES and move not in killers
+            if (futile or late) and not validator.is_square_attacked(board_rep.bitboards[opponent * 6 + KING], opponent): # Checks are never pruned nor reduced
+                if futile:
+                    selective.futility_prunes += 1
+                    move_handler.unmake_move()
+                    continue
+                reduction = 2 if legal_moves_found > LMR_DEEP_REDUCTION_MOVES and depth >= 6 else 1
+
+        if best_move == NO_MOVE: # The first move, the principal variation as far as we know, gets the whole window
+            score = search(alpha, beta, depth - 1)
+        else:
+            # Principal variation search: the other moves are only expected to be worse, and a null window around alpha
+            # (beta for black) is enough to check that. The few that turn out better are searched again properly
+            if side == WHITE:
+                null_alpha, null_beta = alpha, alpha + 1
+            else:
+                null_alpha, null_beta = beta - 1, beta
+            score = search(null_alpha, null_beta, depth - 1 - reduction)
+            if reduction:
+                selective.reductions += 1
+                if (score > alpha) if side == WHITE else (score < beta): # Better than expected, look again at the full depth
+                    selective.re_searches += 1
+                    score = search(null_alpha, null_beta, depth - 1)
+            if alpha < score < beta:
+                score = search(alpha, beta, depth - 1)
+        move_handler.unmake_move() # Unmake the move to not change the board state
+
+        if pv is not None and alpha < score < beta: # A new best move inside the window, with the line of its child after it
+            pv.update(ply, move)
+        if side == WHITE:
+            if score > value:
+                value = score
+                best_move = move
             if value >= beta: # Alpha beta pruning
+                if orderer is not None:
+                    orderer.record_cutoff(move, side, ply, depth, legal_moves_found - 1)
                 break
             alpha = max(alpha, value) # max
-        
-        # If no legal moves were found, it's checkmate or stalemate
-        if legal_moves_found == 0:
-            king_bb = board_rep.bitboard_white["king"] # Get the pos of the king
-            if validator.is_square_attacked(king_bb, colour): # Is the king in check?:
-                return -values.king+depth # Checkmate, prioritise earlier checkmates
-            else:
-                return 0 # Stalemate
-        return value
-
-    else:  # Black's turn
-        value = np.inf
-        for move in pseudo_legal_moves:
-            unmake_info = move_handler.make_move(move, colour)
-
-            king_bb = board_rep.bitboard_black["king"]
-            if validator.is_square_attacked(king_bb, colour): # Leaves the king in check
-                move_handler.unmake_move(unmake_info) # Undo move
-                continue # Skip this move
-            
-            legal_moves_found += 1 # If the last condition is not true we have a legal move
-            value = min(value, minimax(board_rep, move_handler, alpha, beta, depth - 1, values, tables, opponent_colour)) # Call minimax recursively
-            move_handler.unmake_move(unmake_info) # Unmake the move to not change the board state
-            
+        else: # Black's turn
+            if score < value:
+                value = score
+                best_move = move
             if value <= alpha: # Alpha beta pruning
+                if orderer is not None:
+                    orderer.record_cutoff(move, side, ply, depth, legal_moves_found - 1)
                 break
             beta = min(beta, value) # mini
-        
-        # If no legal moves were found, it's checkmate or stalemate
-        if legal_moves_found == 0:
-            king_bb = board_rep.bitboard_black["king"]
-            if validator.is_square_attacked(king_bb, colour):
-                return values.king-depth # Checkmate, prioritise earlier checkmates
-            else:
-                return 0 # Stalemate
-        return value
 
-def score_move(
-        fen_string: str, 
-        moves_to_check: list[tuple[int,int]],
-        depth: int, colour: str) -> tuple[float,tuple[int,int] | None]:
-    """ Scores a move using the minimax algorithm to search into the decision tree """
+    # If no legal moves were found, it's checkmate or stalemate
+    if legal_moves_found == 0:
+        if validator.is_square_attacked(board_rep.bitboards[side * 6 + KING], side): # Is the king in check?:
+            value = -values.king + ply if side == WHITE else values.king - ply # Checkmate, the closer to the root the better
+        else:
+            value = 0 # Stalemate
+
+    if tt is not None:
+        # Scores are always from white's point of view, so the bounds mean the same for both sides
+        if value <= alpha_original:
+            bound = UPPER
+        elif value >= beta_original:
+            bound = LOWER
+        else:
+            bound = EXACT
+        tt.store(board_rep.zobrist_key, depth, bound, _score_to_tt(value, ply), best_move)
+    return value
+
+def quiescence(board_rep:BoardRep, move_handler:MoveHandler, alpha:float, beta:float, values:PieceValue, tables:PieceTable, colour:str | int,
+               control:SearchControl | None = None) -> float:
+    """
+    Searches only captures and promotions until the position is quiet, so that the leaves of minimax
+    are never evaluated halfway through an exchange (the horizon effect).
+    The side to move can always "stand pat", i.e. stop capturing and take the static evaluation.
+    Captures that can't bring the score back to the window even when they win the victim and
+    DELTA_MARGIN more are not searched (delta pruning), and neither are the ones the static
+    exchange evaluation says lose material
+    """
+
+    if control is not None:
+        control.check()
+
+    side = SIDES[colour]
+    stand_pat = evaluate(board_rep, values, tables)
+    if side == WHITE:
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+    else:
+        if stand_pat <= alpha:
+            return stand_pat
+        beta = min(beta, stand_pat)
+
+    validator = ValidMoves(board_rep)
+    captures = order_captures(board_rep, validator.generate_captures(side))
+
+    mailbox = board_rep.mailbox
+    piece_values = evaluation.PIECE_VALUES # The values BoardRep scores with, see evaluation.set_tables
+    is_legal = None
+    opponent = side ^ 1
+    value = stand_pat
+    for move in captures:
+        flags = move >> 12
+        if flags == EN_PASSANT:
+            gain = piece_values[PAWN]
+        elif flags & CAPTURE:
+            gain = piece_values[mailbox[(move >> 6) & 63] % 6]
+        else:
+            gain = 0
+        if flags & PROMOTION:
+            gain += piece_values[(flags & 3) + 1] - piece_values[PAWN]
+        # Delta pruning
+        if side == WHITE and stand_pat + gain + DELTA_MARGIN <= alpha:
+            continue
+        if side == BLACK and stand_pat - gain - DELTA_MARGIN >= beta:
+            continue
+
+        if flags & CAPTURE and capture_see(validator, move) < 0: # Loses material once the other side recaptures
+            continue
+
+        if is_legal is None: # Most quiescence nodes stand pat or prune every capture, so the checks and pins wait until here
+            is_legal = validator.legality_check(side)
+        if not is_legal(move): # Leaves the king in check
+            continue
+        move_handler.make_move(move, side)
+        score = quiescence(board_rep, move_handler, alpha, beta, values, tables, opponent, control)
+        move_handler.unmake_move()
+
+        if side == WHITE:
+            value = max(value, score)
+            if value >= beta:
+                break
+            alpha = max(alpha, value)
+        else:
+            value = min(value, score)
+            if value <= alpha:
+                break
+            beta = min(beta, value)
+
+    return value
+
+def _init_worker(stop_event, tt_size_mb: float, shared_tt_name: str | None = None, split_point=None, reports=None,
+                 game=None) -> None:
+    """
+    Runs once in every search process of a SearchPool. The stop event, the report queue and the game counter can only
+    be shared when the process starts, and the tables created here are reused by every search the process runs. With a
+    shared_tt_name the process attaches to the transposition table the whole pool shares (Lazy SMP and YBWC) instead of having its own
+    """
+    global _stop_event, _worker_tables, _split_point, _reports, _game, _tables_game
+    _stop_event = stop_event
+    _split_point = split_point
+    _reports = reports
+    _game = game
+    _tables_game = game.value if game is not None else 0
+    tt = SharedTranspositionTable(tt_size_mb, shared_tt_name) if shared_tt_name else TranspositionTable(tt_size_mb)
+    _worker_tables = (tt, MoveOrderer())
+
+_stop_event = None # Set by _init_worker in the search processes
+_worker_tables = None # (transposition table, move orderer) of a search process, kept warm between moves
+_split_point = None # Shared [alpha, beta, generation] of the split point a YBWC search is working on
+_reports = None # Queue the search processes send every iteration they finish to, see SearchPool._collect
+_game = None # Shared counter of the games a SearchPool started (SearchPool.new_game)
+_tables_game = 0 # Game the tables of this search process were last cleared for
+_tables_search = None # search_id of the YBWC search the tables of this search process were last aged for
+
+def _reporter(search_id: int, source: int) -> Callable[[int, float, int, tuple[int, ...], int], None] | None:
+    """on_iteration for score_move in a search process: sends the iteration to the pool as soon as it is finished"""
+    if _reports is None:
+        return None
+    def report(depth: int, score: float, move: int, principal_variation: tuple[int, ...], nodes: int) -> None:
+        _reports.put((search_id, source, depth, score, move, principal_variation, nodes))
+    return report
+
+def _search_tables(tt_size_mb: float) -> tuple[TranspositionTable, MoveOrderer]:
+    """The tables for a new search: the warm ones of this search process if it has them, new ones otherwise"""
+    if _worker_tables is None:
+        return TranspositionTable(tt_size_mb), MoveOrderer()
+    global _tables_game
+    tt, orderer = _worker_tables
+    if _game is not None and _game.value != _tables_game: # A new game started since the last search
+        _tables_game = _game.value
+        if not isinstance(tt, SharedTranspositionTable): # The pool clears the shared one
+            tt.clear()
+        orderer.clear()
+    tt.new_search()
+    orderer.new_search()
+    return tt, orderer
+
+def reset_search_state(tt_size_mb: float = TT_SIZE_MB, stop_event=None) -> None:
+    """
+    Gives the searches run in this process (score_move without a SearchPool) new tables of tt_size_mb, kept warm
+    from one search to the next like in a search process, and the event that stops them. For a new game
+    """
+    _init_worker(stop_event, tt_size_mb)
+
+def _warm_up() -> int:
+    """Sent to every search process when the pool starts, so they are all running before the first move"""
+    return multiprocessing.current_process().pid
+
+def _pool_search(submitted_at: float, search_id: int, source: int, *args, **kwargs) -> tuple[float, float, list[tuple[float, int | None, tuple[int, ...]]]]:
+    """
+    Runs score_move in a search process, along with the times it started and finished to measure the dispatch overhead.
+    Every iteration is reported to the pool as it finishes, source telling which partition it is
+    """
+    started_at = time.time()
+    results = score_move(*args, on_iteration=_reporter(search_id, source), **kwargs)
+    return started_at - submitted_at, time.time(), results
+
+def _smp_search(submitted_at: float, search_id: int, thread_id: int, fen: str, legal_moves: Sequence[int], depth: int, colour: str | int,
+                tt_size_mb: float, soft_deadline: float | None, hard_deadline: float | None,
+                selective: SelectiveSearch | None, node_limit: int | None = None) -> tuple[float, float, tuple[int, list]]:
+    """
+    One thread of a Lazy SMP search: searches all the moves, like every other thread. The threads start
+    up to LAZY_SMP_DEPTH_SPREAD - 1 plies deeper than the main one (thread 0), so they don't all search
+    the same depth at the same time, and every helper searches the root moves in an order of its own,
+    so they walk into different subtrees first and the shared transposition table fills up with results
+    the others can use instead of the same ones again. Every iteration is reported to the pool as it finishes
+    """
+    started_at = time.time()
+    start_depth = min(1 + thread_id % LAZY_SMP_DEPTH_SPREAD, depth)
+    results = score_move(fen, legal_moves, depth, colour, tt_size_mb, soft_deadline, hard_deadline, start_depth, node_limit,
+                         _reporter(search_id, thread_id), shuffle_seed=thread_id or None, selective=selective)
+    return started_at - submitted_at, time.time(), (start_depth, results)
+
+class _SplitPointControl(SearchControl):
+    """
+    SearchControl of a process searching a move of a YBWC split point. Besides the hard deadline and the stop
+    event, it stops the search once the split point was cut off (its generation moved on), and window() gives
+    the node the move leads to the split point's window as it is now, narrowed by every brother finished since
+    """
+    def __init__(self, hard_deadline: float | None, generation: int, window_ply: int, stoppable: bool = True):
+        super().__init__(hard_deadline, self)
+        self.generation = generation
+        self.window_ply = window_ply
+        self.stoppable = stoppable # Depth 1 isn't stopped, so there is always a move to play
+
+    def is_set(self) -> bool:
+        return _split_point[SPLIT_GENERATION] != self.generation or (self.stoppable and _stop_event.is_set())
+
+    def window(self) -> tuple[float, float]:
+        return _split_point[SPLIT_ALPHA], _split_point[SPLIT_BETA]
+
+def _ybwc_search(submitted_at: float, search_id: int, fen: str, path: tuple[int, ...], depth: int, colour: str | int,
+                 generation: int, hard_deadline: float | None, stoppable: bool,
+                 selective: SelectiveSearch | None) -> tuple[float, float, float | None, int]:
+    """
+    Searches one move of a YBWC split point, in whichever process picked it from the queue. path holds the moves
+    from the position of the fen to the split point, and then the move to search, which is searched depth plies deep.
+    The window is the split point's, read when the search starts and again before every move of the node it
+    leads to, so it includes every brother finished in the meantime. The first move a process searches for a search
+    (search_id) ages its tables, like score_move does. Returns None as the score if the search was aborted,
+    along with the nodes searched
+    """
+    global _tables_search
+    started_at = time.time()
+    control = _SplitPointControl(hard_deadline if stoppable else None, generation, len(path), stoppable)
+    if control.is_set():
+        return started_at - submitted_at, time.time(), None, 0
+
     board_rep = BoardRep()
-    board_rep.from_fen(fen_string)
+    board_rep.from_fen(fen)
     move_handler = MoveHandler(board_rep)
+    if search_id != _tables_search:
+        _tables_search = search_id
+        tt, orderer = _search_tables(TT_SIZE_MB)
+    else:
+        tt, orderer = _worker_tables
+    side = SIDES[colour]
+    for move in path:
+        move_handler.make_move(move, side)
+        side ^= 1
 
-    values = PieceValue()
-    tables = PieceTable()
-    alpha = -np.inf
-    beta = np.inf
-    
+    alpha, beta = control.window()
+    try:
+        score = minimax(board_rep, move_handler, alpha, beta, depth, PieceValue(), PieceTable(), side,
+                        tt, orderer, len(path), control, selective)
+    except SearchStopped:
+        score = None
+    return started_at - submitted_at, time.time(), score, control.nodes
+
+def _search_root(
+        board_rep: BoardRep, move_handler: MoveHandler,
+        root_moves: Sequence[int], depth: int, side: int,
+        values: PieceValue, tables: PieceTable,
+        tt: TranspositionTable, orderer: MoveOrderer,
+        control: SearchControl | None, selective: SelectiveSearch | None = None,
+        alpha: float = -np.inf, beta: float = np.inf, pv: PVTable | None = None) -> tuple[float, int | None]:
+    """
+    One iteration of the search: scores every root move to the given depth, returns the best (score, move).
+    Like every other node the root searches its first move with the whole window and the others with a null
+    window (see minimax). A score outside the (alpha, beta) window is only a bound, and the root row of the
+    PVTable is only written for scores inside it
+    """
     best_move_local = None
-    best_score_local = -np.inf if colour == "white" else np.inf
-    opponent_colour = "black" if colour == "white" else "white"
-
-    for move in moves_to_check:
-        unmake_info = move_handler.make_move(move, colour)
-        score = minimax(board_rep, move_handler, alpha, beta, depth - 1, values, tables, opponent_colour)
-        move_handler.unmake_move(unmake_info)
-        print(f"Move: {conversions.square_to_algebraic(move[0])}, {conversions.square_to_algebraic(move[1])}, Score: {score}")
-        
-        if colour == "white":
+    best_score_local = -np.inf if side == WHITE else np.inf
+    if pv is not None:
+        pv.clear(0)
+
+    def search(child_alpha: float, child_beta: float) -> float:
+        return minimax(board_rep, move_handler, child_alpha, child_beta, depth - 1, values, tables, side ^ 1, tt, orderer, 1, control, selective, pv)
+
+    for move in root_moves:
+        move_handler.make_move(move, side)
+        if best_move_local is None:
+            score = search(alpha, beta)
+        else:
+            score = search(alpha, alpha + 1) if side == WHITE else search(beta - 1, beta)
+            if alpha < score < beta:
+                score = search(alpha, beta)
+        move_handler.unmake_move()
+
+        # Only a score inside the window comes with a line to trust, the line of a fail high or low was cut short
+        inside_window = alpha < score < beta
+        if side == WHITE:
             if score > best_score_local:
                 best_score_local = score
                 best_move_local = move
+                if pv is not None and inside_window:
+                    pv.update(0, move)
             alpha = max(alpha, score)
         else: # Black
             if score < best_score_local:
                 best_score_local = score
                 best_move_local = move
+                if pv is not None and inside_window:
+                    pv.update(0, move)
             beta = min(beta, score)
-            
+        if alpha >= beta: # Only happens with an aspiration window, the caller searches again with a wider one
+            break
+
     return best_score_local, best_move_local
 
-def partition_lst(lst: list[tuple[int,int]], n: int) -> list[list[tuple[int,int]]]:
+def _aspiration_search(
+        board_rep: BoardRep, move_handler: MoveHandler,
+        root_moves: Sequence[int], depth: int, side: int,
+        values: PieceValue, tables: PieceTable,
+        tt: TranspositionTable, orderer: MoveOrderer,
+        control: SearchControl | None, selective: SelectiveSearch | None,
+        pv: PVTable, previous_score: float | None) -> tuple[float, int | None]:
+    """
+    _search_root with a narrow window around the score of the previous iteration, which the score usually
+    lands close to: the narrower the window the more gets cut off. If it falls outside, the window gets wider on
+    that side and the root is searched again, until the score is inside it
+    """
+    if depth < ASPIRATION_MIN_DEPTH or previous_score is None or abs(previous_score) >= MATE_BOUND:
+        return _search_root(board_rep, move_handler, root_moves, depth, side, values, tables, tt, orderer, control, selective, pv=pv)
+
+    below = above = ASPIRATION_WINDOW
+    while True:
+        alpha = previous_score - below if below is not None else -np.inf
+        beta = previous_score + above if above is not None else np.inf
+        score, move = _search_root(board_rep, move_handler, root_moves, depth, side, values, tables,
+                                   tt, orderer, control, selective, alpha, beta, pv)
+        if score <= alpha: # Failed low, the score is somewhere below alpha
+            below = below * ASPIRATION_GROWTH if below * ASPIRATION_GROWTH < MATE_BOUND else None
+        elif score >= beta: # Failed high
+            above = above * ASPIRATION_GROWTH if above * ASPIRATION_GROWTH < MATE_BOUND else None
+        else:
+            return score, move
+
+def score_move(
+        fen_string: str, 
+        moves_to_check: Sequence[int],
+        depth: int, colour: str | int,
+        tt_size_mb: float = TT_SIZE_MB,
+        soft_deadline: float | None = None,
+        hard_deadline: float | None = None,
+        start_depth: int = 1,
+        node_limit: int | None = None,
+        on_iteration: Callable[[int, float, int, tuple[int, ...], int], None] | None = None,
+        shuffle_seed: int | None = None,
+        selective: SelectiveSearch | None = None) -> list[tuple[float, int | None, tuple[int, ...]]]:
+    """
+    Scores the given root moves with iterative deepening: searches to depth start_depth, start_depth + 1, ... up to depth,
+    each iteration with an aspiration window around the score of the last one,
+    and doesn't start a new iteration after the soft deadline (a time.time() value).
+    With a shuffle_seed every root move but the first is put in a random order (Lazy SMP helpers).
+    With a SelectiveSearch the search prunes and reduces (its counters are reset first), without one it is plain alpha-beta.
+    An iteration still running at the hard deadline, or past node_limit nodes, is aborted.
+    on_iteration(depth, score, move, principal variation, nodes so far) is called after every iteration that finished.
+    Returns the best (score, move, principal variation) of every iteration that finished, the first one being start_depth
+    """
+    board_rep = BoardRep()
+    board_rep.from_fen(fen_string)
+    move_handler = MoveHandler(board_rep)
+    tt, orderer = _search_tables(tt_size_mb)
+    control = SearchControl(hard_deadline, _stop_event, node_limit)
+    if selective is not None:
+        selective.new_search()
+    pv = PVTable()
+
+    values = PieceValue()
+    tables = PieceTable()
+    side = SIDES[colour]
+
+    # Good moves first, so the window narrows quickly and the other moves are cut off sooner
+    root_moves = orderer.order_moves(board_rep, moves_to_check, side, 0)
+    if shuffle_seed is not None:
+        rest = root_moves[1:]
+        random.Random(shuffle_seed).shuffle(rest)
+        root_moves[1:] = rest
+    results = []
+    best_score = None
+    for current_depth in range(start_depth, depth + 1):
+        try:
+            # Depth 1 is always finished, so there is a move to play however little time we have, its nodes are only counted
+            control.armed = current_depth > 1
+            best_score, best_move = _aspiration_search(board_rep, move_handler, root_moves, current_depth, side, values, tables,
+                                                       tt, orderer, control, selective, pv, best_score)
+        except SearchStopped:
+            while board_rep.ply: # Take back the moves of the aborted search
+                move_handler.unmake_move()
+            break
+        results.append((best_score, best_move, tuple(pv.principal_variation)))
+        if on_iteration is not None:
+            on_iteration(current_depth, *results[-1], control.nodes)
+
+        # The best move of this iteration is searched first in the next one, and the rest of its
+        # principal variation is found through the hash moves in the transposition table
+        root_moves.remove(best_move)
+        root_moves.insert(0, best_move)
+
+        if soft_deadline is not None and time.time() >= soft_deadline:
+            break
+        if _stop_event is not None and _stop_event.is_set():
+            break
+
+    return results
+
+def partition_lst(lst: Sequence[int], n: int) -> list[Sequence[int]]:
     length = len(lst)
     return [lst[i * length // n: (i + 1) * length // n]
             for i in range(n)]
 
+class SearchPool:
+    """
+    The search processes, started once and reused for every move. Starting a process means importing
+    the engine again, which used to take longer than a
+    shallow search, and every process keeps its transposition table and move ordering tables between moves.
+
+    In ROOT_SPLIT mode the root moves are dealt out between the processes. In LAZY_SMP mode every process
+    searches the whole tree and they share one transposition table, so each one profits from the cut-offs
+    the others found and none of them runs out of work before the others. In YBWC mode every node far enough
+    from the leaves is a split point: once its first move is searched, its other moves are handed out to
+    whichever process is free (see _search_split_point), also sharing the table. This process walks the eldest
+    brothers and keeps the move ordering tables of the split points in orderer. split_points counts the split
+    points searched, and split_cutoffs the cut-offs that aborted the brothers still queued or running.
+
+    Every process searches with the pool's SelectiveSearch, or prunes nothing (plain alpha-beta) without one.
+
+    dispatch_latencies holds, for every move, the longest time a process took to start searching after the
+    search was sent to it, and collect_latencies how long it took for the last result to come back after it
+    was finished. new_game() clears the tables of every process without starting new ones, and shutdown()
+    (or using the pool as a context manager) stops the processes
+    """
+    def __init__(self, workers: int | None = None, tt_size_mb: float = TT_SIZE_MB, mode: str = ROOT_SPLIT,
+                 selective: SelectiveSearch | None = None):
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {mode!r}, expected one of {SEARCH_MODES}")
+        self.workers = workers or multiprocessing.cpu_count()
+        self.tt_size_mb = tt_size_mb
+        self.mode = mode
+        self.selective = selective # Sent along with every search, None searches every move to the full depth
+        self.stop_event = multiprocessing.Event()
+        self.shared_tt = SharedTranspositionTable(tt_size_mb) if mode in (LAZY_SMP, YBWC) else None
+        self.split_point = multiprocessing.RawArray('d', 3) if mode == YBWC else None # Only ever written by this process
+        self.reports = multiprocessing.SimpleQueue()
+        self.game = multiprocessing.RawValue('i', 0) # Only ever written by this process
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                            initargs=(self.stop_event, tt_size_mb, self.shared_tt.name if self.shared_tt else None,
+                                                      self.split_point, self.reports, self.game))
+        self.dispatch_latencies: list[float] = []
+        self.collect_latencies: list[float] = []
+        self.orderer = MoveOrderer() # Orders the moves of the YBWC split points
+        self.split_points = self.split_cutoffs = 0
+        self.search_id = 0 # Tells the reports of the current search from the late ones of a search that was stopped
+        self.nodes = 0 # Searched by all the processes in the last search, as far as they reported
+        self.node_limit = None
+
+        # Processes are only started when work is sent to them, so send them something to do now
+        for future in [self.executor.submit(_warm_up) for _ in range(self.workers)]:
+            future.result()
+
+    def search(
+            self, fen: str, 
+            legal_moves: Sequence[int], 
+            depth: int, colour: str | int,
+            soft_deadline: float | None = None,
+            hard_deadline: float | None = None,
+            node_limit: int | None = None,
+            on_iteration: Callable[[int, float, int, tuple[int, ...], int], None] | None = None) -> list[tuple[float, int | None, tuple[int, ...]]]:
+        """
+        Searches the position with all the processes, returns the best (score, move, principal variation)
+        of every depth finished, the first one being depth 1. The search stops after about node_limit nodes
+        over all the processes, and on_iteration(depth, score, move, principal variation, nodes so far) is called
+        as soon as the processes have finished every depth, while the search goes on
+        """
+        self.stop_event.clear()
+        self.search_id += 1
+        self.nodes = 0
+        self.node_limit = node_limit
+        if self.shared_tt is not None:
+            self.shared_tt.new_search()
+        if self.mode == YBWC:
+            return self._search_ybwc(fen, legal_moves, depth, colour, soft_deadline, hard_deadline, on_iteration)
+
+        submitted_at = time.time()
+        if self.mode == LAZY_SMP:
+            sources = self.workers
+        else:
+            partitioned_list = [partition for partition in partition_lst(legal_moves, self.workers) if partition] # Partition list into smaller lists
+            sources = len(partitioned_list)
+        process_limit = -(-node_limit // sources) if node_limit is not None else None # Every process gets its share of the nodes
+        if self.mode == LAZY_SMP:
+            futures = [
+                self.executor.submit(_smp_search, submitted_at, self.search_id, thread_id, fen, legal_moves, depth, colour, self.tt_size_mb,
+                                     soft_deadline, hard_deadline, self.selective, process_limit)
+                for thread_id in range(self.workers)
+            ]
+        else:
+            futures = [
+                self.executor.submit(_pool_search, submitted_at, self.search_id, source, fen, partition, depth, colour, self.tt_size_mb,
+                                     soft_deadline, hard_deadline, node_limit=process_limit, selective=self.selective)
+                for source, partition in enumerate(partitioned_list)
+            ] # Call score move with each partition in separate 'threads'
+
+        results = self._collect(futures, colour, on_iteration)
+        if self.mode == LAZY_SMP:
+            return self._merge_threads(results)
+        return self._merge_partitions(results, colour)
+
+    def _collect(self, futures: list, colour: str | int,
+                 on_iteration: Callable[[int, float, int, tuple[int, ...], int], None] | None) -> list:
+        """
+        Waits for the results of the processes, in the order of futures. Meanwhile it reads the iterations the processes
+        report as they finish them: a depth is done once a Lazy SMP thread finished it and no thread before it still can
+        (the same pick as _merge_threads), or once every root split partition did, and then on_iteration is told about it
+        with the nodes of all the processes
+        """
+        results = [None] * len(futures)
+        iterations = {} # depth: {source: (score, move, principal variation)}
+        nodes = {} # source: nodes searched by its last finished iteration
+        reported = 0
+        pick = max if SIDES[colour] == WHITE else min
+        dispatch_latency = collect_latency = 0.0
+        pending = set(futures)
+        while True:
+            done, pending = wait(pending, timeout=REPORT_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                started_after, finished_at, result = future.result()
+                index = futures.index(future)
+                if self.mode == LAZY_SMP and index == 0:
+                    self.stop_event.set() # Once the main thread is done, the helpers are only slowing it down
+                dispatch_latency = max(dispatch_latency, started_after)
+                collect_latency = max(collect_latency, time.time() - finished_at)
+                results[index] = result
+
+            # A process reports an iteration before it returns, so once it is done its reports are all in the queue
+            while not self.reports.empty():
+                search_id, source, depth, *iteration, source_nodes = self.reports.get()
+                if search_id == self.search_id:
+                    iterations.setdefault(depth, {})[source] = tuple(iteration)
+                    nodes[source] = source_nodes
+            self.nodes = sum(nodes.values())
+            while reported + 1 in iterations and self._depth_done(iterations[reported + 1], futures, pending):
+                reported += 1
+                by_source = iterations[reported]
+                if self.mode == LAZY_SMP:
+                    iteration = by_source[min(by_source)]
+                else:
+                    iteration = pick((by_source[source] for source in sorted(by_source)), key=itemgetter(0)) # Ties go to the first partition, like in _merge_partitions
+                if on_iteration is not None:
+                    on_iteration(reported, *iteration, self.nodes)
+            if not pending:
+                break
+
+        self.dispatch_latencies.append(dispatch_latency)
+        self.collect_latencies.append(collect_latency)
+        return results
+
+    def _depth_done(self, by_source: dict, futures: list, pending: set) -> bool:
+        """Whether the sources that reported a depth settle it: every partition, or the first thread that can still finish it"""
+        if self.mode != LAZY_SMP:
+            return len(by_source) == len(futures)
+        return all(futures[source] not in pending for source in range(min(by_source)))
+
+    def _search_ybwc(
+            self, fen: str,
+            legal_moves: Sequence[int],
+            depth: int, colour: str | int,
+            soft_deadline: float | None,
+            hard_deadline: float | None,
+            on_iteration: Callable[[int, float, int, tuple[int, ...], int], None] | None) -> list[tuple[float, int | None, tuple[int, ...]]]:
+        """
+        Iterative deepening where every iteration is searched by _search_split_point from the root.
+        The processes only send back scores (and their node counts), so the principal variation is just the best move
+        """
+        self.dispatch_latencies.append(0.0)
+        self.collect_latencies.append(0.0)
+        board_rep = BoardRep()
+        board_rep.from_fen(fen)
+        move_handler = MoveHandler(board_rep)
+        orderer = self.orderer
+        orderer.new_search()
+        root_moves = list(legal_moves)
+        results = []
+        for current_depth in range(1, depth + 1):
+            result = self._search_split_point(fen, board_rep, move_handler, (), root_moves, current_depth, SIDES[colour],
+                                       -np.inf, np.inf, hard_deadline, orderer, stoppable=current_depth > 1)
+            if result is None: # Ran out of time, or stopped
+                break
+            results.append((*result, (result[1],)))
+            if on_iteration is not None:
+                on_iteration(current_depth, *results[-1], self.nodes)
+
+            # The best move is the eldest brother of the next iteration
+            root_moves.remove(result[1])
+            root_moves.insert(0, result[1])
+
+            if soft_deadline is not None and time.time() >= soft_deadline:
+                break
+            if self.stop_event.is_set():
+                break
+        return results
+
+    def _search_split_point(
+            self, fen: str,
+            board_rep: BoardRep, move_handler: MoveHandler,
+            path: tuple[int, ...], moves: Sequence[int],
+            depth: int, side: int,
+            alpha: float, beta: float,
+            hard_deadline: float | None,
+            orderer: MoveOrderer, stoppable: bool = True) -> tuple[float, int] | None:
+        """
+        Young Brothers Wait at the node board_rep is at (path from the fen), whose legal moves are given best first.
+        The eldest brother is searched on its own, so that its score gives the others a narrow window: by this process
+        as a split point of its own if it is deep enough (YBWC_MIN_SPLIT_DEPTH), by a search process otherwise. Then,
+        unless it caused a cut-off, the young brothers are all handed out at once, at whatever depth the node is, and
+        the search processes follow the window of this node as their brothers narrow it. Returns the best (score, move),
+        None if the search was stopped before every move was searched
+        """
+        alpha_original, beta_original = alpha, beta
+        maximising = side == WHITE
+        self.split_points += 1
+        eldest, young = moves[0], moves[1:]
+        if depth - 1 >= YBWC_MIN_SPLIT_DEPTH:
+            score = self._search_child(fen, board_rep, move_handler, path, eldest, depth, side, alpha, beta, hard_deadline, orderer, stoppable)
+            best = (score, eldest) if score is not None else None
+        else:
+            best = self._search_brothers(fen, path, (eldest,), depth, side, alpha, beta, hard_deadline, stoppable)
+        if best is None:
+            return None
+
+        if maximising:
+            alpha = max(alpha, best[0])
+        else:
+            beta = min(beta, best[0])
+        if young and alpha < beta:
+            result = self._search_brothers(fen, path, young, depth, side, alpha, beta, hard_deadline, stoppable)
+            if result is None:
+                return None
+            if (result[0] > best[0]) if maximising else (result[0] < best[0]):
+                best = result
+
+        # Stored like minimax does, so the next iteration finds the hash move of every split point
+        bound = UPPER if best[0] <= alpha_original else LOWER if best[0] >= beta_original else EXACT
+        self.shared_tt.store(board_rep.zobrist_key, depth, bound, _score_to_tt(best[0], len(path)), best[1])
+        return best
+
+    def _search_child(
+            self, fen: str,
+            board_rep: BoardRep, move_handler: MoveHandler,
+            path: tuple[int, ...], move: int,
+            depth: int, side: int,
+            alpha: float, beta: float,
+            hard_deadline: float | None,
+            orderer: MoveOrderer, stoppable: bool) -> float | None:
+        """Makes the move and searches the position it leads to as a split point, returns its score (None if stopped)"""
+        move_handler.make_move(move, side)
+        opponent = side ^ 1
+        validator = ValidMoves(board_rep)
+        child_moves = validator.generate_all_legal_moves(opponent)
+        if child_moves:
+            entry = self.shared_tt.probe(board_rep.zobrist_key)
+            child_moves = orderer.order_moves(board_rep, child_moves, opponent, len(path) + 1, entry[3] if entry else NO_MOVE)
+            result = self._search_split_point(fen, board_rep, move_handler, path + (move,), child_moves, depth - 1, opponent,
+                                              alpha, beta, hard_deadline, orderer, stoppable)
+            score = result[0] if result is not None else None
+        elif validator.is_square_attacked(board_rep.bitboards[opponent * 6 + KING], opponent): # Checkmate, scored like minimax does
+            ply = len(path) + 1
+            score = -PieceValue.king + ply if opponent == WHITE else PieceValue.king - ply
+        else:
+            score = 0 # Stalemate
+        move_handler.unmake_move()
+        return score
+
+    def _search_brothers(
+            self, fen: str,
+            path: tuple[int, ...], moves: Sequence[int],
+            depth: int, side: int,
+            alpha: float, beta: float,
+            hard_deadline: float | None, stoppable: bool) -> tuple[float, int] | None:
+        """
+        Queues the moves of a split point at once, every process takes the next one as soon as it is free, so no
+        process sits idle while there is work left. Every result that improves the window is written to the shared
+        split point, where the searches still running read it. If a move causes a cut-off, the generation of the
+        split point moves on, which aborts the searches still running for it. There is only ever one split point with
+        brothers out, its ancestors are waiting for it, so they all share the one split point of the pool.
+        Returns the best (score, move), None if the search was stopped before every move was searched
+        """
+        split_point = self.split_point
+        generation = split_point[SPLIT_GENERATION] + 1
+        split_point[SPLIT_ALPHA], split_point[SPLIT_BETA], split_point[SPLIT_GENERATION] = alpha, beta, generation
+        maximising = side == WHITE
+        best_score, best_move = -np.inf if maximising else np.inf, None
+        colour = side ^ (len(path) % 2) # The side to move in the position of the fen
+
+        futures = {
+            self.executor.submit(_ybwc_search, time.time(), self.search_id, fen, path + (move,), depth - 1, colour, generation,
+                                 hard_deadline, stoppable, self.selective): move
+            for move in moves
+        }
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                move = futures.pop(future)
+                started_after, finished_at, score, nodes = future.result()
+                self.dispatch_latencies[-1] = max(self.dispatch_latencies[-1], started_after)
+                self.collect_latencies[-1] = max(self.collect_latencies[-1], time.time() - finished_at)
+                self.nodes += nodes
+                if self.node_limit is not None and self.nodes >= self.node_limit:
+                    self.stop_event.set() # The searches still running stop, and those queued don't start
+                if score is None:
+                    split_point[SPLIT_GENERATION] = generation + 1 # Abort the rest
+                    wait(futures)
+                    return None
+
+                if (score > best_score) if maximising else (score < best_score):
+                    best_score, best_move = score, move
+                    if maximising:
+                        split_point[SPLIT_ALPHA] = max(split_point[SPLIT_ALPHA], score)
+                    else:
+                        split_point[SPLIT_BETA] = min(split_point[SPLIT_BETA], score)
+                if split_point[SPLIT_ALPHA] >= split_point[SPLIT_BETA]: # Cut-off, the remaining moves don't matter
+                    self.split_cutoffs += bool(futures)
+                    split_point[SPLIT_GENERATION] = generation + 1
+                    for pending in futures:
+                        pending.cancel() # The ones no process has picked up yet
+                    wait(futures)
+                    return best_score, best_move
+
+        return best_score, best_move
+
+    @staticmethod
+    def _merge_partitions(results: list[list[tuple[float, int | None, tuple[int, ...]]]], colour: str | int) -> list[tuple[float, int | None, tuple[int, ...]]]:
+        """Best move of every depth over all the partitions, only the depths every process finished can be compared"""
+        completed_depth = min(len(result) for result in results)
+        pick = max if SIDES[colour] == WHITE else min
+        return [pick((result[current_depth] for result in results), key=itemgetter(0)) for current_depth in range(completed_depth)]
+
+    @staticmethod
+    def _merge_threads(results: list[tuple[int, list[tuple[float, int | None, tuple[int, ...]]]]]) -> list[tuple[float, int | None, tuple[int, ...]]]:
+        """Result of every depth any thread finished, every thread searched all the moves so any of them will do"""
+        by_depth = {}
+        for start_depth, thread_results in results: # The main thread (0) comes first, it wins ties
+            for i, result in enumerate(thread_results):
+                by_depth.setdefault(start_depth + i, result)
+        merged = []
+        while len(merged) + 1 in by_depth:
+            merged.append(by_depth[len(merged) + 1])
+        return merged
+
+    def new_game(self) -> None:
+        """
+        Forgets what the searches of the previous games learned, keeping the processes: the shared transposition
+        table is cleared right away, and every process clears its own tables before its next search
+        """
+        if self.shared_tt is not None:
+            self.shared_tt.clear()
+        self.orderer.clear()
+        self.game.value += 1
+
+    def stop(self) -> None:
+        """Makes the running search return its last finished iteration as soon as possible"""
+        self.stop_event.set()
+
+    def latency_stats(self) -> dict[str, float]:
+        """Summary of the dispatch overhead of the moves searched so far, in milliseconds"""
+        if not self.dispatch_latencies:
+            return {"moves": 0}
+        return {
+            "moves": len(self.dispatch_latencies),
+            "dispatch_last_ms": self.dispatch_latencies[-1] * 1000,
+            "dispatch_mean_ms": sum(self.dispatch_latencies) / len(self.dispatch_latencies) * 1000,
+            "dispatch_max_ms": max(self.dispatch_latencies) * 1000,
+            "collect_mean_ms": sum(self.collect_latencies) / len(self.collect_latencies) * 1000,
+        }
+
+    def shutdown(self) -> None:
+        """Aborts any search in progress and stops the processes"""
+        self.stop_event.set()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.shared_tt is not None:
+            self.shared_tt.close()
+            self.shared_tt = None
+
+    def __enter__(self) -> "SearchPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+
+_default_pool = None
+
+def get_search_pool() -> SearchPool:
+    """The pool munchkin_move and find_best_move use unless they are given one, started the first time it is needed"""
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = SearchPool(selective=SelectiveSearch())
+        atexit.register(_default_pool.shutdown)
+    return _default_pool
+
 def find_best_move(
         board_rep: BoardRep, 
-        legal_moves: List[Tuple[int,int]], 
+        legal_moves: Sequence[int], 
         depth: int, 
-        colour:str) -> Tuple[int,int]:
+        colour:str | int,
+        soft_time: float | None = None,
+        hard_time: float | None = None,
+        pool: SearchPool | None = None) -> int:
 
-    """Finds the best move in a position, using the score_move function in 'parallel'"""
+    """
+    Finds the best move in a position, using the score_move function in 'parallel'.
+    The search deepens up to depth, for about soft_time seconds and never (much) longer than hard_time.
+    pool.stop() stops the search early
+    """
+
+    if len(legal_moves) == 1:
+        return legal_moves[0] # Nothing to think about
 
-    num_threads = multiprocessing.cpu_count() # Use the maximum number of "threads" we can
+    pool = pool if pool is not None else get_search_pool()
     
     fen = board_rep.to_fen(colour)
+    start = time.time()
+    soft_deadline = start + soft_time if soft_time is not None else None
+    hard_deadline = start + hard_time if hard_time is not None else None
 
-    partitioned_list = partition_lst(legal_moves, num_threads) # Partition list into smaller lists
-    results = []
+    results = pool.search(fen, legal_moves, depth, colour, soft_deadline, hard_deadline)
+    best_move = best_score = None
+    for current_depth, (best_score, best_move, principal_variation) in enumerate(results, 1):
+        print(f"Depth {current_depth}: {move_to_uci(best_move)} score {best_score} pv {' '.join(map(move_to_uci, principal_variation))}")
 
-    with ProcessPoolExecutor(max_workers=num_threads) as executor:
-        futures = [
-            executor.submit(score_move, fen, partition, depth, colour) 
-            for partition in partitioned_list 
-        ] # Call score move with each partition in separate 'threads'
+    if best_move is None: # Stopped before depth 1 was finished, play the move ordering's best guess
+        best_move = MoveOrderer().order_moves(board_rep, list(legal_moves), SIDES[colour], 0)[0]
 
-        for future in futures:
-            result = future.result()
-            if result[1] is not None:
-                results.append(result)
-
-    if colour == "white":
-        best_score, best_move = max(results, key=itemgetter(0)) # Get the result with the biggest score
-    else:
-        best_score, best_move = min(results, key=itemgetter(0)) # Get the result with the smallest score
-
-    assert best_move is not None
-
-    print(f"Munchkin found best move: {conversions.square_to_algebraic(best_move[0])}{conversions.square_to_algebraic(best_move[1])} with score: {best_score}")
+    print(f"Munchkin found best move: {move_to_uci(best_move)} with score: {best_score} in {time.time() - start:.2f}s "
+          f"(dispatch {pool.dispatch_latencies[-1] * 1000:.1f}ms)")
 
     return best_move
 
-def is_endgame(board_white:dict[str,int], board_black:dict[str,int]) -> bool:
+def is_endgame(bitboards:list[int]) -> bool:
     """
     We have an endgame if no queens are on the board or if the side(s) that
     have a queen only have one minor piece
     """
 
-    white_has_queen = board_white["queen"] != 0 
-    black_has_queen = board_black["queen"] != 0
+    white_has_queen = bitboards[QUEEN] != 0 
+    black_has_queen = bitboards[6 + QUEEN] != 0
 
     if not white_has_queen and not black_has_queen:
         return True # If no queens return True
 
     white_satisfies_condition = True
     if white_has_queen:
-        num_white_rooks = bin(board_white["rook"]).count('1')
-        num_white_knights = bin(board_white["knight"]).count('1')
-        num_white_bishops = bin(board_white["bishop"]).count('1')
+        num_white_rooks = bitboards[ROOK].bit_count()
+        num_white_knights = bitboards[KNIGHT].bit_count()
+        num_white_bishops = bitboards[BISHOP].bit_count()
         
         if num_white_rooks > 0 or (num_white_knights + num_white_bishops) > 1:
             white_satisfies_condition = False
 
     black_satisfies_condition = True
     if black_has_queen:
-        num_black_rooks = bin(board_black["rook"]).count('1')
-        num_black_knights = bin(board_black["knight"]).count('1')
-        num_black_bishops = bin(board_black["bishop"]).count('1')
+        num_black_rooks = bitboards[6 + ROOK].bit_count()
+        num_black_knights = bitboards[6 + KNIGHT].bit_count()
+        num_black_bishops = bitboards[6 + BISHOP].bit_count()
         
         if num_black_rooks > 0 or (num_black_knights + num_black_bishops) > 1:
             black_satisfies_condition = False
             
     return white_satisfies_condition and black_satisfies_condition
 
-def evaluate_board(board_white:dict[str,int],board_black:dict[str,int],values:PieceValue,tables:PieceTable) -> int:
-    """Evaluate a given board state, the values of the pieces, and the evaluations of the positions of the pieces"""
-    total_score = 0
-    endgame = is_endgame(board_white,board_black) # Are we in the endgame? 
-    #Because if so the king needs to be going up the board
-
-    for piece, bitboard in board_white.items():
-        piece_value = getattr(values, piece) # Get the value associated with the piece in the dataclass
-        piece_table = getattr(tables, piece) # Get the table associated with the piece in the dataclass
-        if piece == "king" and endgame: 
-            piece_table = getattr(tables,f"king_end") # Use king_end PieceTable instead if we are in the endgame
-
-        # Algorithm to get last bit
-        bb_copy = bitboard
-        while bb_copy > 0:
-            lsb = bb_copy & -bb_copy
-            square_index = lsb.bit_length() - 1
-            total_score += piece_value
-            # We have to reflect the piece tables along x-axis since the indexes are inverted
-            # So it "looks" correct from white's point of view, but the indexes are wrong
-            total_score += piece_table[7-(square_index // 8)][square_index % 8]
-            bb_copy &= (bb_copy - 1)
-
-    for piece, bitboard in board_black.items():
-        piece_value = getattr(values, piece)
-        piece_table = getattr(tables, piece)
-        bb_copy = bitboard
-        
-        while bb_copy > 0:
-            lsb = bb_copy & -bb_copy
-            square_index = lsb.bit_length() - 1
-            total_score -= piece_value
-            # If we have a pawn on a8, because of the nature of the piece value tables we want to consider as if it is on a1 for black, to get the correct evaluation
-            total_score -= piece_table[square_index // 8][square_index % 8]
-            bb_copy &= (bb_copy - 1)
-    
-    return total_score 
+def evaluate(board_rep:BoardRep, values:PieceValue, tables:PieceTable) -> int:
+    """
+    Evaluation of a position, read from the scores BoardRep keeps up to date. With DEBUG_EVAL
+    it is checked against evaluate_board, which adds the whole board up again
+    """
+    score = board_rep.static_evaluation()
+    if DEBUG_EVAL:
+        expected = evaluate_board(board_rep.bitboards, values, tables)
+        assert score == expected, f"Incremental evaluation {score} != {expected} in {board_rep.to_fen('white')}"
+    return score
+
+def evaluate_board(bitboards:list[int],values:PieceValue,tables:PieceTable) -> int:
+    """
+    Evaluate a given board state, the values of the pieces, and the evaluations of the positions of the pieces.
+    Adds up the whole board from scratch: the values and tables are compiled into flat
+    per-square tables (see evaluation.py), and the middlegame and endgame scores are blended by the game phase
+    """
+    middlegame_tables, endgame_tables = compiled_tables(values, tables)
+    return tapered_score(*score_bitboards(bitboards, middlegame_tables, endgame_tables))
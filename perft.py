@@ -0,0 +1,203 @@
+"""
+Perft (performance test): counts every leaf of the legal move tree up to a given depth.
+
+The counts for well known positions are published, so comparing against them is the standard
+way of finding bugs in a move generator, and timing them tells us how fast it is.
+Run `python perft.py` to benchmark the standard positions.
+"""
+import argparse
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Sequence
+from boardrep import BoardRep, ValidMoves, SIDES
+from move_encoding import move_to_uci
+import batch_movegen
+
+BATCH_SIZE = 4096 # Leaf positions batched_perft counts at once
+
+# (name, FEN, {depth: expected number of leaves})
+PERFT_POSITIONS = [
+    ("startpos", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     {1: 46, 2: 2079, 3: 89890, 4: 3894594}),
+]
+
+def perft(board_rep: BoardRep, depth: int, colour: str | int, cache: dict[tuple[int, int], int] | None = None) -> int:
+    """
+    Counts the leaves of the legal move tree of the given depth.
+    If a cache dictionary is given, the counts of positions already visited are reused (hashed perft)
+    """
+    validator = ValidMoves(board_rep)
+    return _perft(validator, depth, SIDES[colour], cache)
+
+def _perft(validator: ValidMoves, depth: int, side: int, cache: dict[tuple[int, int], int] | None) -> int:
+    board_rep = validator.board_rep
+    if depth == 0:
+        return 1
+    if depth == 1: # Bulk counting, the leaves themselves don't need to be made
+        return len(validator.generate_all_legal_moves(side))
+
+    if cache is not None:
+        nodes = cache.get((board_rep.zobrist_key, depth))
+        if nodes is not None:
+            return nodes
+
+    move_handler = validator.move_handler
+    nodes = 0
+    for move in validator.generate_all_legal_moves(side):
+        move_handler.make_move(move, side)
+        nodes += _perft(validator, depth - 1, side ^ 1, cache)
+        move_handler.unmake_move()
+
+    if cache is not None:
+        cache[(board_rep.zobrist_key, depth)] = nodes
+    return nodes
+
+def batched_perft(board_rep: BoardRep, depth: int, colour: str | int, batch_size: int = BATCH_SIZE) -> int:
+    """
+    perft that doesn't count the moves of the positions one ply above the leaves one at a time:
+    it collects them and counts them in batches with batch_movegen, only the positions it
+    can't count exactly (check, pins, en passant) go through generate_all_legal_moves
+    """
+    validator = ValidMoves(board_rep)
+    side = SIDES[colour]
+    if depth < 2:
+        return _perft(validator, depth, side, None)
+
+    frontier = [] # (bitboards, side, en passant square, castling rights) of every position left to count
+    nodes = 0
+
+    def flush() -> None:
+        nonlocal nodes
+        if not frontier:
+            return
+        bitboards, sides, en_passant, castling_rights = zip(*frontier)
+        counts, exact = batch_movegen.legal_move_counts(bitboards, sides, en_passant, castling_rights)
+        nodes += int(counts[exact].sum())
+        board = BoardRep()
+        fallback = ValidMoves(board)
+        for i in (~exact).nonzero()[0]:
+            _set_position(board, *frontier[i])
+            nodes += len(fallback.generate_all_legal_moves(frontier[i][1]))
+        frontier.clear()
+
+    def collect(depth: int, side: int) -> None:
+        if depth == 1:
+            frontier.append((board_rep.bitboards[:], side, board_rep.en_passant_square, board_rep.castling_rights))
+            if len(frontier) >= batch_size:
+                flush()
+            return
+        move_handler = validator.move_handler
+        for move in validator.generate_all_legal_moves(side):
+            move_handler.make_move(move, side)
+            collect(depth - 1, side ^ 1)
+            move_handler.unmake_move()
+
+    collect(depth, side)
+    flush()
+    return nodes
+
+def _set_position(board_rep: BoardRep, bitboards: list[int], side: int, en_passant_square: int, castling_rights: int) -> None:
+    """Sets up a position batched_perft collected, enough of it to generate its moves"""
+    board_rep.clear()
+    for piece, bitboard in enumerate(bitboards):
+        while bitboard:
+            square = bitboard & -bitboard
+            board_rep.put_piece(square.bit_length() - 1, piece)
+            bitboard ^= square
+    board_rep.en_passant_square = en_passant_square
+    board_rep.castling_rights = castling_rights
+
+def divide(board_rep: BoardRep, depth: int, colour: str | int, cache: dict[tuple[int, int], int] | None = None) -> dict[str, int]:
+    """Perft split by root move, the number of leaves under every legal move (e.g. {'e2e4': 600, ...})"""
+    validator = ValidMoves(board_rep)
+    side = SIDES[colour]
+    counts = {}
+    for move in validator.generate_all_legal_moves(side):
+        validator.move_handler.make_move(move, side)
+        counts[move_to_uci(move)] = _perft(validator, depth - 1, side ^ 1, cache)
+        validator.move_handler.unmake_move()
+    return counts
+
+def _divide_moves(fen: str, moves: Sequence[int], depth: int, hashed: bool) -> dict[str, int]:
+    """Runs in a worker process: divide restricted to some of the root moves"""
+    board_rep = BoardRep()
+    side = 0 if board_rep.from_fen(fen) == 'w' else 1
+    validator = ValidMoves(board_rep)
+    cache = {} if hashed else None
+    counts = {}
+    for move in moves:
+        validator.move_handler.make_move(move, side)
+        counts[move_to_uci(move)] = _perft(validator, depth - 1, side ^ 1, cache)
+        validator.move_handler.unmake_move()
+    return counts
+
+def parallel_divide(fen: str, depth: int, workers: int | None = None, hashed: bool = False) -> dict[str, int]:
+    """divide, with the root moves dealt out to a pool of processes"""
+    board_rep = BoardRep()
+    colour = "white" if board_rep.from_fen(fen) == 'w' else "black"
+    root_moves = ValidMoves(board_rep).generate_all_legal_moves(colour)
+    workers = workers or multiprocessing.cpu_count()
+
+    # Deal the moves out like cards, so the expensive ones don't all end up in the same process
+    partitions = [root_moves[i::workers] for i in range(workers) if root_moves[i::workers]]
+    counts = {}
+    with ProcessPoolExecutor(max_workers=len(partitions) or 1) as executor:
+        futures = [executor.submit(_divide_moves, fen, partition, depth, hashed) for partition in partitions]
+        for future in futures:
+            counts.update(future.result())
+    return counts
+
+def benchmark(max_depth: int = 4, workers: int = 1, hashed: bool = False, batched: bool = False) -> list[tuple[str, int, int, float]]:
+    """Runs perft on the standard positions and prints nodes, time and nodes per second for each"""
+    results = []
+    for name, fen, expected in PERFT_POSITIONS:
+        for depth in sorted(expected):
+            if depth > max_depth:
+                break
+            start = time.perf_counter()
+            if workers > 1:
+                nodes = sum(parallel_divide(fen, depth, workers, hashed).values())
+            else:
+                board_rep = BoardRep()
+                colour = "white" if board_rep.from_fen(fen) == 'w' else "black"
+                if batched:
+                    nodes = batched_perft(board_rep, depth, colour)
+                else:
+                    nodes = perft(board_rep, depth, colour, {} if hashed else None)
+            elapsed = time.perf_counter() - start
+            status = "ok" if nodes == expected[depth] else f"MISMATCH (expected {expected[depth]})"
+            print(f"{name:<10} depth {depth}: {nodes:>9} nodes {elapsed:8.3f}s {nodes / elapsed if elapsed else 0:>10.0f} nps  {status}")
+            results.append((name, depth, nodes, elapsed))
+
+    total_nodes = sum(r[2] for r in results)
+    total_time = sum(r[3] for r in results)
+    print(f"Total: {total_nodes} nodes in {total_time:.3f}s, {total_nodes / total_time if total_time else 0:.0f} nps")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perft move generation benchmark")
+    parser.add_argument("--depth", type=int, default=3, help="maximum depth to run the standard positions to")
+    parser.add_argument("--workers", type=int, default=1, help="processes to split the root moves between")
+    parser.add_argument("--hashed", action="store_true", help="reuse counts of transposed positions")
+    parser.add_argument("--batched", action="store_true", help="count the last ply in NumPy batches (single process)")
+    parser.add_argument("--fen", help="divide this position instead of running the benchmark")
+    args = parser.parse_args()
+
+    if args.fen:
+        counts = parallel_divide(args.fen, args.depth, args.workers, args.hashed)
+        for move, nodes in sorted(counts.items()):
+            print(f"{move}: {nodes}")
+        print(f"Total: {sum(counts.values())}")
+    else:
+        benchmark(args.depth, args.workers, args.hashed, args.batched)
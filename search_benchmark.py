@@ -0,0 +1,103 @@
+"""
+Search benchmark: how long the engine takes to search the standard positions to a fixed depth,
+with 1, 2, 4, ... processes, and how much faster than a single process that is (the speedup).
+Run `python search_benchmark.py` to compare the ways a SearchPool can split the work, and
+`python search_benchmark.py --selective` to compare the techniques of the selective search in one process.
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import time
+import numpy as np
+from boardrep import BoardRep, MoveHandler, ValidMoves
+from perft import PERFT_POSITIONS
+from transposition import TranspositionTable
+from move_ordering import MoveOrderer
+from time_control import SearchControl
+from selective_search import SelectiveSearch
+import munchkin
+
+# Switches of every SelectiveSearch the selective benchmark compares
+SELECTIVE_SETTINGS = {
+    "full width": None,
+    "null move": dict(null_move=True, late_move_reductions=False, futility=False),
+    "LMR": dict(null_move=False, late_move_reductions=True, futility=False),
+    "futility": dict(null_move=False, late_move_reductions=False, futility=True),
+    "all": dict(),
+}
+
+def time_to_depth(pool: munchkin.SearchPool, fen: str, depth: int) -> float:
+    """Seconds the pool takes to finish searching the position to the given depth"""
+    board_rep = BoardRep()
+    colour = "white" if board_rep.from_fen(fen) == 'w' else "black"
+    legal_moves = ValidMoves(board_rep).generate_all_legal_moves(colour)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()): # find_best_move prints every iteration
+        munchkin.find_best_move(board_rep, legal_moves, depth, colour, pool=pool)
+    return time.perf_counter() - start
+
+def benchmark(depth: int = 4, worker_counts: list[int] | None = None, mode: str = munchkin.LAZY_SMP,
+              full_width: bool = False) -> dict[int, float]:
+    """
+    Prints the time to depth of every position and the total speedup for every number of processes.
+    The processes search with the selective search, or with plain alpha-beta if full_width
+    """
+    worker_counts = worker_counts or [1, 2, 4, multiprocessing.cpu_count()]
+    totals = {}
+    for workers in sorted(set(worker_counts)):
+        with munchkin.SearchPool(workers=workers, mode=mode, selective=None if full_width else SelectiveSearch()) as pool:
+            total = 0.0
+            for name, fen, _ in PERFT_POSITIONS:
+                if pool.shared_tt is not None:
+                    pool.shared_tt.clear() # Every position starts from an empty table
+                elapsed = time_to_depth(pool, fen, depth)
+                print(f"{mode} x{workers:<3} {name:<10} depth {depth}: {elapsed:8.3f}s")
+                total += elapsed
+        totals[workers] = total
+
+    baseline = totals[min(totals)]
+    print(f"Cores available: {multiprocessing.cpu_count()}")
+    for workers, total in totals.items():
+        print(f"{workers:>3} processes: {total:8.3f}s, speedup {baseline / total:5.2f}")
+    return totals
+
+def selective_benchmark(depth: int = 5) -> dict[str, tuple[float, int]]:
+    """
+    Searches the standard positions to the depth in this process (iterative deepening, no pool) with every
+    setting in SELECTIVE_SETTINGS, prints the time, nodes and counters of each and returns their (time, nodes)
+    """
+    totals = {}
+    for name, switches in SELECTIVE_SETTINGS.items():
+        selective = SelectiveSearch(**switches) if switches is not None else None
+        total_time, total_nodes = 0.0, 0
+        for _, fen, _ in PERFT_POSITIONS:
+            board_rep = BoardRep()
+            colour = "white" if board_rep.from_fen(fen) == 'w' else "black"
+            move_handler = MoveHandler(board_rep)
+            tt, orderer, control = TranspositionTable(munchkin.TT_SIZE_MB), MoveOrderer(), SearchControl()
+            values, tables = munchkin.PieceValue(), munchkin.PieceTable()
+            start = time.perf_counter()
+            for current_depth in range(1, depth + 1):
+                munchkin.minimax(board_rep, move_handler, -np.inf, np.inf, current_depth, values, tables,
+                                 colour, tt, orderer, 0, control, selective)
+            total_time += time.perf_counter() - start
+            total_nodes += control.nodes
+        totals[name] = (total_time, total_nodes)
+        print(f"{name:<10} depth {depth}: {total_time:8.3f}s {total_nodes:>9} nodes")
+        if selective is not None:
+            print("           " + ", ".join(f"{counter} {count}" for counter, count in selective.stats().items()))
+    return totals
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel search speedup benchmark")
+    parser.add_argument("--depth", type=int, default=4, help="depth every position is searched to")
+    parser.add_argument("--workers", type=int, nargs="+", help="numbers of processes to compare (default 1 2 4 and every core)")
+    parser.add_argument("--mode", choices=munchkin.SEARCH_MODES, default=munchkin.LAZY_SMP, help="how the processes split the work")
+    parser.add_argument("--selective", action="store_true", help="compare the selective search techniques instead, in one process")
+    parser.add_argument("--full-width", action="store_true", help="search every move to the full depth (plain alpha-beta) in the pool")
+    args = parser.parse_args()
+    if args.selective:
+        selective_benchmark(args.depth)
+    else:
+        benchmark(args.depth, args.workers, args.mode, args.full_width)
@@ -0,0 +1,66 @@
+"""
+Selective search: alpha-beta looks at every move to the full depth, but most of them are obviously bad
+and only need to be looked at well enough to see that. minimax can skip or shorten those subtrees with:
+
+1. Null-move pruning: let the opponent move twice in a row (we pass) and search that shallower. If we are
+   still above beta, a real move would be even better, so the position is cut off without searching any.
+   Passing is only safe when a move can't hurt us (zugzwang), which mostly happens in endgames and
+   with only pawns left, so it is not tried there
+2. Late-move reductions (LMR): quiet moves ordered after the first few rarely turn out best, so they are
+   searched a ply or two shallower with a null window. Only a move that beats the window is searched again
+   to the full depth
+3. Futility pruning, close to the leaves: if the static evaluation is so far above beta that no quiet
+   move could lose that much, the position is cut off (reverse futility), and if it is so far below alpha that
+   no quiet move could make that up, the quiet moves that don't give check aren't searched (forward futility)
+
+Each technique can be switched off, and counts how often it kicked in so its effect can be measured
+(see search_benchmark.py --selective).
+"""
+
+NULL_MOVE_MIN_DEPTH = 3 # Null moves are tried this far from the leaves and further
+NULL_MOVE_REDUCTION = 2 # How much shallower than a real move the null move is searched (one more far from the leaves)
+
+LMR_MIN_DEPTH = 3
+LMR_FULL_DEPTH_MOVES = 3 # Moves searched to the full depth before the reductions start
+LMR_DEEP_REDUCTION_MOVES = 8 # Moves after this many are reduced by two plies instead of one
+
+FUTILITY_MARGINS = (0, 200, 500) # By depth, how much a quiet move could change the evaluation at most
+REVERSE_FUTILITY_MARGIN = 120 # Per ply left
+
+class SelectiveSearch:
+    """The switches of the selective search and how often each technique kicked in"""
+    def __init__(self, null_move: bool = True, late_move_reductions: bool = True, futility: bool = True):
+        self.null_move = null_move
+        self.late_move_reductions = late_move_reductions
+        self.futility = futility
+        self.new_search()
+
+    def new_search(self) -> None:
+        """Sets the counters back to 0"""
+        self.null_move_tries = 0
+        self.null_move_cutoffs = 0
+        self.reductions = 0
+        self.re_searches = 0 # Reduced moves that beat the window and had to be searched again
+        self.reverse_futility_cutoffs = 0
+        self.futility_prunes = 0
+
+    @property
+    def null_move_cutoff_rate(self) -> float:
+        """Fraction of the null moves that cut the position off"""
+        return self.null_move_cutoffs / self.null_move_tries if self.null_move_tries else 0.0
+
+    @property
+    def re_search_rate(self) -> float:
+        """Fraction of the reduced moves that had to be searched again, the lower the better the ordering"""
+        return self.re_searches / self.reductions if self.reductions else 0.0
+
+    def stats(self) -> dict[str, float]:
+        """Every counter, for printing"""
+        return {
+            "null_move_tries": self.null_move_tries,
+            "null_move_cutoffs": self.null_move_cutoffs,
+            "reductions": self.reductions,
+            "re_searches": self.re_searches,
+            "reverse_futility_cutoffs": self.reverse_futility_cutoffs,
+            "futility_prunes": self.futility_prunes,
+        }
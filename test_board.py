@@ -1,7 +1,11 @@
 import pytest
-from boardrep import BoardRep, ValidMoves, MoveHandler
+from boardrep import BoardRep, ValidMoves, MoveHandler, QUEEN, KNIGHT
 import munchkin
 import conversions
+import move_encoding
+import evaluation
+import attack_tables
+import magic_stuff
 
 @pytest.mark.parametrize("square, blocked, colour, expected_moves", [
     ("e2", False, "white", ("e3", "e4")), 
@@ -396,3 +400,375 @@ def test_rook_attacks(square,eat,blocked_squares,colour,expected_squares):
     actual_moves = validator.rook_attacks(board["rook"], colour)
     assert actual_moves==expected_moves
 
+
+@pytest.mark.parametrize("fen", [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 1",
+])
+def test_zobrist_key_is_updated_incrementally(fen):
+    board_rep = BoardRep()
+    colour = "white" if board_rep.from_fen(fen) == 'w' else "black"
+    move_handler = MoveHandler(board_rep)
+    validator = ValidMoves(board_rep)
+    opponent_colour = "black" if colour == "white" else "white"
+    key_before = board_rep.zobrist_key
+
+    for move in validator.generate_all_legal_moves(colour):
+        move_handler.make_move(move, colour)
+        assert board_rep.zobrist_key == board_rep.compute_zobrist_key(opponent_colour)
+        move_handler.unmake_move()
+        assert board_rep.zobrist_key == key_before
+
+@pytest.mark.parametrize("fen", [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R b Kq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+])
+def test_mailbox_and_occupancy_match_bitboards(fen):
+    board_rep = BoardRep()
+    colour = "white" if board_rep.from_fen(fen) == 'w' else "black"
+    assert board_rep.to_fen(colour) == fen
+
+    move_handler = MoveHandler(board_rep)
+    validator = ValidMoves(board_rep)
+    for move in validator.generate_all_legal_moves(colour):
+        move_handler.make_move(move, colour)
+        for square_index, piece in enumerate(board_rep.mailbox):
+            for other_piece, bitboard in enumerate(board_rep.bitboards):
+                assert bool(bitboard & (1 << square_index)) == (piece == other_piece)
+        assert board_rep.occupancy == [sum(board_rep.bitboards[:6]), sum(board_rep.bitboards[6:])]
+        assert board_rep.occupied == sum(board_rep.bitboards)
+        move_handler.unmake_move()
+    assert board_rep.to_fen(colour) == fen
+    assert board_rep.occupied == sum(board_rep.bitboards)
+
+def test_piece_name_adapter():
+    board_rep = BoardRep()
+    board_rep.initial_position()
+    move_handler = MoveHandler(board_rep)
+
+    assert board_rep.bitboard_white["king"] == conversions.algebraic_to_bitboard("e1")
+    assert board_rep.bitboard_black["queen"] == conversions.algebraic_to_bitboard("d8")
+
+    move_handler.set_bit(conversions.algebraic_to_bitboard("e4"), "knight", "black")
+    move_handler.unset_bit(conversions.algebraic_to_bitboard("e2"), "pawn", "white")
+    assert board_rep.bitboard_black["knight"] & conversions.algebraic_to_bitboard("e4")
+    assert not board_rep.bitboard_white["pawn"] & conversions.algebraic_to_bitboard("e2")
+    assert board_rep.zobrist_key == board_rep.compute_zobrist_key("white")
+    with pytest.raises(ValueError):
+        move_handler.set_bit(1, "pawn", "green")
+
+def board_state(board_rep):
+    return (list(board_rep.bitboards), list(board_rep.mailbox), list(board_rep.occupancy), board_rep.occupied,
+            board_rep.castling_rights, board_rep.en_passant_square, board_rep.zobrist_key,
+            board_rep.middlegame_score, board_rep.endgame_score, board_rep.phase)
+
+@pytest.mark.parametrize("fen", [
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 b kq - 0 1", # Promotions with and without captures
+    "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 1", # En passant
+])
+def test_unmake_move_restores_the_board(fen):
+    board_rep = BoardRep()
+    colour = "white" if board_rep.from_fen(fen) == 'w' else "black"
+    opponent_colour = "black" if colour == "white" else "white"
+    move_handler = MoveHandler(board_rep)
+    validator = ValidMoves(board_rep)
+    state_before = board_state(board_rep)
+
+    for move in validator.generate_pseudo_legal_moves(colour):
+        move_handler.make_move(move, colour)
+        state_after_move = board_state(board_rep)
+        for reply in validator.generate_pseudo_legal_moves(opponent_colour):
+            move_handler.make_move(reply, opponent_colour)
+            move_handler.unmake_move()
+            assert board_state(board_rep) == state_after_move
+        move_handler.unmake_move()
+        assert board_state(board_rep) == state_before
+    assert board_rep.ply == 0
+
+def test_null_move():
+    board_rep = BoardRep()
+    board_rep.from_fen("rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 1")
+    move_handler = MoveHandler(board_rep)
+    state_before = board_state(board_rep)
+
+    move_handler.make_null_move()
+    assert board_rep.en_passant_square == 0
+    assert board_rep.zobrist_key == board_rep.compute_zobrist_key("black")
+    move_handler.unmake_move()
+    assert board_state(board_rep) == state_before
+    assert board_rep.ply == 0
+
+def test_move_encoding_flags():
+    board_rep = BoardRep()
+    board_rep.from_fen("r3k2r/1P6/8/3pP3/8/8/8/R3K2R w KQkq d6 0 1")
+    legal_moves = ValidMoves(board_rep).generate_all_legal_moves("white")
+    uci_moves = {move_encoding.move_to_uci(move): move for move in legal_moves}
+
+    assert {"b7b8q", "b7b8r", "b7b8b", "b7b8n", "b7a8q", "b7a8n"} <= set(uci_moves)
+    assert move_encoding.is_promotion(uci_moves["b7b8n"]) and not move_encoding.is_capture(uci_moves["b7b8n"])
+    assert move_encoding.is_capture(uci_moves["b7a8q"]) and move_encoding.promotion_piece(uci_moves["b7a8q"]) == QUEEN
+    assert move_encoding.move_flags(uci_moves["e5d6"]) == move_encoding.EN_PASSANT
+    assert move_encoding.move_flags(uci_moves["e1g1"]) == move_encoding.KING_CASTLE
+    assert move_encoding.move_flags(uci_moves["e1c1"]) == move_encoding.QUEEN_CASTLE
+    assert move_encoding.uci_to_move("b7b8", legal_moves) == uci_moves["b7b8q"] # Queen unless told otherwise
+    assert move_encoding.uci_to_move("e1e3", legal_moves) is None
+
+@pytest.mark.parametrize("fen", [
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+    "rnbqkbnr/pp1p1ppp/8/2pPp3/8/8/PPP1PPPP/RNBQKBNR w KQkq e6 0 3",
+    "4k3/8/8/8/3Pp3/8/1p6/R3K3 b Q d3 0 1",
+])
+def test_generate_captures_matches_pseudo_legal_moves(fen):
+    board_rep = BoardRep()
+    board_rep.from_fen(fen)
+    validator = ValidMoves(board_rep)
+    for colour in ("white", "black"):
+        expected = [move for move in validator.generate_pseudo_legal_moves(colour)
+                    if move_encoding.is_capture(move) or move_encoding.is_promotion(move)]
+        assert sorted(validator.generate_captures(colour)) == sorted(expected)
+
+@pytest.mark.parametrize("fen", [
+    "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 1",
+])
+def test_incremental_evaluation_matches_full_evaluation(fen):
+    board_rep = BoardRep()
+    board_rep.from_fen(fen)
+    validator = ValidMoves(board_rep)
+    values, tables = munchkin.PieceValue(), munchkin.PieceTable()
+    colour = "white"
+    opponent_colour = "black"
+
+    for move in validator.generate_pseudo_legal_moves(colour): # Captures, promotions, castling and en passant included
+        validator.move_handler.make_move(move, colour)
+        for reply in validator.generate_pseudo_legal_moves(opponent_colour):
+            validator.move_handler.make_move(reply, opponent_colour)
+            assert board_rep.static_evaluation() == munchkin.evaluate_board(board_rep.bitboards, values, tables)
+            validator.move_handler.unmake_move()
+        validator.move_handler.unmake_move()
+
+def test_game_phase():
+    board_rep = BoardRep()
+    board_rep.initial_position()
+    assert board_rep.phase == 24
+    assert board_rep.static_evaluation() == 0
+
+    board_rep.from_fen("4k3/pppp4/8/8/8/8/4PPPP/4K3 w - - 0 1") # Kings and pawns only: the endgame tables alone
+    assert board_rep.phase == 0
+    assert board_rep.static_evaluation() == board_rep.endgame_score
+
+def test_tables_are_rebuilt_when_they_change():
+    board_rep = BoardRep()
+    board_rep.from_fen("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    values, tables = munchkin.PieceValue(), munchkin.PieceTable()
+    tables.knight = tables.knight.copy() # Instance copies, the class attributes are shared
+    before = munchkin.evaluate_board(board_rep.bitboards, values, tables)
+
+    tables.knight[3][4] += 50 # Tuned in place: the white knight on e5 is worth more
+    values.pawn = 120
+    tuned = munchkin.evaluate_board(board_rep.bitboards, values, tables)
+    assert tuned != before
+    try:
+        evaluation.set_tables(values, tables)
+        board_rep.refresh_evaluation()
+        assert board_rep.static_evaluation() == tuned
+        assert evaluation.MIDDLEGAME_TABLES[KNIGHT][36] == 320 + 20 + 50 # e5, value included
+    finally:
+        evaluation.set_tables(munchkin.PieceValue(), munchkin.PieceTable())
+    board_rep.refresh_evaluation()
+    assert board_rep.static_evaluation() == before
+
+def test_evaluate_batch_matches_evaluate_board():
+    fens = [
+        "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+        "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+        "QQQQkQQQ/8/8/8/8/8/8/qqqqKqqq w - - 0 1", # Phase way past the start
+        "4k3/8/8/8/8/8/8/4K3 w - - 0 1",
+    ]
+    boards = []
+    for fen in fens:
+        board_rep = BoardRep()
+        board_rep.from_fen(fen)
+        boards.append(board_rep)
+    bitboards = evaluation.bitboard_array(boards * 100) # Not a multiple of the batch size
+    values, tables = munchkin.PieceValue(), munchkin.PieceTable()
+    expected = [munchkin.evaluate_board(board_rep.bitboards, values, tables) for board_rep in boards] * 100
+
+    assert evaluation.evaluate_batch(bitboards).tolist() == expected
+
+    values.knight = 300
+    expected = [munchkin.evaluate_board(board_rep.bitboards, values, tables) for board_rep in boards]
+    assert evaluation.evaluate_batch(bitboards[:len(boards)], values, tables).tolist() == expected
+    assert len(evaluation.evaluate_batch(bitboards[:0])) == 0
+
+def test_attack_table_file_round_trip(tmp_path):
+    path = str(tmp_path / "tables.bin")
+    tables = {name: list(getattr(attack_tables, name)) for name in attack_tables.TABLE_NAMES}
+    attack_tables.write_tables(tables, path)
+
+    loaded = attack_tables.read_tables(path)
+    assert {name: list(loaded[name]) for name in attack_tables.TABLE_NAMES} == tables
+    assert loaded["PAWN_ATTACKS"] == (tables["WHITE_PAWN_ATTACKS"], tables["BLACK_PAWN_ATTACKS"])
+    assert isinstance(loaded["ROOK_MAGICS"], list) # Small tables are plain lists, the big ones stay mapped
+
+def test_attack_table_file_is_rebuilt_when_corrupted(tmp_path):
+    path = tmp_path / "tables.bin"
+    with pytest.raises(attack_tables.AttackTableError):
+        attack_tables.read_tables(str(path))
+
+    rook_attacks = list(attack_tables.ROOK_ATTACKS)
+    attack_tables.write_tables({name: list(getattr(attack_tables, name)) for name in attack_tables.TABLE_NAMES}, str(path))
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 1 # Flip a bit of the last bishop attack set
+    path.write_bytes(bytes(data))
+    with pytest.raises(attack_tables.AttackTableError, match="checksum"):
+        attack_tables.read_tables(str(path))
+
+    tables = attack_tables.load_tables(str(path)) # Rebuilt from the magics in constants.py and written back
+    assert list(tables["ROOK_ATTACKS"]) == rook_attacks
+    assert list(attack_tables.read_tables(str(path))["BISHOP_ATTACKS"]) == list(attack_tables.BISHOP_ATTACKS)
+
+def test_pack_tables_overlaps_unused_slots():
+    square_tables = [[5, 6, 0, 0], [0, 0, 7, 8], [8, 0, 9]]
+    offsets, packed = attack_tables.pack_tables(square_tables)
+
+    assert offsets == [0, 0, 3] # The second table fits in the gaps of the first, the third starts on the same 8
+    assert packed == [5, 6, 7, 8, 0, 9]
+    for offset, table in zip(offsets, square_tables):
+        assert all(packed[offset + i] == entry for i, entry in enumerate(table) if entry)
+
+def test_magic_search_is_seeded():
+    square = 27 # d4, a bishop square with a small table
+    magic, shift = magic_stuff._search_square(1, square, True, 0)
+    assert (magic, shift) == magic_stuff._search_square(1, square, True, 0)
+
+    mask = magic_stuff.generate_bishop_mask_magic(square)
+    tables = attack_tables.build_tables(bishop_magics=[magic] * 64, bishop_shifts=[shift] * 64) # Only d4 is looked at
+    offset = tables["BISHOP_ATTACK_OFFSETS"][square]
+    for occupancy in (0, mask, mask & 0x0000240000240000):
+        index = ((occupancy * magic) & 0xFFFFFFFFFFFFFFFF) >> shift
+        assert tables["BISHOP_ATTACKS"][offset + index] == magic_stuff.generate_bishop_attacks_for_table(square, occupancy)
+
+def test_step_attack_tables():
+    # Number of (square, target) pairs on an empty board, the usual check of these tables
+    assert sum(bin(attacks).count("1") for attacks in attack_tables.KNIGHT_ATTACKS) == 336
+    assert sum(bin(attacks).count("1") for attacks in attack_tables.KING_ATTACKS) == 420
+    white_pawns, black_pawns = attack_tables.PAWN_ATTACKS
+    assert sum(bin(attacks).count("1") for attacks in white_pawns) == sum(bin(attacks).count("1") for attacks in black_pawns) == 98
+    assert white_pawns[conversions.algebraic_to_bitboard("a2").bit_length() - 1] == conversions.algebraic_to_bitboard("b3")
+    assert black_pawns[conversions.algebraic_to_bitboard("e5").bit_length() - 1] == (conversions.algebraic_to_bitboard("d4") |
+                                                                                    conversions.algebraic_to_bitboard("f4"))
+    assert white_pawns[63] == 0 # Nothing in front of the last rank
+
+def test_between_and_line_tables():
+    square = lambda name: conversions.algebraic_to_bitboard(name).bit_length() - 1
+    between = lambda a, b: attack_tables.BETWEEN[64 * square(a) + square(b)]
+    line = lambda a, b: attack_tables.LINE[64 * square(a) + square(b)]
+
+    assert between("a1", "d4") == conversions.algebraic_to_bitboard("b2") | conversions.algebraic_to_bitboard("c3")
+    assert between("e1", "e2") == 0 # Next to each other
+    assert between("a1", "b3") == line("a1", "b3") == 0 # Not on a line
+    assert line("c3", "d4") == line("h8", "a1") == 0x8040201008040201
+    assert line("e1", "e5") == 0x1010101010101010
+
+@pytest.mark.parametrize("fen", [
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+    "8/8/8/2k5/3Pp3/8/8/4K2Q b - d3 0 1", # En passant that would leave the king in check along the rank... and a pin
+    "4k3/8/8/1B6/8/8/8/4K3 b - - 0 1", # Only king moves get out of check
+    "3rk3/8/8/8/8/8/3N4/3K3b w - - 0 1", # Double check
+])
+def test_legal_moves_match_make_and_test(fen):
+    board_rep = BoardRep()
+    side = 0 if board_rep.from_fen(fen) == 'w' else 1
+    validator = ValidMoves(board_rep)
+    expected = []
+    for move in validator.generate_pseudo_legal_moves(side):
+        validator.move_handler.make_move(move, side)
+        if not validator.is_square_attacked(board_rep.bitboards[side * 6 + 5], side):
+            expected.append(move)
+        validator.move_handler.unmake_move()
+
+    assert list(validator.generate_all_legal_moves(side)) == expected
+    assert validator.has_legal_move(side) == bool(expected)
+
+@pytest.mark.parametrize("fen, has_move", [
+    ("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1", False), # Stalemate
+    ("6rk/6pp/8/8/8/8/8/K6R w - - 0 1", True),
+    ("R5k1/5ppp/8/8/8/8/8/6K1 b - - 0 1", False), # Back rank mate
+    ("R5k1/5ppp/8/8/8/8/8/1r4K1 b - - 0 1", True), # The rook can block
+    ("8/8/8/8/8/5k2/4p3/5K2 w - - 0 1", True), # The king takes the pawn
+])
+def test_has_legal_move(fen, has_move):
+    board_rep = BoardRep()
+    colour = "white" if board_rep.from_fen(fen) == 'w' else "black"
+    assert ValidMoves(board_rep).has_legal_move(colour) == has_move
+
+@pytest.mark.parametrize("fen", [
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+])
+def test_attackers_to_and_all_attacks(fen):
+    board_rep = BoardRep()
+    board_rep.from_fen(fen)
+    validator = ValidMoves(board_rep)
+    for square_index in range(64):
+        attackers = validator.attackers_to(square_index)
+        for side in (0, 1):
+            attacked = validator.is_square_attacked(1 << square_index, side ^ 1)
+            assert bool(attackers & board_rep.occupancy[side]) == attacked
+            assert bool(validator.all_attacks(side) >> square_index & 1) == attacked
+
+def test_attackers_to_x_rays():
+    board_rep = BoardRep()
+    board_rep.from_fen("3r2k1/3r4/8/8/3p4/2P5/3Q4/K7 w - - 0 1")
+    validator = ValidMoves(board_rep)
+    square = lambda name: conversions.algebraic_to_bitboard(name)
+    d4 = square("d4").bit_length() - 1
+    assert validator.attackers_to(d4) == square("c3") | square("d2") | square("d7")
+    # Without the rook on d7 the one on d8 behind it attacks d4
+    occupied = board_rep.occupied ^ square("d7")
+    assert validator.attackers_to(d4, occupied) == square("c3") | square("d2") | square("d8")
+
+@pytest.mark.parametrize("fen, expected", [
+    ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", (True, True)),
+    ("r3k2r/8/8/8/8/8/8/R3K2R w - - 0 1", (False, False)),
+    ("r3k2r/8/8/8/8/8/8/R3K2R b Qk - 0 1", (True, False)), # Black's rights
+    ("r3k2r/8/8/8/8/8/6r1/R3K2R w KQkq - 0 1", (False, True)), # The rook on g2 attacks g1
+    ("r3k2r/8/8/8/8/7b/8/R3K2R w KQkq - 0 1", (False, True)), # The bishop on h3 attacks f1
+    ("r3k2r/8/8/8/8/8/8/R3K1rR w KQkq - 0 1", (False, False)), # In check from g1
+    ("r3k2r/8/8/8/8/8/8/R3Kn1R w KQkq - 0 1", (False, True)), # A knight on f1 is in the way
+    ("r3k2r/8/8/8/8/3n4/8/R3K2R w KQkq - 0 1", (False, False)), # In check from d3
+    ("r3k2r/8/8/8/8/8/8/RN2K2R w KQkq - 0 1", (True, False)), # b1 in the way
+    ("r3k2r/8/8/8/8/8/1r6/R3K2R w KQkq - 0 1", (True, True)), # Only b1 attacked, the king doesn't cross it
+])
+def test_can_castle(fen, expected):
+    board_rep = BoardRep()
+    colour = "white" if board_rep.from_fen(fen) == 'w' else "black"
+    assert ValidMoves(board_rep).can_castle(colour) == expected
+
+@pytest.mark.parametrize("fen, source, target, flags, expected", [
+    ("1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1", "e1", "e5", move_encoding.CAPTURE, 100), # Undefended pawn
+    ("1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1", "d3", "e5", move_encoding.CAPTURE, 100 - 320), # NxP, NxN, BxN, RxB, QxR... x-rays
+    ("k7/8/2p5/3p4/8/8/8/K2Q4 w - - 0 1", "d1", "d5", move_encoding.CAPTURE, 100 - 900), # Defended by a pawn
+    ("k2r4/8/8/3p4/8/8/3R4/K2Q4 w - - 0 1", "d2", "d5", move_encoding.CAPTURE, 100), # The queen behind the rook recaptures
+    ("k7/8/8/3p4/4K3/8/8/8 w - - 0 1", "e4", "d5", move_encoding.CAPTURE, 100),
+    ("8/8/2k5/3p4/8/8/3Q4/K7 w - - 0 1", "d2", "d5", move_encoding.CAPTURE, 100 - 900), # The king takes back
+    ("8/8/2k5/3p4/8/8/3Q4/K2R4 w - - 0 1", "d2", "d5", move_encoding.CAPTURE, 100), # It can't, the rook x-rays d5
+    ("k7/8/8/3pP3/8/8/8/K7 w - d6 0 6", "e5", "d6", move_encoding.EN_PASSANT, 100),
+    ("k7/8/8/8/8/3p4/8/K2R4 w - - 0 1", "d1", "d2", move_encoding.QUIET, 0), # A quiet move to a safe square
+    ("k7/8/8/8/8/4p3/8/K2R4 w - - 0 1", "d1", "d2", move_encoding.QUIET, -500), # ... and to one a pawn attacks
+])
+def test_static_exchange_evaluation(fen, source, target, flags, expected):
+    board_rep = BoardRep()
+    board_rep.from_fen(fen)
+    square = lambda name: conversions.algebraic_to_bitboard(name).bit_length() - 1
+    move = move_encoding.encode_move(square(source), square(target), flags)
+    assert ValidMoves(board_rep).see(move) == expected
@@ -0,0 +1,70 @@
+import random
+import numpy as np
+import pytest
+from boardrep import BoardRep, ValidMoves
+import batch_movegen
+import perft
+
+@pytest.mark.parametrize("name, fen, depth, expected_nodes", [
+    (name, fen, depth, nodes)
+    for name, fen, expected in perft.PERFT_POSITIONS
+    for depth, nodes in expected.items()
+    if nodes < 10_000 # Keep the test suite quick, `python perft.py` runs the deeper ones
+])
+def test_perft(name, fen, depth, expected_nodes):
+    board_rep = BoardRep()
+    colour = "white" if board_rep.from_fen(fen) == 'w' else "black"
+    assert perft.perft(board_rep, depth, colour) == expected_nodes
+    assert board_rep.to_fen(colour).split(' ')[:4] == fen.split(' ')[:4] # The board is left as it was
+
+def test_divide_and_hashed_perft_agree():
+    board_rep = BoardRep()
+    board_rep.initial_position()
+    counts = perft.divide(board_rep, 3, "white")
+
+    assert len(counts) == 20
+    assert counts["e2e4"] == 600
+    assert sum(counts.values()) == perft.perft(board_rep, 3, "white", cache={}) == 8902
+
+def _random_positions(plies=40, games_per_position=3):
+    """Positions from random games played from the standard positions, with the moves generated for them"""
+    random.seed(16)
+    positions = []
+    for _, fen, _ in perft.PERFT_POSITIONS:
+        for _ in range(games_per_position):
+            board_rep = BoardRep()
+            side = 0 if board_rep.from_fen(fen) == 'w' else 1
+            validator = ValidMoves(board_rep)
+            for _ in range(plies):
+                legal_moves = validator.generate_all_legal_moves(side)
+                positions.append((board_rep.bitboards[:], side, board_rep.en_passant_square, board_rep.castling_rights,
+                                  validator.generate_pseudo_legal_moves(side), len(legal_moves), board_rep.mailbox[:]))
+                if not legal_moves:
+                    break
+                validator.move_handler.make_move(random.choice(legal_moves), side)
+                side ^= 1
+    return positions
+
+def test_batch_generator_matches_move_generator():
+    positions = _random_positions()
+    bitboards, sides, en_passant, castling_rights, moves, legal_counts, mailboxes = zip(*positions)
+    counts, targets = batch_movegen.generate_batch(np.array(bitboards, dtype=np.uint64), sides, en_passant, castling_rights)
+
+    assert any(sides) and any(en_passant) and any(castling_rights)
+    for i, position_moves in enumerate(moves):
+        expected_targets = [0] * 6
+        for move in position_moves:
+            expected_targets[mailboxes[i][move & 63] % 6] |= 1 << ((move >> 6) & 63)
+        assert counts[i] == len(position_moves)
+        assert targets[i].tolist() == expected_targets
+
+    legal, exact = batch_movegen.legal_move_counts(np.array(bitboards, dtype=np.uint64), sides, en_passant, castling_rights)
+    assert exact.any() and not exact.all()
+    assert (legal[exact] == np.array(legal_counts)[exact]).all()
+
+def test_batched_perft():
+    for name, fen, expected in perft.PERFT_POSITIONS:
+        board_rep = BoardRep()
+        colour = "white" if board_rep.from_fen(fen) == 'w' else "black"
+        assert perft.batched_perft(board_rep, 2, colour, batch_size=64) == expected[2]
+        assert board_rep.to_fen(colour).split(' ')[:4] == fen.split(' ')[:4]
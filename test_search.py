@@ -0,0 +1,404 @@
+import multiprocessing
+import time
+import pytest
+import numpy as np
+from boardrep import BoardRep, MoveHandler, ValidMoves
+import munchkin
+from transposition import TranspositionTable, SharedTranspositionTable, EXACT, LOWER, UPPER
+from move_encoding import encode_move, move_to_uci, DOUBLE_PAWN_PUSH, CAPTURE, QUIET
+from move_ordering import MoveOrderer
+from selective_search import SelectiveSearch
+from time_control import SearchControl
+
+def test_transposition_table_store_and_probe():
+    tt = TranspositionTable(size_mb=1)
+    move = encode_move(12, 28, DOUBLE_PAWN_PUSH) # e2e4
+    tt.store(0xDEADBEEF, 4, LOWER, -350, move)
+
+    assert tt.probe(0xDEADBEEF) == (4, LOWER, -350, move)
+    assert tt.probe(0xDEADBEEF + tt.size) is None # Same slot, different position
+
+def test_transposition_table_replacement():
+    tt = TranspositionTable(size_mb=1)
+    tt.store(1, 6, EXACT, 10)
+    tt.store(1 + tt.size, 2, EXACT, 20) # Shallower search of another position in the same slot
+    assert tt.probe(1) == (6, EXACT, 10, 0)
+
+    tt.new_search() # Entries from older searches are always replaced
+    tt.store(1 + tt.size, 2, UPPER, 20)
+    assert tt.probe(1) is None
+    assert tt.probe(1 + tt.size) == (2, UPPER, 20, 0)
+
+@pytest.mark.parametrize("fen, depth", [
+    ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", 2),
+    ("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1", 3),
+])
+def test_minimax_with_transposition_table_agrees(fen, depth):
+    board_rep = BoardRep()
+    board_rep.from_fen(fen)
+    move_handler = MoveHandler(board_rep)
+    values, tables = munchkin.PieceValue(), munchkin.PieceTable()
+
+    without_tt = munchkin.minimax(board_rep, move_handler, -np.inf, np.inf, depth, values, tables, "white")
+    with_tt = munchkin.minimax(board_rep, move_handler, -np.inf, np.inf, depth, values, tables, "white", TranspositionTable(1))
+    assert with_tt == without_tt
+
+def test_move_ordering():
+    board_rep = BoardRep()
+    board_rep.from_fen("4k3/8/3r4/2P1q3/8/5N2/8/4K1Q1 w - - 0 1")
+    hash_move = encode_move(6, 14) # g1g2
+    pxr = encode_move(34, 43, CAPTURE) # c5d6
+    nxq = encode_move(21, 36, CAPTURE) # f3e5
+    qxq = encode_move(6, 36, CAPTURE) # g1e5
+    killer = encode_move(4, 3) # e1d1
+    quiet = encode_move(4, 5) # e1f1
+    orderer = MoveOrderer()
+    orderer.record_cutoff(killer, 0, 0, 3, 0)
+
+    ordered = orderer.order_moves(board_rep, [quiet, killer, qxq, pxr, hash_move, nxq], 0, 0, hash_move)
+    assert ordered == [hash_move, nxq, qxq, pxr, killer, quiet]
+
+def test_losing_captures_are_ordered_last():
+    board_rep = BoardRep()
+    board_rep.from_fen("k7/8/2p5/3p4/8/8/3n4/K2Q4 w - - 0 1")
+    qxd5 = encode_move(3, 35, CAPTURE) # Loses the queen to cxd5
+    qxd2 = encode_move(3, 11, CAPTURE)
+    quiet = encode_move(3, 4) # d1e1
+    assert MoveOrderer().order_moves(board_rep, [qxd5, quiet, qxd2], 0, 0) == [qxd2, quiet, qxd5]
+
+def test_history_and_cutoff_statistics():
+    board_rep = BoardRep()
+    board_rep.initial_position()
+    g1f3, b1c3 = encode_move(6, 21), encode_move(1, 18)
+    orderer = MoveOrderer()
+    orderer.record_cutoff(b1c3, 0, 5, 4, 0) # History is shared between plies, killers are not
+    orderer.record_cutoff(g1f3, 0, 5, 2, 3)
+    assert orderer.fail_high_first_rate == 0.5
+    assert orderer.order_moves(board_rep, [g1f3, b1c3], 0, 1) == [b1c3, g1f3]
+
+    orderer.new_search()
+    assert orderer.fail_highs == 0
+    assert orderer.killers[5] == [0, 0]
+    assert orderer.history[0][b1c3 & 0xFFF] == 8 # Halved, not forgotten
+
+@pytest.mark.parametrize("fen, depth", [
+    ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", 2),
+    ("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1", 3),
+])
+def test_minimax_with_move_ordering_agrees(fen, depth):
+    board_rep = BoardRep()
+    board_rep.from_fen(fen)
+    move_handler = MoveHandler(board_rep)
+    values, tables = munchkin.PieceValue(), munchkin.PieceTable()
+    orderer = MoveOrderer()
+
+    plain = munchkin.minimax(board_rep, move_handler, -np.inf, np.inf, depth, values, tables, "white")
+    ordered = munchkin.minimax(board_rep, move_handler, -np.inf, np.inf, depth, values, tables, "white", TranspositionTable(1), orderer)
+    assert ordered == plain
+    assert orderer.fail_highs > 0
+
+@pytest.mark.parametrize("fen, colour, depth", [
+    ("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1", "white", 3), # Back rank mate
+    ("r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 0 1", "white", 3), # Scholar's mate
+    ("6k1/5ppp/8/8/8/8/r4PPP/6K1 b - - 0 1", "black", 3), # The same for black
+])
+def test_selective_search_finds_mates(fen, colour, depth):
+    board_rep = BoardRep()
+    board_rep.from_fen(fen)
+    move_handler = MoveHandler(board_rep)
+    values, tables = munchkin.PieceValue(), munchkin.PieceTable()
+    selective = SelectiveSearch()
+
+    full_width = munchkin.minimax(board_rep, move_handler, -np.inf, np.inf, depth, values, tables, colour)
+    selective_score = munchkin.minimax(board_rep, move_handler, -np.inf, np.inf, depth, values, tables, colour,
+                                       TranspositionTable(1), MoveOrderer(), 0, None, selective)
+    assert selective_score == full_width
+    assert abs(full_width) > values.king - depth
+    assert board_rep.ply == 0
+
+def test_mate_scores_count_plies_from_the_root():
+    fen = "6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1"
+    board_rep = BoardRep()
+    board_rep.from_fen(fen)
+    legal_moves = list(ValidMoves(board_rep).generate_all_legal_moves("white"))
+    # The mate is found again through the transposition table at every depth, it is still one ply away
+    for score, move, _ in munchkin.score_move(fen, legal_moves, 5, "white", selective=SelectiveSearch())[1:]:
+        assert score == munchkin.PieceValue.king - 1
+    assert munchkin._score_from_tt(munchkin._score_to_tt(-munchkin.PieceValue.king + 7, 3), 5) == -munchkin.PieceValue.king + 9
+    assert munchkin._score_to_tt(120, 3) == 120
+
+def test_selective_search_switches():
+    board_rep = BoardRep()
+    board_rep.from_fen("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    move_handler = MoveHandler(board_rep)
+    values, tables = munchkin.PieceValue(), munchkin.PieceTable()
+
+    switched_off = SelectiveSearch(null_move=False, late_move_reductions=False, futility=False)
+    plain = munchkin.minimax(board_rep, move_handler, -np.inf, np.inf, 3, values, tables, "white")
+    assert munchkin.minimax(board_rep, move_handler, -np.inf, np.inf, 3, values, tables, "white", None, None, 0, None, switched_off) == plain
+    assert not any(switched_off.stats().values())
+
+    selective = SelectiveSearch()
+    for depth in range(1, 5):
+        munchkin.minimax(board_rep, move_handler, -np.inf, np.inf, depth, values, tables, "white", TranspositionTable(1), MoveOrderer(), 0, None, selective)
+    assert selective.reductions and selective.futility_prunes and selective.null_move_tries
+    assert 0 <= selective.re_search_rate <= 1
+    selective.new_search()
+    assert not any(selective.stats().values())
+
+def test_score_move_selective_search_is_optional():
+    fen = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+    board_rep = BoardRep()
+    board_rep.from_fen(fen)
+    legal_moves = list(ValidMoves(board_rep).generate_all_legal_moves("white"))
+
+    selective = SelectiveSearch()
+    selective.reductions = 1000 # Reset when the search starts
+    assert munchkin.score_move(fen, legal_moves, 4, "white", selective=selective)[-1][1] in legal_moves
+    assert 0 < selective.reductions < 1000 and selective.null_move_tries
+
+    plain = SelectiveSearch(null_move=False, late_move_reductions=False, futility=False)
+    assert munchkin.score_move(fen, legal_moves, 4, "white", selective=plain) == munchkin.score_move(fen, legal_moves, 4, "white")
+    assert not any(plain.stats().values())
+
+def test_pv_table():
+    pv = munchkin.PVTable(max_ply=2)
+    for ply in range(4):
+        pv.clear(ply)
+    pv.update(3, 30)
+    pv.update(2, 20)
+    pv.update(1, 10)
+    pv.clear(2) # A later sibling of the node at ply 1 doesn't change its line
+    pv.update(0, 1)
+    assert pv.principal_variation == [1, 10, 20, 30]
+
+@pytest.mark.parametrize("previous_score", [None, 0, 5000, -5000])
+def test_aspiration_windows_find_the_full_window_score(previous_score):
+    board_rep = BoardRep()
+    board_rep.from_fen("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1")
+    move_handler = MoveHandler(board_rep)
+    values, tables = munchkin.PieceValue(), munchkin.PieceTable()
+    root_moves = list(ValidMoves(board_rep).generate_all_legal_moves("white"))
+
+    full_window = munchkin._search_root(board_rep, move_handler, root_moves, 3, 0, values, tables, None, None, None)
+    pv = munchkin.PVTable()
+    aspiration = munchkin._aspiration_search(board_rep, move_handler, root_moves, 3, 0, values, tables, None, None, None, None, pv, previous_score)
+    assert aspiration[0] == full_window[0]
+    assert pv.principal_variation[0] == aspiration[1]
+    assert board_rep.ply == 0
+
+def test_failed_aspiration_window_leaves_no_principal_variation():
+    board_rep = BoardRep()
+    board_rep.from_fen("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1")
+    move_handler = MoveHandler(board_rep)
+    values, tables = munchkin.PieceValue(), munchkin.PieceTable()
+    root_moves = list(ValidMoves(board_rep).generate_all_legal_moves("white"))
+
+    pv = munchkin.PVTable()
+    score, move = munchkin._search_root(board_rep, move_handler, root_moves, 3, 0, values, tables, None, None, None, None, -np.inf, -1000, pv)
+    assert score >= -1000 # Failed high
+    assert pv.principal_variation == []
+    munchkin._search_root(board_rep, move_handler, root_moves, 3, 0, values, tables, None, None, None, None, pv=pv)
+    assert pv.principal_variation[0] in root_moves
+
+def test_score_move_returns_the_principal_variation():
+    board_rep = BoardRep()
+    fen = "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 0 1"
+    board_rep.from_fen(fen)
+    results = munchkin.score_move(fen, list(ValidMoves(board_rep).generate_all_legal_moves("white")), 4, "white")
+    for score, best_move, principal_variation in results:
+        assert principal_variation[0] == best_move
+    assert move_to_uci(results[-1][1]) == "h5f7" # Mate
+
+    # Every move of the line is legal in the position the one before it leaves
+    board_rep.from_fen("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    fen = board_rep.to_fen("white")
+    score, best_move, principal_variation = munchkin.score_move(fen, list(ValidMoves(board_rep).generate_all_legal_moves("white")), 4, "white")[-1]
+    assert len(principal_variation) > 1
+    move_handler = MoveHandler(board_rep)
+    for ply, move in enumerate(principal_variation):
+        assert move in ValidMoves(board_rep).generate_all_legal_moves(ply % 2)
+        move_handler.make_move(move, ply % 2)
+
+def test_quiescence_resolves_exchanges():
+    board_rep = BoardRep()
+    move_handler = MoveHandler(board_rep)
+    values, tables = munchkin.PieceValue(), munchkin.PieceTable()
+
+    board_rep.from_fen("k7/8/2p5/3p4/8/8/8/K2Q4 w - - 0 1") # Qxd5 loses the queen to cxd5, so white stands pat
+    static = munchkin.evaluate_board(board_rep.bitboards, values, tables)
+    assert munchkin.quiescence(board_rep, move_handler, -np.inf, np.inf, values, tables, "white") == static
+
+    board_rep.from_fen("k7/8/8/3q4/8/8/8/K2Q4 w - - 0 1") # The black queen is hanging
+    static = munchkin.evaluate_board(board_rep.bitboards, values, tables)
+    assert munchkin.quiescence(board_rep, move_handler, -np.inf, np.inf, values, tables, "white") > static + 800
+    assert board_rep.ply == 0
+
+def test_search_pool_is_reused_between_moves():
+    board_rep = BoardRep()
+    board_rep.from_fen("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+    legal_moves = ValidMoves(board_rep).generate_all_legal_moves("white")
+
+    with munchkin.SearchPool(workers=2, tt_size_mb=1) as pool:
+        for _ in range(2):
+            best_move = munchkin.find_best_move(board_rep, legal_moves, 3, "white", pool=pool)
+            assert move_to_uci(best_move) == "a1a8"
+        stats = pool.latency_stats()
+        assert stats["moves"] == 2
+        assert stats["dispatch_max_ms"] >= 0
+    assert pool.stop_event.is_set()
+
+def test_worker_tables_stay_warm(monkeypatch):
+    monkeypatch.setattr(munchkin, "_worker_tables", None)
+    assert munchkin._search_tables(1) != munchkin._search_tables(1) # Outside a pool every search gets new tables
+
+    munchkin.reset_search_state(1)
+    tt, orderer = munchkin._search_tables(1)
+    tt.store(1234, 3, EXACT, 10)
+    tt_again, orderer_again = munchkin._search_tables(1)
+    assert tt_again is tt and orderer_again is orderer
+    assert tt.probe(1234) == (3, EXACT, 10, 0) # Still there, only aged
+    assert tt.age == 2
+
+def test_new_game_clears_the_worker_tables(monkeypatch):
+    monkeypatch.setattr(munchkin, "_worker_tables", None)
+    game = multiprocessing.RawValue('i', 0)
+    munchkin._init_worker(None, 1, game=game)
+    tt, orderer = munchkin._search_tables(1)
+    tt.store(1234, 3, EXACT, 10)
+    orderer.history[0][100] = 64
+    assert munchkin._search_tables(1)[0].probe(1234) is not None
+
+    game.value += 1 # SearchPool.new_game
+    tt_again, orderer_again = munchkin._search_tables(1)
+    assert tt_again is tt and orderer_again is orderer # Cleared in place, not replaced
+    assert tt.probe(1234) is None
+    assert orderer.history[0][100] == 0
+    munchkin.reset_search_state(1)
+
+def test_search_pool_new_game_keeps_the_processes():
+    board_rep = BoardRep()
+    board_rep.from_fen("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+    legal_moves = ValidMoves(board_rep).generate_all_legal_moves("white")
+    with munchkin.SearchPool(workers=2, tt_size_mb=1, mode=munchkin.LAZY_SMP) as pool:
+        pool.search(board_rep.to_fen("white"), legal_moves, 3, "white")
+        processes = set(pool.executor._processes)
+        assert any(pool.shared_tt.data)
+        pool.new_game()
+        assert not any(pool.shared_tt.data)
+        assert move_to_uci(pool.search(board_rep.to_fen("white"), legal_moves, 3, "white")[-1][1]) == "a1a8"
+        assert set(pool.executor._processes) == processes
+
+def test_shared_transposition_table():
+    owner = SharedTranspositionTable(size_mb=1)
+    attached = SharedTranspositionTable(size_mb=1, name=owner.name)
+    try:
+        move = encode_move(12, 28, DOUBLE_PAWN_PUSH)
+        owner.new_search()
+        attached.new_search() # Only the owner ages the table
+        assert attached.age == owner.age == 1
+
+        attached.store(0xDEADBEEF, 4, LOWER, -350, move)
+        assert owner.probe(0xDEADBEEF) == (4, LOWER, -350, move)
+
+        # A torn write (data of another entry next to this key) doesn't pass the XOR check
+        index = 0xDEADBEEF & owner.mask
+        owner.data[index] ^= 1 << 36
+        assert owner.probe(0xDEADBEEF) is None
+    finally:
+        attached.close()
+        owner.close()
+
+def test_lazy_smp_search_pool():
+    board_rep = BoardRep()
+    board_rep.from_fen("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+    legal_moves = ValidMoves(board_rep).generate_all_legal_moves("white")
+
+    with munchkin.SearchPool(workers=2, tt_size_mb=1, mode=munchkin.LAZY_SMP) as pool:
+        best_move = munchkin.find_best_move(board_rep, legal_moves, 3, "white", pool=pool)
+        assert move_to_uci(best_move) == "a1a8"
+        assert any(pool.shared_tt.data) # The processes filled the table the pool owns
+
+    with pytest.raises(ValueError):
+        munchkin.SearchPool(workers=1, mode="every_move_twice")
+
+@pytest.mark.parametrize("mode", munchkin.SEARCH_MODES)
+def test_search_pool_reports_every_iteration(mode):
+    board_rep = BoardRep()
+    board_rep.from_fen("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+    legal_moves = ValidMoves(board_rep).generate_all_legal_moves("white")
+    iterations = []
+    with munchkin.SearchPool(workers=2, tt_size_mb=1, mode=mode) as pool:
+        results = pool.search(board_rep.to_fen("white"), legal_moves, 3, "white", on_iteration=lambda *iteration: iterations.append(iteration))
+    assert [iteration[0] for iteration in iterations] == [1, 2, 3]
+    assert [iteration[1:3] for iteration in iterations] == [result[:2] for result in results]
+    assert 0 < iterations[-1][4] <= pool.nodes # Helpers can still report after the last depth is settled
+
+def test_merge_lazy_smp_threads():
+    main_thread = (1, [(10, 1), (20, 2)])
+    helper = (2, [(25, 3), (30, 4)]) # Started one ply deeper and got further
+    assert munchkin.SearchPool._merge_threads([main_thread, helper]) == [(10, 1), (20, 2), (30, 4)]
+
+def test_lazy_smp_helpers_shuffle_the_root_moves():
+    fen = "6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1"
+    board_rep = BoardRep()
+    board_rep.from_fen(fen)
+    legal_moves = ValidMoves(board_rep).generate_all_legal_moves("white")
+    for thread_id in range(1, 4):
+        _, _, (start_depth, results) = munchkin._smp_search(time.time(), 0, thread_id, fen, legal_moves, 3, "white", 1, None, None, None)
+        assert start_depth == 1 + thread_id % munchkin.LAZY_SMP_DEPTH_SPREAD
+        assert len(results) == 3 - start_depth + 1
+        assert move_to_uci(results[-1][1]) == "a1a8"
+
+def test_ybwc_search_pool():
+    board_rep = BoardRep()
+    board_rep.from_fen("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+    legal_moves = ValidMoves(board_rep).generate_all_legal_moves("white")
+    fen = board_rep.to_fen("white")
+
+    with munchkin.SearchPool(workers=2, tt_size_mb=1, mode=munchkin.YBWC) as pool:
+        best_move = munchkin.find_best_move(board_rep, legal_moves, 4, "white", pool=pool)
+        assert move_to_uci(best_move) == "a1a8"
+        assert pool.latency_stats()["moves"] == 1
+        assert pool.split_points > 1 # The nodes below the root were split too
+
+        # The young brothers of the root and of the other split points far from the leaves are handed out too
+        handed_out = []
+        search_brothers = pool._search_brothers
+        def recording(fen, path, moves, depth, *args):
+            handed_out.append((depth, len(moves)))
+            return search_brothers(fen, path, moves, depth, *args)
+        pool._search_brothers = recording
+        pool.search(fen, legal_moves, 4, "white")
+        assert any(depth - 1 >= munchkin.YBWC_MIN_SPLIT_DEPTH and moves > 1 for depth, moves in handed_out)
+        del pool._search_brothers
+
+        # A move that beats beta cuts the split point off and aborts the searches of its brothers
+        generation = pool.split_point[munchkin.SPLIT_GENERATION]
+        moves = [best_move] + [m for m in legal_moves if m != best_move]
+        score, move = pool._search_brothers(fen, (), moves, 3, munchkin.WHITE, -np.inf, 1000, None, True)
+        assert move == best_move and score >= 1000
+        assert pool.split_point[munchkin.SPLIT_GENERATION] == generation + 2
+        assert pool.split_cutoffs == 1
+
+class NarrowingControl(SearchControl):
+    """Narrows the window of the node at window_ply, like the split point of a YBWC search does"""
+    def __init__(self, window_ply, alpha, beta):
+        super().__init__()
+        self.window_ply = window_ply
+        self.alpha, self.beta = alpha, beta
+
+    def window(self):
+        return self.alpha, self.beta
+
+@pytest.mark.parametrize("alpha, beta", [(-50, 50), (0, 1), (200, 300)])
+def test_minimax_follows_a_live_window(alpha, beta):
+    board_rep = BoardRep()
+    board_rep.from_fen("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    move_handler = MoveHandler(board_rep)
+    values, tables = munchkin.PieceValue(), munchkin.PieceTable()
+    narrow = munchkin.minimax(board_rep, move_handler, alpha, beta, 2, values, tables, "white")
+    # Started with the whole window, narrowed before the first move: the same score as searching with the narrow one
+    live = munchkin.minimax(board_rep, move_handler, -np.inf, np.inf, 2, values, tables, "white",
+                            control=NarrowingControl(0, alpha, beta))
+    assert live == narrow
@@ -0,0 +1,88 @@
+import time
+import pytest
+from boardrep import BoardRep, ValidMoves
+import munchkin
+from time_control import SearchControl, SearchStopped, allocate_time, CHECK_EVERY
+
+class StoppedPool:
+    """A SearchPool that was stopped before it finished any depth"""
+    dispatch_latencies = [0.0]
+
+    def search(self, *args):
+        return []
+
+class FakeEvent:
+    def __init__(self):
+        self.flag = False
+
+    def is_set(self):
+        return self.flag
+
+def test_allocate_time():
+    soft, hard = allocate_time(60, 0)
+    assert 0 < soft < hard <= 60 / 2
+    soft, hard = allocate_time(60, 2, moves_to_go=1) # Last move before the time control, use (almost) all of it
+    assert soft == pytest.approx(60 - 0.05)
+    assert hard == soft
+    assert allocate_time(0.01) == (0.0, 0.0)
+
+def test_search_control_polls_deadline_and_stop_event():
+    control = SearchControl(hard_deadline=time.time() - 1)
+    for _ in range(CHECK_EVERY - 1):
+        control.check() # Only looks at the clock every CHECK_EVERY nodes
+    with pytest.raises(SearchStopped):
+        control.check()
+
+    event = FakeEvent()
+    control = SearchControl(stop_event=event)
+    for _ in range(2 * CHECK_EVERY):
+        control.check()
+    event.flag = True
+    with pytest.raises(SearchStopped):
+        for _ in range(CHECK_EVERY):
+            control.check()
+
+def test_search_control_node_limit():
+    control = SearchControl(node_limit=CHECK_EVERY)
+    for _ in range(CHECK_EVERY - 1):
+        control.check()
+    with pytest.raises(SearchStopped):
+        control.check()
+
+def test_disarmed_search_control_only_counts():
+    control = SearchControl(hard_deadline=time.time() - 1, node_limit=1)
+    control.armed = False
+    for _ in range(2 * CHECK_EVERY):
+        control.check()
+    assert control.nodes == 2 * CHECK_EVERY
+
+def test_iterative_deepening_returns_completed_iterations():
+    fen = "6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1"
+    board_rep = BoardRep()
+    board_rep.from_fen(fen)
+    legal_moves = ValidMoves(board_rep).generate_all_legal_moves("white")
+
+    results = munchkin.score_move(fen, legal_moves, 3, "white")
+    assert len(results) == 3
+    assert results[-1][1] == legal_moves[[munchkin.move_to_uci(m) for m in legal_moves].index("a1a8")]
+
+    # Out of time straight away: depth 1 is still finished, the aborted iterations are thrown away
+    kiwipete = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+    board_rep.from_fen(kiwipete)
+    legal_moves = ValidMoves(board_rep).generate_all_legal_moves("white")
+    results = munchkin.score_move(kiwipete, legal_moves, 10, "white", hard_deadline=time.time())
+    assert 1 <= len(results) < 10
+    assert results[0][1] in legal_moves
+
+def test_find_best_move_with_one_legal_move():
+    board_rep = BoardRep()
+    board_rep.from_fen("1r6/8/8/8/8/2k5/8/K7 w - - 0 1")
+    legal_moves = ValidMoves(board_rep).generate_all_legal_moves("white")
+    assert len(legal_moves) == 1
+    assert munchkin.find_best_move(board_rep, legal_moves, 5, "white", soft_time=0, hard_time=0) == legal_moves[0]
+
+def test_find_best_move_stopped_before_depth_one():
+    board_rep = BoardRep()
+    board_rep.from_fen("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+    legal_moves = ValidMoves(board_rep).generate_all_legal_moves("white")
+    assert munchkin.find_best_move(board_rep, legal_moves, 5, "white", pool=StoppedPool()) in legal_moves
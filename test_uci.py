@@ -0,0 +1,115 @@
+import time
+from boardrep import BoardRep, ValidMoves
+import uci
+
+def make_engine():
+    lines = []
+    return uci.UCIEngine(output=lines.append), lines
+
+def test_handshake_and_options():
+    engine, lines = make_engine()
+    engine.handle("uci")
+    assert lines[0] == "id name Munchkin"
+    assert lines[-1] == "uciok"
+    assert any(line.startswith("option name Hash") for line in lines)
+
+    engine.handle("setoption name Hash value 2")
+    assert engine.hash_mb == 2
+    engine.handle("setoption name Hash value lots")
+    assert lines[-1].startswith("info string invalid value")
+    engine.handle("isready")
+    assert lines[-1] == "readyok"
+    assert engine.handle("quit") is False
+
+def test_position_with_moves():
+    engine, lines = make_engine()
+    engine.handle("position startpos moves e2e4 e7e5 g1f3")
+    assert engine.board_rep.to_fen(engine.side).startswith("rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq")
+
+    engine.handle("position fen 6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1 moves a1a2 h7h6")
+    assert engine.side == 0
+    assert engine.board_rep.to_fen(engine.side).startswith("6k1/5pp1/7p/8/8/8/R4PPP/6K1 w")
+
+    engine.handle("position startpos moves e2e5")
+    assert lines[-1] == "info string illegal move e2e5"
+
+def test_go_depth_reports_and_answers():
+    engine, lines = make_engine()
+    engine.handle("position fen 6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+    engine.handle("go depth 3")
+    engine.search_thread.join()
+    infos = [line for line in lines if line.startswith("info depth")]
+    assert len(infos) == 3
+    assert all(int(line.split()[line.split().index("nodes") + 1]) > 0 for line in infos) # Depth 1 included
+    assert "score mate 1" in infos[-1] and infos[-1].endswith("pv a1a8")
+    assert lines[-1] == "bestmove a1a8"
+
+def test_stop_and_isready_answer_during_a_search():
+    engine, lines = make_engine()
+    engine.handle("position fen r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    engine.handle("go infinite")
+    time.sleep(0.5)
+    engine.handle("isready")
+    assert lines[-1] == "readyok" # Straight away, the search is still running
+    assert engine.search_thread.is_alive()
+
+    start = time.time()
+    engine.handle("stop")
+    assert time.time() - start < 0.5
+    assert lines[-1].startswith("bestmove ")
+    assert sum(line.startswith("bestmove") for line in lines) == 1
+
+    board_rep = BoardRep()
+    board_rep.from_fen("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    legal = [uci.move_to_uci(move) for move in ValidMoves(board_rep).generate_all_legal_moves("white")]
+    assert lines[-1].split()[1] in legal
+
+def test_go_with_limits():
+    engine, lines = make_engine()
+    engine.handle("position startpos")
+    start = time.time()
+    engine.handle("go wtime 2000 btime 2000")
+    engine.search_thread.join()
+    assert time.time() - start < 2
+    assert lines[-1].startswith("bestmove ")
+
+    engine.handle("go nodes 1")
+    engine.search_thread.join()
+    assert len([line for line in lines if line.startswith("info depth")]) >= 1
+    assert lines[-1].startswith("bestmove ")
+
+def test_format_score():
+    assert uci.format_score(35, 0) == "cp 35"
+    assert uci.format_score(35, 1) == "cp -35" # From the side to move's point of view
+    king = uci.munchkin.PieceValue.king
+    assert uci.format_score(king - 1, 0) == "mate 1"
+    assert uci.format_score(king - 5, 0) == "mate 3"
+    assert uci.format_score(king - 4, 1) == "mate -2" # White mates on the 4th ply, black is to move
+
+def test_threads_stream_iterations_and_keep_to_node_limits():
+    engine, lines = make_engine()
+    engine.handle("setoption name Threads value 2")
+    engine.threads = 2 # The machine running the tests may have a single core
+    engine._new_tables()
+    try:
+        engine.handle("position fen 6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+        engine.handle("go depth 4")
+        engine.search_thread.join()
+        infos = [line for line in lines if line.startswith("info depth")]
+        assert [int(line.split()[2]) for line in infos] == [1, 2, 3, 4]
+        assert all(int(line.split()[line.split().index("nodes") + 1]) > 0 for line in infos)
+        assert lines[-1] == "bestmove a1a8"
+
+        pool = engine.pool
+        engine.handle("ucinewgame")
+        engine.handle("setoption name Hash value 16")
+        assert engine.pool is pool # Cleared in place, the processes are kept
+        assert not any(pool.shared_tt.data)
+
+        engine.handle("position startpos")
+        engine.handle("go nodes 3000")
+        engine.search_thread.join()
+        assert lines[-1].startswith("bestmove ")
+        assert engine.pool.nodes < 3000 + 2 * 1024 # Every process stops at its share, give or take CHECK_EVERY
+    finally:
+        engine.handle("quit")
@@ -0,0 +1,58 @@
+"""
+Time management for the search.
+
+The search deepens one ply at a time (iterative deepening) until it runs out of time. There are two limits:
+the soft limit is checked between iterations (don't start another one after it), and the hard limit is
+checked inside the search every few thousand nodes (abort the iteration in progress). The result of an
+aborted iteration is thrown away, so the move played always comes from the last iteration that finished.
+"""
+import time
+
+CHECK_EVERY = 1024 # Nodes between two looks at the clock, time.time() is too slow to call at every node
+MOVES_TO_GO = 30 # How many more moves we assume the game lasts when the time control doesn't say
+HARD_LIMIT_FACTOR = 3 # How far past its soft limit a single move may go
+SAFETY_MARGIN = 0.05 # Seconds kept on the clock for the overhead of sending the move back
+
+class SearchStopped(Exception):
+    """Raised inside the search when it has to stop right away, the board has to be unwound by whoever catches it"""
+
+class SearchControl:
+    """
+    Decides when a running search has to stop: either the hard deadline (a time.time() value) passed,
+    someone set the stop event (anything with an is_set() method, e.g. a multiprocessing.Event)
+    or the search has visited node_limit nodes (give or take CHECK_EVERY). While it isn't armed it only counts
+    the nodes (the iteration that always has to finish).
+    A control can also narrow the window of the node at window_ply while it is being searched: minimax then
+    asks window() for the (alpha, beta) to use before every move (see munchkin._SplitPointControl)
+    """
+    window_ply = None
+
+    def __init__(self, hard_deadline: float | None = None, stop_event=None, node_limit: int | None = None):
+        self.hard_deadline = hard_deadline
+        self.stop_event = stop_event
+        self.node_limit = node_limit
+        self.nodes = 0
+        self.armed = True
+
+    def check(self) -> None:
+        """Called once per node, raises SearchStopped once it is time to stop"""
+        self.nodes += 1
+        if self.nodes % CHECK_EVERY or not self.armed:
+            return
+        if self.hard_deadline is not None and time.time() >= self.hard_deadline:
+            raise SearchStopped
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchStopped
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchStopped
+
+def allocate_time(time_left: float, increment: float = 0.0, moves_to_go: int | None = None) -> tuple[float, float]:
+    """
+    Splits the time left on the clock (in seconds) between the moves still to play.
+    Returns the (soft, hard) limits in seconds for the next move
+    """
+    usable = max(0.0, time_left - SAFETY_MARGIN)
+    moves = moves_to_go if moves_to_go else MOVES_TO_GO
+    soft = min(usable / moves + increment * 0.75, usable)
+    hard = min(soft * HARD_LIMIT_FACTOR, usable / 2 + increment, usable)
+    return soft, max(soft, hard)
@@ -0,0 +1,138 @@
+"""
+Transposition table: remembers the result of searching a position, so that when the same
+position is reached through a different move order (a transposition) it doesn't get searched again
+"""
+from array import array
+from multiprocessing import shared_memory
+from move_encoding import NO_MOVE
+
+EXACT = 0 # The score is the exact minimax value of the position
+LOWER = 1 # The search failed high, the real value is at least the score
+UPPER = 2 # The search failed low, the real value is at most the score
+
+# Every entry is packed in a single 64-bit word next to its 64-bit key:
+# bits 0-15 best move (see move_encoding), 16-35 score (offset so it is never negative), 36-43 depth, 44-45 bound, 46-53 age
+# and bit 54 is always set so that an occupied slot is never all zeros.
+# The key is stored XORed with the data, so a slot only matches if both words come from the same store,
+# which is what makes it safe to share the table between processes without locks (see SharedTranspositionTable)
+ENTRY_BYTES = 16
+_SCORE_OFFSET = 1 << 19
+_MASK_16 = 0xFFFF
+_MASK_20 = 0xFFFFF
+
+class TranspositionTable:
+    """
+    Fixed size hash table indexed by the Zobrist key of a position.
+
+    The number of entries is the biggest power of two that fits in size_mb, so the index
+    is just the lower bits of the key. When two positions fight for the same slot the
+    deeper search is kept, unless the entry is left over from a previous search (its age
+    is different), in which case it is always replaced.
+    """
+    def __init__(self, size_mb: float = 16):
+        entries = max(1, int(size_mb * 1024 * 1024) // ENTRY_BYTES)
+        self.size = 1 << (entries.bit_length() - 1)
+        self.mask = self.size - 1
+        self.keys = array('Q', bytes(8 * self.size))
+        self.data = array('Q', bytes(8 * self.size))
+        self.age = 0
+
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self) -> None:
+        """Empties the table"""
+        self.keys = array('Q', bytes(8 * self.size))
+        self.data = array('Q', bytes(8 * self.size))
+        self.age = 0
+
+    def new_search(self) -> None:
+        """Call before every root search so entries from older searches can be replaced first"""
+        self.age = (self.age + 1) & 0xFF
+
+    def probe(self, key: int) -> tuple[int, int, int, int] | None:
+        """Returns (depth, bound, score, best move) of a stored position, None if it isn't stored"""
+        self.probes += 1
+        index = key & self.mask
+        data = self.data[index]
+        if data == 0 or self.keys[index] ^ data != key:
+            return None
+        self.hits += 1
+        return ((data >> 36) & 0xFF, (data >> 44) & 3, ((data >> 16) & _MASK_20) - _SCORE_OFFSET, data & _MASK_16)
+
+    def store(self, key: int, depth: int, bound: int, score: int, move: int = NO_MOVE) -> None:
+        """Stores the result of a search, following the depth-preferred replacement scheme"""
+        index = key & self.mask
+        old_data = self.data[index]
+        if old_data:
+            if self.keys[index] ^ old_data == key:
+                if move == NO_MOVE: # Keep the old best move rather than forgetting it
+                    move = old_data & _MASK_16
+            elif ((old_data >> 46) & 0xFF) == self.age and depth < ((old_data >> 36) & 0xFF):
+                return # A deeper result from this search lives here, keep it
+
+        data = (move | ((int(score) + _SCORE_OFFSET) & _MASK_20) << 16 | depth << 36
+                | bound << 44 | self.age << 46 | 1 << 54)
+        self.keys[index] = key ^ data
+        self.data[index] = data
+
+    def hashfull(self) -> int:
+        """Permille of the first 1000 slots used by the current search, like UCI reports it"""
+        sample = min(1000, self.size)
+        used = sum(1 for i in range(sample) if self.data[i] and ((self.data[i] >> 46) & 0xFF) == self.age)
+        return used * 1000 // sample
+
+class SharedTranspositionTable(TranspositionTable):
+    """
+    A transposition table in shared memory, so that all the processes of a Lazy SMP search
+    read and write the same entries. There are no locks: two processes can write the same slot
+    at the same time and leave the key of one entry next to the data of the other, but then
+    the XORed key doesn't match and the slot just looks empty.
+
+    The table is created by the process that passes no name, which owns it: it ages it with
+    new_search() before every search and frees it with close(). The search processes attach to it
+    by passing its name.
+    """
+    def __init__(self, size_mb: float = 16, name: str | None = None):
+        entries = max(1, int(size_mb * 1024 * 1024) // ENTRY_BYTES)
+        self.size = 1 << (entries.bit_length() - 1)
+        self.mask = self.size - 1
+        self.owner = name is None
+        words = 1 + 2 * self.size # The age, then the keys, then the data
+        self._shm = shared_memory.SharedMemory(name=name, create=self.owner, size=8 * words)
+        self._memory = self._shm.buf[:8 * words].cast('Q')
+        self._header = self._memory[0:1]
+        self.keys = self._memory[1:1 + self.size]
+        self.data = self._memory[1 + self.size:]
+
+        self.probes = 0
+        self.hits = 0
+
+    @property
+    def name(self) -> str:
+        """What the other processes pass to attach to this table"""
+        return self._shm.name
+
+    @property
+    def age(self) -> int:
+        return self._header[0]
+
+    @age.setter
+    def age(self, value: int) -> None:
+        self._header[0] = value
+
+    def clear(self) -> None:
+        self._shm.buf[:8 * len(self._memory)] = bytes(8 * len(self._memory))
+
+    def new_search(self) -> None:
+        """Only the owner ages the table, once per search for every process"""
+        if self.owner:
+            self.age = (self.age + 1) & 0xFF
+
+    def close(self) -> None:
+        """Detaches from the shared memory, and frees it if this is the owner"""
+        for view in (self.keys, self.data, self._header, self._memory):
+            view.release()
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
@@ -0,0 +1,245 @@
+"""
+UCI front-end: lets any UCI GUI or tournament manager (cutechess, Arena, lichess-bot...) play Munchkin,
+without pygame or a display. Run `python -m uci` (or `python uci.py`) and talk to it on stdin/stdout.
+
+Supported: uci, isready, ucinewgame, setoption (Hash, Threads), position startpos/fen ... moves ...,
+go depth/movetime/nodes/wtime/btime/winc/binc/movestogo/infinite, stop and quit.
+
+The search runs in a thread of its own, so the commands keep being read while it thinks: stop and isready
+are answered straight away. It sends an info line (depth, score, nodes, nps, time and principal variation)
+after every iteration. With one thread the search runs in this process, with more in a Lazy SMP SearchPool
+whose processes report every iteration as they finish it, and share out the nodes of go nodes between them.
+"""
+import multiprocessing
+import sys
+import threading
+import time
+from typing import Callable
+from boardrep import BoardRep, ValidMoves, MoveHandler, SIDES, WHITE
+from move_encoding import move_to_uci, uci_to_move
+from selective_search import SelectiveSearch
+from time_control import allocate_time
+import munchkin
+
+ENGINE_NAME = "Munchkin"
+ENGINE_AUTHOR = "mgtorloni"
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+DEFAULT_HASH_MB = munchkin.TT_SIZE_MB
+MAX_HASH_MB = 1024
+MAX_THREADS = multiprocessing.cpu_count()
+
+def format_score(score: float, side: int) -> str:
+    """
+    A score from white's point of view as UCI wants it, from the side to move's: "cp 35", or "mate 3"
+    (-3 if we are the ones getting mated) when it is a checkmate. A mate scores PieceValue.king minus the
+    plies from the root to it, so the score itself tells how far away the mate is
+    """
+    if side != WHITE:
+        score = -score
+    if abs(score) < munchkin.MATE_BOUND:
+        return f"cp {int(score)}"
+    moves = (munchkin.PieceValue.king - int(abs(score)) + 1) // 2
+    return f"mate {moves if score > 0 else -moves}"
+
+class UCIEngine:
+    """Reads UCI commands one line at a time (handle) and writes the answers with output"""
+    def __init__(self, output: Callable[[str], None] | None = None):
+        self._output = output or self._print
+        self._output_lock = threading.Lock() # The search thread writes too
+        self.board_rep = BoardRep()
+        self.side = WHITE
+        self.hash_mb = DEFAULT_HASH_MB
+        self.threads = 1
+        self.pool = None # SearchPool, only with more than one thread
+        self.selective = SelectiveSearch()
+        self.stop_event = threading.Event()
+        self.search_thread = None
+        self._set_position(START_FEN, [])
+        self._new_tables()
+
+    @staticmethod
+    def _print(line: str) -> None:
+        print(line, flush=True)
+
+    def send(self, line: str) -> None:
+        with self._output_lock:
+            self._output(line)
+
+    def handle(self, line: str) -> bool:
+        """Carries out one command, returns False once it is time to quit"""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, arguments = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max {MAX_HASH_MB}")
+            self.send(f"option name Threads type spin default 1 min 1 max {MAX_THREADS}")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stop()
+            self._new_game()
+        elif command == "setoption":
+            self.stop()
+            self._set_option(arguments)
+        elif command == "position":
+            self.stop()
+            self._position(arguments)
+        elif command == "go":
+            self.stop()
+            self._go(arguments)
+        elif command == "stop":
+            self.stop()
+        elif command == "quit":
+            self.stop()
+            self.shutdown()
+            return False
+        # Anything else is ignored, as the protocol asks
+        return True
+
+    def _set_option(self, arguments: list[str]) -> None:
+        """setoption name <name> value <value>, the name can be more than one word"""
+        if "name" not in arguments:
+            return
+        value_at = arguments.index("value") if "value" in arguments else len(arguments)
+        name = " ".join(arguments[arguments.index("name") + 1:value_at]).lower()
+        value = " ".join(arguments[value_at + 1:])
+        try:
+            if name == "hash":
+                hash_mb = min(max(int(value), 1), MAX_HASH_MB)
+                if hash_mb != self.hash_mb:
+                    self.hash_mb = hash_mb
+                    self._new_tables()
+            elif name == "threads":
+                threads = min(max(int(value), 1), MAX_THREADS)
+                if threads != self.threads:
+                    self.threads = threads
+                    self._new_tables()
+        except ValueError:
+            self.send(f"info string invalid value {value!r} for {name}")
+
+    def _new_game(self) -> None:
+        """Clears the tables for a new game, keeping the pool and its processes: it has to answer isready straight after"""
+        if self.pool is not None:
+            self.pool.new_game()
+        else:
+            munchkin.reset_search_state(self.hash_mb, self.stop_event)
+
+    def _new_tables(self) -> None:
+        """Tables of the size of Hash, in this process or in a new pool of Threads processes: only when one of them changed"""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        if self.threads > 1:
+            self.pool = munchkin.SearchPool(workers=self.threads, tt_size_mb=self.hash_mb, mode=munchkin.LAZY_SMP,
+                                            selective=self.selective)
+        else:
+            # This process searches like one of the pool's, keeping its tables between moves
+            munchkin.reset_search_state(self.hash_mb, self.stop_event)
+
+    def _position(self, arguments: list[str]) -> None:
+        """position startpos|fen <fen> [moves <move> ...]"""
+        moves_at = arguments.index("moves") if "moves" in arguments else len(arguments)
+        if arguments and arguments[0] == "fen":
+            fen = " ".join(arguments[1:moves_at])
+        else:
+            fen = START_FEN
+        self._set_position(fen, arguments[moves_at + 1:])
+
+    def _set_position(self, fen: str, moves: list[str]) -> None:
+        self.side = SIDES["white" if self.board_rep.from_fen(fen) == 'w' else "black"]
+        move_handler = MoveHandler(self.board_rep)
+        validator = ValidMoves(self.board_rep)
+        for uci in moves:
+            move = uci_to_move(uci, validator.generate_all_legal_moves(self.side))
+            if move is None:
+                self.send(f"info string illegal move {uci}")
+                break
+            move_handler.make_move(move, self.side)
+            self.side ^= 1
+
+    def _go(self, arguments: list[str]) -> None:
+        """Parses the limits of the search and starts it in the background"""
+        limits = {}
+        infinite = False
+        i = 0
+        while i < len(arguments):
+            if arguments[i] == "infinite":
+                infinite = True
+            elif arguments[i] in ("depth", "movetime", "nodes", "wtime", "btime", "winc", "binc", "movestogo") and i + 1 < len(arguments):
+                limits[arguments[i]] = int(arguments[i + 1])
+                i += 1
+            i += 1
+
+        soft_time = hard_time = None
+        if "movetime" in limits:
+            soft_time = hard_time = limits["movetime"] / 1000
+        elif not infinite and ("wtime" if self.side == WHITE else "btime") in limits:
+            time_left = limits["wtime" if self.side == WHITE else "btime"] / 1000
+            increment = limits.get("winc" if self.side == WHITE else "binc", 0) / 1000
+            soft_time, hard_time = allocate_time(time_left, increment, limits.get("movestogo"))
+        depth = min(limits.get("depth", munchkin.MAX_DEPTH), munchkin.MAX_DEPTH)
+
+        self.stop_event.clear()
+        self.search_thread = threading.Thread(target=self._search, daemon=True,
+                                              args=(depth, soft_time, hard_time, limits.get("nodes"), infinite))
+        self.search_thread.start()
+
+    def _search(self, depth: int, soft_time: float | None, hard_time: float | None, node_limit: int | None, infinite: bool) -> None:
+        """Body of the search thread: searches, reports and sends bestmove"""
+        start = time.time()
+        soft_deadline = start + soft_time if soft_time is not None else None
+        hard_deadline = start + hard_time if hard_time is not None else None
+        fen = self.board_rep.to_fen(self.side)
+        legal_moves = list(ValidMoves(self.board_rep).generate_all_legal_moves(self.side))
+        if not legal_moves: # Checkmate or stalemate, there is nothing to play
+            self.send("bestmove 0000")
+            return
+
+        def report(current_depth: int, score: float, move: int, principal_variation: tuple[int, ...], nodes: int) -> None:
+            elapsed = max(time.time() - start, 1e-6)
+            self.send(f"info depth {current_depth} score {format_score(score, self.side)} nodes {nodes} "
+                      f"nps {int(nodes / elapsed)} time {int(elapsed * 1000)} pv {' '.join(map(move_to_uci, principal_variation))}")
+
+        if self.pool is not None:
+            results = self.pool.search(fen, legal_moves, depth, self.side, soft_deadline, hard_deadline,
+                                       node_limit=node_limit, on_iteration=report)
+        else:
+            results = munchkin.score_move(fen, legal_moves, depth, self.side, self.hash_mb, soft_deadline, hard_deadline,
+                                          node_limit=node_limit, on_iteration=report, selective=self.selective)
+
+        if infinite: # bestmove only once we are told to stop
+            self.stop_event.wait()
+        best_move = results[-1][1] if results else legal_moves[0]
+        self.send(f"bestmove {move_to_uci(best_move)}")
+
+    def stop(self) -> None:
+        """Stops the search, if there is one running, and waits for it to send its bestmove"""
+        if self.search_thread is None:
+            return
+        self.stop_event.set()
+        if self.pool is not None:
+            self.pool.stop()
+        self.search_thread.join()
+        self.search_thread = None
+
+    def shutdown(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+def main(input_stream=sys.stdin) -> None:
+    engine = UCIEngine()
+    for line in input_stream:
+        if not engine.handle(line):
+            break
+    else: # The GUI went away without saying quit
+        engine.stop()
+        engine.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Zobrist keys, used to turn a position into a (practically) unique 64-bit integer.
+
+Every (colour, piece, square) combination, every combination of castling rights,
+every en passant file and the side to move gets its own random 64-bit number.
+The key of a position is the XOR of the numbers of everything that is "on" in it,
+which means that making a move only needs a couple of XORs to update the key
+instead of recomputing it from scratch.
+"""
+import random
+import conversions
+
+# The generator is seeded so that every process (see munchkin.find_best_move) builds the same keys,
+# otherwise the same position would hash differently in different workers
+_rng = random.Random(0x4D554E43484B494E)
+
+# One list of 64 keys for each of the 12 coloured pieces, in the same order as BoardRep.bitboards
+PIECE_KEYS = [[_rng.getrandbits(64) for _ in range(64)] for _ in range(12)]
+
+# One key per combination of the four castling rights, indexed by BoardRep.castling_rights
+CASTLING_KEYS = [_rng.getrandbits(64) for _ in range(16)]
+
+# Only the file of the en passant square matters, the rank is implied by the side to move
+EN_PASSANT_KEYS = [_rng.getrandbits(64) for _ in range(8)]
+
+# XORed in when it is black to move
+SIDE_KEY = _rng.getrandbits(64)
+
+def en_passant_key(en_passant_square: int) -> int:
+    """Key for an en passant square (given as a bitboard), 0 if there is none"""
+    if en_passant_square == 0:
+        return 0
+    return EN_PASSANT_KEYS[conversions.square_to_index(en_passant_square) % 8]
+
+def hash_position(bitboards: list[int], castling_rights: int, en_passant_square: int, side_to_move: int) -> int:
+    """Computes the key of a position from scratch, MoveHandler keeps it up to date after that"""
+    key = 0
+    for piece, bitboard in enumerate(bitboards):
+        piece_keys = PIECE_KEYS[piece]
+        while bitboard:
+            key ^= piece_keys[(bitboard & -bitboard).bit_length() - 1]
+            bitboard &= bitboard - 1
+
+    key ^= CASTLING_KEYS[castling_rights]
+    key ^= en_passant_key(en_passant_square)
+    if side_to_move: # Black
+        key ^= SIDE_KEY
+    return key